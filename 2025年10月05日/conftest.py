@@ -0,0 +1,42 @@
+""" pytest的公共配置: 全部测试使用模拟MT5(不需要MT5终端), 邮件分发器不连接真实的smtp服务
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fff01x_v16t100_opms_beta_sim as sim  # noqa: E402
+
+sim.d0install()  # 必须在导入fff01x_v16t100_opms_beta之前
+import fff01x_v16t100_opms_beta as fff  # noqa: E402
+
+collect_ignore = ["fff01x_v16t100_opms_beta_test.py"]  # 回测/优化脚本, 只是文件名与pytest的命名规则相同
+
+# 进程内只配置一次的日志监听器: 写入临时文件夹(监听线程异步写入, 不能依赖测试时的工作目录)
+c1help = fff.C1Help("pytest")
+fff.C1Help.log_listener.path = os.path.join(tempfile.mkdtemp(), "log")
+# 进程内只配置一次的邮件分发器: 预先配置为每小时0封, 提醒只进入队列而不会发送
+fff.C2Help.mail_sender = fff.C0Mail(c1help=c1help,
+                                    addr_from="fff@localhost",
+                                    addr_to="fff@localhost",
+                                    smtp_host="127.0.0.1",
+                                    smtp_port=1,
+                                    smtp_password="",
+                                    smtp_ssl=False,
+                                    secs_batch=1,
+                                    secs_dedupe=1800,
+                                    count_hour=0)
+
+
+@pytest.fixture
+def broker(tmp_path, monkeypatch):
+    """ 模拟MT5: 工作目录改为临时文件夹(日志/历史库), fff模块改用虚拟时钟, 每个测试重新登录
+    合成数据之后需要由测试自己调用sim.d0clock_reset
+    @return: 模拟MT5模块
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(fff, "time", sim.clock)
+    monkeypatch.setattr(fff.C0Core, "mt5_session", None)
+    return sim
@@ -1,53 +1,164 @@
+import ast
+import atexit
+import bisect
+import concurrent.futures
+import hashlib
+import http.server
+import json
+import itertools
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import re
 import smtplib
+import sys
+import threading
 import time
+from collections import deque
 from datetime import timedelta
 from email.header import Header
 from email.mime.text import MIMEText
 from email.utils import formataddr
+from multiprocessing import shared_memory
 
 import MetaTrader5
 import colorama
+import numpy
 import pandas
-import schedule
+
+
+class C0Log:
+    def __init__(self, path, secs_flush):
+        """ 日志监听器: 每个进程只有一个, 独占该进程所有的日志文件和控制台输出
+        所有实例只把日志放入非阻塞队列, 由监听线程统一格式化/着色/写入, 文件带缓冲并且在队列空闲时批量落盘
+        @param path: 日志文件夹
+        @param secs_flush: 队列空闲时落盘的间隔(秒)
+        """
+        # &实例一赋&
+        self.path = path
+        self.secs_flush = secs_flush
+        # &综合直赋&
+        self.pid = os.getpid()
+        self.queue = queue.SimpleQueue()
+        self.fmt = logging.Formatter("[%(symbol)s/%(asctime)s] %(message)s", "%Y.%m.%d/%H:%M:%S")
+        self.dict_color = {logging.WARNING: colorama.Fore.GREEN,
+                           logging.ERROR: colorama.Fore.YELLOW,
+                           logging.CRITICAL: colorama.Fore.RED}
+        self.dict_file = {}  # 标的: 已打开的日志文件
+        self.lock = threading.Lock()  # 监听线程停止之后, 多个线程同步写入时互斥
+        self.done_stop = False
+        self.thread = threading.Thread(target=self.d0listen, name="fff-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.d0stop)
+
+    def d0listen(self):
+        """ 监听线程: 队列有数据时立即写入缓冲, 队列空闲时落盘
+        """
+        while True:
+            try:
+                record = self.queue.get(timeout=self.secs_flush)
+            except queue.Empty:
+                self.d0flush()
+                continue
+            if record is None:
+                self.d0flush()
+                break
+            self.d0write(record)
+
+    def d0enqueue(self, record):
+        """ 放入一条日志(替代QueueHandler.enqueue): 监听线程已经停止时(例如退出阶段的其他atexit)改为同步写入并落盘
+        @param record: logging.LogRecord
+        """
+        if self.thread.is_alive():
+            self.queue.put_nowait(record)
+        else:
+            with self.lock:
+                self.d0write(record)
+                self.d0flush()
+
+    def d0write(self, record):
+        """ 写入一条日志: 出错(编码/磁盘/格式)时只把原始内容输出到控制台, 监听线程不会因此退出
+        @param record: logging.LogRecord
+        """
+        try:
+            txt = self.fmt.format(record)
+            color = self.dict_color.get(record.levelno)
+            sys.stderr.write(f"{color}{txt}{colorama.Style.RESET_ALL}\n" if color else f"{txt}\n")
+            file = self.dict_file.get(record.symbol)
+            if file is None:
+                os.makedirs(self.path) if not os.path.exists(self.path) else None
+                file = self.dict_file[record.symbol] = open(f"{self.path}\\{record.symbol}.txt", "a")
+            file.write(f"{txt}\n")
+            if record.levelno >= logging.ERROR:
+                self.d0flush()
+        except Exception as e:
+            sys.__stderr__.write(f"[日志写入失败: {e!r}] {record.msg}\n")
+
+    def d0flush(self):
+        """ 将控制台和所有日志文件的缓冲落盘
+        """
+        try:
+            sys.stderr.flush()
+            for file in self.dict_file.values():
+                file.flush()
+        except (OSError, ValueError) as e:
+            sys.__stderr__.write(f"[日志落盘失败: {e!r}]\n")
+
+    def d0stop(self):
+        """ 写完队列中剩余的日志之后关闭所有文件(进程退出时自动调用), 之后的日志由d0enqueue同步写入
+        """
+        if self.done_stop or self.pid != os.getpid():
+            return
+        self.done_stop = True
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        with self.lock:
+            while not self.thread.is_alive() and not self.queue.empty():  # 结束标记之后才放入的日志
+                record = self.queue.get_nowait()
+                self.d0write(record) if record is not None else None
+            self.d0flush()
+            for file in self.dict_file.values():
+                file.close()
+            self.dict_file.clear()
 
 
 class C1Help:
+    log_listener = None  # 当前进程的日志监听器, 每个进程只配置一次
+
     def __init__(self, symbol):
         """ 辅助类1/3: 通用于程序和进程
         @param symbol: 进程标的
         """
         self.symbol = symbol
+        self.logger = self.d0log_config()
+
+    @staticmethod
+    def d0log_config():
+        """ 配置日志: 每个进程只配置一次(子进程中会重新配置)
+        @return: 只向队列放入日志的logger
+        """
+        logger = logging.getLogger("fff")
+        if C1Help.log_listener is None or C1Help.log_listener.pid != os.getpid():
+            C1Help.log_listener = C0Log(path=".\\log", secs_flush=1)
+            logger.handlers.clear()
+            handler = logging.handlers.QueueHandler(C1Help.log_listener.queue)
+            handler.enqueue = C1Help.log_listener.d0enqueue
+            logger.addHandler(handler)
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = False
+        return logger
 
     def d0log(self, content, level="info"):
         """ 输出和保存日志
         @param content: 日志内容
         @param level: info(默认)/warning/error/critical依次提高
         """
-        logger = logging.getLogger()
-        logger.setLevel(logging.DEBUG)
-        txt = f"[{self.symbol}/%(asctime)s] %(message)s"
-        date = "%Y.%m.%d/%H:%M:%S"
-        dict_color = {"warning": colorama.Fore.GREEN,
-                      "error": colorama.Fore.YELLOW,
-                      "critical": colorama.Fore.RED}
-        fmt = logging.Formatter(dict_color[level] + txt, date) if level in dict_color else \
-            logging.Formatter(txt, date)
-
-        os.makedirs(".\\log") if not os.path.exists(".\\log") else None
-        handler_file = logging.FileHandler(f".\\log\\{self.symbol}.txt")
-        handler_stream = logging.StreamHandler()
-        handler_file.setFormatter(fmt)
-        handler_stream.setFormatter(fmt)
-        logger.addHandler(handler_file)
-        logger.addHandler(handler_stream)
-
-        logger.warning(content) if level == "warning" else (
-            logger.error(content)) if level == "error" else (
-            logger.critical(content)) if level == "critical" else (
-            logger.info(content))
-        logger.handlers.clear()
+        dict_level = {"warning": logging.WARNING,
+                      "error": logging.ERROR,
+                      "critical": logging.CRITICAL}
+        self.logger.log(dict_level.get(level, logging.INFO), content, extra={"symbol": self.symbol})
 
     @staticmethod
     def d0title(content, position, sub=False):
@@ -66,10 +177,202 @@ class C1Help:
         return title_
 
 
+class C0Mail:
+    def __init__(self, c1help, addr_from, addr_to, smtp_host, smtp_port, smtp_password, smtp_ssl,
+                 secs_batch, secs_dedupe, count_hour, count_queue=200, count_retry=5, secs_retry=2, secs_idle=300):
+        """ 邮件分发器: 每个进程只有一个, 在后台线程中复用同一个已登录的smtp连接发送提醒, 交易线程只负责放入队列
+        同一批次内的提醒合并为一封邮件, 同类提醒(忽略其中的数字)在去重时长内只发送一次, 超过每小时的上限时推迟到下一批次
+        @param c1help: 实例化主类
+        @param addr_from: 邮件发送人
+        @param addr_to: 邮件收件人
+        @param smtp_host: smtp地址
+        @param smtp_port: smtp接口
+        @param smtp_password: smtp密码(为空时不登录, 用于本地测试的smtp服务)
+        @param smtp_ssl: 是否使用SMTP_SSL(否则使用明文SMTP, 用于本地测试的smtp服务)
+        @param secs_batch: 合并批次的时长(秒)
+        @param secs_dedupe: 同类提醒的去重时长(秒)
+        @param count_hour: 每小时最多发送的邮件数量
+        @param count_queue: 队列的最大长度, 超过时丢弃新的提醒
+        @param count_retry: 每封邮件的最多尝试次数
+        @param secs_retry: 重试的初始等待时长(秒), 之后每次翻倍
+        @param secs_idle: 连接空闲多久之后主动断开(秒)
+        """
+        # &实例一赋&
+        self.addr_from = addr_from
+        self.addr_to = addr_to
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.smtp_password = smtp_password
+        self.smtp_ssl = smtp_ssl
+        self.secs_batch = secs_batch
+        self.secs_dedupe = secs_dedupe
+        self.count_hour = count_hour
+        self.count_retry = count_retry
+        self.secs_retry = secs_retry
+        self.secs_idle = secs_idle
+        # &实例二赋&
+        self.log = c1help.d0log
+        # &综合直赋&
+        self.pid = os.getpid()
+        self.queue = queue.Queue(maxsize=count_queue)
+        self.smtp = None
+        self.time_use = 0  # 连接上次使用的时间(time.monotonic)
+        self.dict_wait = {}  # 同类提醒: [最新内容, 合并次数], 等待发送
+        self.dict_sent = {}  # 同类提醒: 上次发送的时间(time.monotonic)
+        self.dict_skip = {}  # 同类提醒: 去重时长内被跳过的次数
+        self.list_sent = deque()  # 最近一小时内的发送时间(time.monotonic)
+        self.count_send = 0
+        self.count_drop = 0
+        self.done_flush = False
+        self.thread = threading.Thread(target=self.d0listen, name="fff-mail", daemon=True)
+        self.thread.start()
+
+    def d0put(self, content):
+        """ 放入提醒(不阻塞)
+        @param content: 提醒内容
+        """
+        try:
+            self.queue.put_nowait(content)
+        except queue.Full:
+            self.count_drop += 1
+            self.log(f"$邮件分发$ 队列已满: 已丢弃{self.count_drop}条提醒", level="error")
+
+    def d0listen(self):
+        """ 发送线程: 收集一个批次的提醒之后合并发送, 任何异常都只放弃本批次而不会让线程退出
+        """
+        while True:
+            list_content = []
+            try:
+                try:
+                    list_content.append(self.queue.get(timeout=self.secs_batch if self.dict_wait else self.secs_idle))
+                except queue.Empty:
+                    self.d0close() if time.monotonic() - self.time_use >= self.secs_idle else None
+                deadline = time.monotonic() + self.secs_batch
+                while list_content and not self.done_flush and time.monotonic() < deadline:
+                    try:
+                        list_content.append(self.queue.get(timeout=max(min(deadline - time.monotonic(), 0.1), 0)))
+                    except queue.Empty:
+                        continue
+                while not self.queue.empty():
+                    list_content.append(self.queue.get_nowait())
+                self.d0batch([i for i in list_content if i is not None])
+            except Exception as e:
+                self.log(f"$邮件分发$ 发送线程异常: 已放弃本批次的{len(list_content)}条提醒: {e!r}", level="error")
+            finally:
+                for _ in list_content:
+                    self.queue.task_done()
+
+    def d0batch(self, list_content):
+        """ 去重/合并/限流之后发送一个批次
+        @param list_content: 本批次的提醒内容
+        """
+        now = time.monotonic()
+        for content in list_content:
+            key = re.sub(r"\d+(\.\d+)?", "#", content)
+            if key in self.dict_wait:
+                self.dict_wait[key] = [content, self.dict_wait[key][1] + 1]
+            elif now - self.dict_sent.get(key, -self.secs_dedupe) < self.secs_dedupe:
+                self.dict_skip[key] = self.dict_skip.get(key, 0) + 1
+            else:
+                self.dict_wait[key] = [content, self.dict_skip.pop(key, 0) + 1]
+        while self.list_sent and now - self.list_sent[0] >= 3600:
+            self.list_sent.popleft()
+        if not self.dict_wait or (len(self.list_sent) >= self.count_hour and not self.done_flush):
+            return
+        list_wait = list(self.dict_wait.items())
+        self.dict_wait.clear()
+        list_body = [f"{content} (合并{count}次)" if count > 1 else content for _, (content, count) in list_wait]
+        subject = list_body[0] if len(list_body) == 1 else f"{list_body[0]} (等{len(list_body)}条)"
+        if self.d0send(subject, "<br>".join(list_body)):
+            for key, _ in list_wait:
+                self.dict_sent[key] = now
+            self.list_sent.append(now)
+            self.count_send += 1
+        else:
+            self.log(f"$邮件分发$ 发送失败: 已放弃{len(list_body)}条提醒", level="error")
+
+    def d0connect(self):
+        """ 建立并登录smtp连接
+        """
+        smtp = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port) if self.smtp_ssl else \
+            smtplib.SMTP(self.smtp_host, self.smtp_port)
+        smtp.login(self.addr_from, self.smtp_password) if self.smtp_password else None
+        return smtp
+
+    def d0close(self):
+        """ 断开smtp连接
+        """
+        if self.smtp is not None:
+            try:
+                self.smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.smtp = None
+
+    def d0send(self, subject, content):
+        """ 复用连接发送一封邮件, 失败时断开重连并退避重试
+        @param subject: 邮件标题
+        @param content: 邮件内容
+        @return: True/发送成功, False/全部失败
+        """
+        name_from = "发件人名称"
+        name_to = "收件人名称"
+
+        msg = MIMEText(content, 'html', 'utf-8')
+        msg["From"] = formataddr((Header(name_from, 'utf-8').encode(), self.addr_from))
+        msg['To'] = Header(name_to, 'utf-8')
+        msg['Subject'] = Header(subject, 'utf-8')
+        for i in range(self.count_retry):
+            if self.smtp is not None and time.monotonic() - self.time_use >= 60:
+                try:
+                    alive = self.smtp.noop()[0] == 250
+                except (smtplib.SMTPException, OSError):
+                    alive = False
+                self.d0close() if not alive else None
+            try:
+                self.smtp = self.d0connect() if self.smtp is None else self.smtp
+                self.smtp.sendmail(self.addr_from, self.addr_to, msg.as_string())
+                self.time_use = time.monotonic()
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                self.log(f"$邮件分发$ 第{i + 1}次发送失败: {e}", level="warning")
+                self.d0close()
+                time.sleep(self.secs_retry * 2 ** i) if i + 1 < self.count_retry and not self.done_flush else None
+        return False
+
+    def d0flush(self, secs):
+        """ 立即发送所有剩余的提醒(忽略批次时长和限流), 用于退出之前
+        @param secs: 最多等待的时长(秒)
+        """
+        self.done_flush = True
+        deadline = time.monotonic() + secs
+        try:
+            self.queue.put_nowait(None)  # 唤醒发送线程
+        except queue.Full:
+            pass
+        while (self.queue.unfinished_tasks or self.dict_wait) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.done_flush = False
+
+
+class C0Pause(Exception):
+    def __init__(self, time_resume, reason):
+        """ 共用进程时暂停某个标的: 不在该标的中休眠(会阻塞同一进程的其他标的), 而是中止本轮, 由调度器在期限之前跳过该标的
+        @param time_resume: 恢复的时间(time.monotonic)
+        @param reason: 暂停的原因
+        """
+        super().__init__(reason)
+        self.time_resume = time_resume
+
+
 class C2Help:
-    def __init__(self, c1help, symbol, secs_short, secs_middle, secs_long, secs_super,
-                 email_addr_from, email_addr_to, email_smtp_host, email_smtp_port, email_smtp_password):
+    mail_sender = None  # 当前进程的邮件分发器, 每个进程只配置一次
+
+    def __init__(self, c0core, c1help, symbol, secs_short, secs_middle, secs_long, secs_super,
+                 email_addr_from, email_addr_to, email_smtp_host, email_smtp_port, email_smtp_password,
+                 email_smtp_ssl, email_secs_batch, email_secs_dedupe, email_count_hour, process_share=False):
         """ 辅助类2/3: 只适用于且全部适用于进程
+        @param c0core: 实例化主类
         @param c1help: 实例化主类
         @param symbol: 进程标的
         @param secs_short: 等待时长_较短
@@ -81,6 +384,11 @@ class C2Help:
         @param email_smtp_host: smtp地址
         @param email_smtp_port: smtp接口
         @param email_smtp_password: smtp密码
+        @param email_smtp_ssl: 是否使用SMTP_SSL
+        @param email_secs_batch: 提醒合并批次的时长(秒)
+        @param email_secs_dedupe: 同类提醒的去重时长(秒)
+        @param email_count_hour: 每小时最多发送的邮件数量
+        @param process_share: 是否与其他标的共用进程(共用时不休眠, 改为由调度器暂停本标的)
         """
         # %实例一赋%
         self.secs_short = secs_short
@@ -92,10 +400,22 @@ class C2Help:
         self.email_smtp_host = email_smtp_host
         self.email_smtp_port = email_smtp_port
         self.email_smtp_password = email_smtp_password
+        self.process_share = process_share
         # %实例二赋%
         self.log = c1help.d0log
+        self.ploy_quit = c0core.d0ploy_quit
         # %综合混赋%
-        self.ploy_quit = C0Core(symbol).d0ploy_quit
+        if C2Help.mail_sender is None or C2Help.mail_sender.pid != os.getpid():
+            C2Help.mail_sender = C0Mail(c1help=c1help,
+                                        addr_from=email_addr_from,
+                                        addr_to=email_addr_to,
+                                        smtp_host=email_smtp_host,
+                                        smtp_port=email_smtp_port,
+                                        smtp_password=email_smtp_password,
+                                        smtp_ssl=email_smtp_ssl,
+                                        secs_batch=email_secs_batch,
+                                        secs_dedupe=email_secs_dedupe,
+                                        count_hour=email_count_hour)
 
     def d0time_secs(self, length, sleep=False):
         """ 等待时长
@@ -112,22 +432,21 @@ class C2Help:
         secs = timedelta(seconds=secs)
         return secs
 
+    def d0time_pause(self, length, reason):
+        """ 暂停: 独占进程时直接休眠; 共用进程时抛出C0Pause, 由调度器在期限之前跳过本标的
+        @param length: short/较短, middle/中等, long/较长, super/超长
+        @param reason: 暂停的原因
+        """
+        if not self.process_share:
+            self.d0time_secs(length, sleep=True)
+            return
+        raise C0Pause(time.monotonic() + self.d0time_secs(length).total_seconds(), reason)
+
     def d0send_email(self, content):
-        """ 向邮箱发送信息
+        """ 向邮箱发送信息: 只放入邮件分发器的队列, 由后台线程合并发送
         @param content: 信息内容
         """
-        name_from = "发件人名称"
-        name_to = "收件人名称"
-        subject = content
-
-        msg = MIMEText(content, 'html', 'utf-8')
-        msg["From"] = formataddr((Header(name_from, 'utf-8').encode(), self.email_addr_from))
-        msg['To'] = Header(name_to, 'utf-8')
-        msg['Subject'] = Header(subject, 'utf-8')
-        smtp = smtplib.SMTP_SSL(self.email_smtp_host, self.email_smtp_port)
-        smtp.login(self.email_addr_from, self.email_smtp_password)
-        smtp.sendmail(self.email_addr_from, self.email_addr_to, msg.as_string())
-        smtp.quit()
+        C2Help.mail_sender.d0put(content)
 
     def d0remind_strong(self, content, exit_=False):
         """ 全方位的强烈提醒
@@ -141,59 +460,640 @@ class C2Help:
         self.ploy_quit() if exit_ else None
 
 
+class C0Atr:
+    def __init__(self, bar_count):
+        """ atr指标引擎: 全量时向量化计算, 之后只在新K线收盘时O(1)递推
+        K线数组的最后一根视为正在形成的K线, 其TR每次单独计算, 其余已收盘K线的TR保存在定长队列中
+        @param bar_count: 分析atr的K线的数量(含正在形成的K线)
+        """
+        # &实例一赋&
+        self.bar_count = bar_count
+        # &综合预赋&
+        self.time_last = None  # 已纳入队列的最后一根已收盘K线的时间
+        self.close_last = numpy.nan  # 已纳入队列的最后一根已收盘K线的收盘价
+        self.tr_queue = deque(maxlen=max(bar_count - 1, 1))
+        self.tr_sum = 0.0
+        self.tr_push = 0  # 递推次数, 每满一轮重新求和以消除累计误差
+
+    @staticmethod
+    def d0true_range(high, low, close, close_first=numpy.nan):
+        """ 向量化的TR
+        @param high: 最高价数组
+        @param low: 最低价数组
+        @param close: 收盘价数组
+        @param close_first: 第一根K线的前收盘(默认无, 此时第一根K线的TR=high-low)
+        @return: TR数组
+        """
+        close_prev = numpy.empty_like(close)
+        close_prev[0] = close_first
+        close_prev[1:] = close[:-1]
+        tr = numpy.fmax(high - low, numpy.fmax(numpy.abs(high - close_prev), numpy.abs(low - close_prev)))
+        return tr
+
+    def d0batch(self, bar):
+        """ 全量计算: 用bar重建已收盘K线的TR队列
+        @param bar: numpy结构化数组格式的K线(时间升序), 至少需要bar_count+1根才能保证每根K线都有前收盘
+        @return: atr
+        """
+        closed = bar[:-1]
+        self.tr_queue.clear()
+        if len(closed) > 0:
+            tr = self.d0true_range(closed['high'], closed['low'], closed['close'])
+            self.tr_queue.extend(tr[-(self.bar_count - 1):].tolist() if self.bar_count > 1 else [])
+            self.time_last = closed['time'][-1]
+            self.close_last = closed['close'][-1]
+        else:
+            self.time_last = None
+            self.close_last = numpy.nan
+        self.tr_sum = sum(self.tr_queue)
+        self.tr_push = 0
+        return self.d0forming(bar)
+
+    def d0update(self, bar):
+        """ 递推计算: 只把上次之后新收盘的K线推入TR队列, 缓存断档/回退时自动改为全量计算
+        @param bar: numpy结构化数组格式的K线(时间升序)
+        @return: atr
+        """
+        if (self.time_last is None or len(bar) < 2 or
+                bar['time'][0] > self.time_last or bar['time'][-1] <= self.time_last):
+            return self.d0batch(bar)
+        start = numpy.searchsorted(bar['time'], self.time_last, side='right')
+        for i in range(start, len(bar) - 1):
+            high, low, close = bar['high'][i], bar['low'][i], bar['close'][i]
+            tr = max(high - low, abs(high - self.close_last), abs(low - self.close_last))
+            if self.bar_count > 1:
+                if len(self.tr_queue) == self.tr_queue.maxlen:
+                    self.tr_sum -= self.tr_queue[0]
+                self.tr_queue.append(tr)
+                self.tr_sum += tr
+            self.time_last = bar['time'][i]
+            self.close_last = close
+            self.tr_push += 1
+            if self.tr_push >= self.tr_queue.maxlen:
+                self.tr_sum = sum(self.tr_queue)
+                self.tr_push = 0
+        return self.d0forming(bar)
+
+    def d0forming(self, bar):
+        """ 加上正在形成的K线的TR
+        @param bar: numpy结构化数组格式的K线(时间升序)
+        @return: atr
+        """
+        high, low = bar['high'][-1], bar['low'][-1]
+        tr = high - low if numpy.isnan(self.close_last) else \
+            max(high - low, abs(high - self.close_last), abs(low - self.close_last))
+        atr = (self.tr_sum + tr) / (len(self.tr_queue) + 1) if self.bar_count > 1 else tr
+        return atr
+
+
+class C0Ma:
+    def __init__(self, list_count):
+        """ ma指标引擎: 一次性计算任意一组K线数量的ma, 全量时使用前缀和, 之后只在新K线收盘时对每条ma做O(1)递推
+        K线数组的最后一根视为正在形成的K线, 每条ma=(最近count-1根已收盘K线的收盘价之和+正在形成的K线的收盘价)/count
+        @param list_count: 分析ma的K线的数量的列表(含正在形成的K线)
+        """
+        # &实例一赋&
+        self.list_count = sorted(set(list_count))
+        # &综合预赋&
+        self.ring_size = max(max(self.list_count) - 1, 1)
+        self.ring = numpy.zeros(self.ring_size)  # 已收盘K线的收盘价环形缓存
+        self.ring_head = 0  # 下一次写入的位置
+        self.ring_fill = 0  # 已写入的数量(不超过ring_size)
+        self.dict_sum = dict.fromkeys(self.list_count, 0.0)  # count: 最近count-1根已收盘K线的收盘价之和
+        self.time_last = None  # 已纳入缓存的最后一根已收盘K线的时间
+        self.ring_push = 0  # 递推次数, 每满一轮重新求和以消除累计误差
+
+    def d0batch(self, bar):
+        """ 全量计算: 用bar的前缀和重建所有ma的累计值
+        @param bar: numpy结构化数组格式的K线(时间升序)
+        @return: {K线数量: ma}
+        """
+        closed = bar['close'][:-1][-self.ring_size:]
+        self.ring[:len(closed)] = closed
+        self.ring_fill = len(closed)
+        self.ring_head = len(closed) % self.ring_size
+        self.time_last = bar['time'][-2] if len(bar) > 1 else None
+        self.d0resum()
+        return self.d0forming(bar)
+
+    def d0resum(self):
+        """ 用前缀和重新计算所有ma的累计值
+        """
+        ordered = numpy.roll(self.ring, -self.ring_head)[self.ring_size - self.ring_fill:] \
+            if self.ring_fill == self.ring_size else self.ring[:self.ring_fill]
+        prefix = numpy.concatenate(([0.0], numpy.cumsum(ordered)))
+        for count in self.list_count:
+            self.dict_sum[count] = prefix[-1] - prefix[max(len(prefix) - count, 0)]
+        self.ring_push = 0
+
+    def d0update(self, bar):
+        """ 递推计算: 只把上次之后新收盘的K线推入缓存, 缓存断档/回退时自动改为全量计算
+        @param bar: numpy结构化数组格式的K线(时间升序)
+        @return: {K线数量: ma}
+        """
+        if (self.time_last is None or len(bar) < 2 or
+                bar['time'][0] > self.time_last or bar['time'][-1] <= self.time_last):
+            return self.d0batch(bar)
+        start = numpy.searchsorted(bar['time'], self.time_last, side='right')
+        for i in range(start, len(bar) - 1):
+            close = bar['close'][i]
+            for count in self.list_count:
+                if count < 2:
+                    continue
+                if self.ring_fill >= count - 1:
+                    self.dict_sum[count] -= self.ring[(self.ring_head - count + 1) % self.ring_size]
+                self.dict_sum[count] += close
+            self.ring[self.ring_head] = close
+            self.ring_head = (self.ring_head + 1) % self.ring_size
+            self.ring_fill = min(self.ring_fill + 1, self.ring_size)
+            self.time_last = bar['time'][i]
+            self.ring_push += 1
+            if self.ring_push >= self.ring_size:
+                self.d0resum()
+        return self.d0forming(bar)
+
+    def d0forming(self, bar):
+        """ 加上正在形成的K线的收盘价
+        @param bar: numpy结构化数组格式的K线(时间升序)
+        @return: {K线数量: ma}
+        """
+        close = bar['close'][-1]
+        dict_ma = {count: (self.dict_sum[count] + close) / (min(count - 1, self.ring_fill) + 1)
+                   for count in self.list_count}
+        return dict_ma
+
+
+class C0Aggregate:
+    def __init__(self, bar_base):
+        """ 多周期K线的本地合成: 每个标的一个, 只从券商拉取基础周期的K线, 更大的周期在内存中由其合成
+        K线的时间均为服务器时间, 分钟/小时/日线按周期取整, 周线从周日开始, 月线从每月1日开始(与MT5一致);
+        休市(周末/节假日/每日休市)期间没有基础K线, 因此不会产生空K线, 开盘晚于周期起点的K线照常合成
+        @param bar_base: 基础周期(MT5的K线周期代号)
+        """
+        # &实例一赋&
+        self.bar_base = bar_base
+        # &综合预赋&
+        self.secs_base = C0Into.d0frame_secs(bar_base)
+        self.dict_state = {}  # 周期: (上次使用的基础K线, 合成的K线)
+        self.count_build = 0  # 全量合成的次数
+        self.count_update = 0  # 只合成最后一根(或几根)K线的次数
+
+    def d0ratio(self, bar_frame):
+        """ 每根目标周期的K线最多包含多少根基础K线
+        @param bar_frame: 目标周期
+        @return: 数量, 不能由基础周期合成时返回None
+        """
+        if self.secs_base is None or bar_frame == self.bar_base:
+            return
+        elif bar_frame & 0x8000:  # W1/MN1
+            days = 7 if bar_frame == MetaTrader5.TIMEFRAME_W1 else 31
+            return days * 86400 // self.secs_base if 86400 % self.secs_base == 0 else None
+        secs = C0Into.d0frame_secs(bar_frame)
+        if secs <= self.secs_base or secs % self.secs_base != 0 or 86400 % secs != 0:
+            return
+        return secs // self.secs_base
+
+    @staticmethod
+    def d0bucket(time_, bar_frame):
+        """ 每根基础K线所属的目标周期K线的开盘时间
+        @param time_: 基础K线的时间数组
+        @param bar_frame: 目标周期
+        @return: 开盘时间数组
+        """
+        if bar_frame == MetaTrader5.TIMEFRAME_MN1:
+            return time_.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype('<i8')
+        elif bar_frame == MetaTrader5.TIMEFRAME_W1:  # 1970-01-04是周日
+            return (time_ - 3 * 86400) // (7 * 86400) * (7 * 86400) + 3 * 86400
+        secs = C0Into.d0frame_secs(bar_frame)
+        return time_ // secs * secs
+
+    def d0build(self, base, bar_frame):
+        """ 向量化合成: 开盘=第一根的开盘, 最高/最低=极值, 收盘=最后一根的收盘, 成交量=求和, 点差=最小值
+        @param base: 基础K线(时间升序)
+        @param bar_frame: 目标周期
+        @return: 合成的K线
+        """
+        bucket = self.d0bucket(base['time'], bar_frame)
+        start = numpy.flatnonzero(numpy.r_[True, bucket[1:] != bucket[:-1]])
+        bar = numpy.zeros(len(start), dtype=base.dtype)
+        bar['time'] = bucket[start]
+        bar['open'] = base['open'][start]
+        bar['high'] = numpy.maximum.reduceat(base['high'], start)
+        bar['low'] = numpy.minimum.reduceat(base['low'], start)
+        bar['close'] = base['close'][numpy.r_[start[1:] - 1, len(base) - 1]]
+        for name in ('tick_volume', 'real_volume'):
+            bar[name] = numpy.add.reduceat(base[name], start)
+        bar['spread'] = numpy.minimum.reduceat(base['spread'], start)
+        return bar
+
+    def d0update(self, bar_frame, base):
+        """ 合成目标周期的K线: 基础K线没有变化时沿用原数组; 通常只重新合成上次正在形成的K线及其之后的部分,
+        基础K线断档/回退时改为全量合成. 最早的一根可能不完整(基础K线从其中间开始), 因此总是舍弃
+        @param bar_frame: 目标周期
+        @param base: 基础K线(时间升序, 最后一根为正在形成的K线)
+        @return: 合成的K线(时间升序, 最后一根为正在形成的K线)
+        """
+        state = self.dict_state.get(bar_frame)
+        if state is not None and state[0] is base:
+            return state[1]
+        time_first = self.d0bucket(base['time'][:1], bar_frame)[0]
+        if (state is not None and len(state[1]) > 0 and base['time'][0] <= state[1]['time'][-1] and
+                base['time'][-1] >= state[0]['time'][-1]):
+            bar_old = state[1]
+            tail = self.d0build(base[numpy.searchsorted(base['time'], bar_old['time'][-1]):], bar_frame)
+            keep = numpy.searchsorted(bar_old['time'], time_first, side='right')
+            bar = numpy.concatenate((bar_old[keep:-1], tail))
+            self.count_update += 1
+        else:
+            bar = self.d0build(base, bar_frame)
+            self.count_build += 1
+        bar = bar[1:] if len(bar) > 1 and bar['time'][0] == time_first else bar
+        self.dict_state[bar_frame] = (base, bar)
+        return bar
+
+
+class C0Graph:
+    dict_kind = {"ma": "收盘价的ma", "atr": "atr"}  # 支持的节点种类
+
+    def __init__(self, bar_cache, bar_frame):
+        """ 指标计算图: 每个标的一个, 策略预先声明需要的节点(种类, K线数量[, 周期]), 相同的节点只保留一个
+        同一周期的所有ma节点共用一个C0Ma引擎, 每个atr节点一个C0Atr引擎, 每个周期每次只读取一次K线(覆盖所有节点所需的数量)
+        结果按正在形成的K线(时间/最高/最低/收盘)缓存: 同一标记之内的重复请求直接返回缓存, 标记改变时整体作废
+        @param bar_cache: K线缓存(C0Into.d0bar_cache)
+        @param bar_frame: 默认周期
+        """
+        # &实例一赋&
+        self.bar_cache = bar_cache
+        self.bar_frame = bar_frame
+        # &综合预赋&
+        self.dict_node = {}  # 周期: {节点(种类, K线数量, 周期): 所需的K线数量}
+        self.dict_ma = {}  # 周期: ma指标引擎(覆盖该周期所有的ma节点)
+        self.dict_atr = {}  # (周期, K线数量): atr指标引擎
+        self.dict_memo = {}  # 周期: (正在形成的K线的标记, {节点: 值})
+        self.count_compute = 0  # 实际计算的次数
+        self.count_hit = 0  # 直接使用缓存的次数
+
+    def d0normal(self, node):
+        """ 统一节点的格式
+        @param node: (种类, K线数量)或者(种类, K线数量, 周期)
+        @return: (种类, K线数量, 周期)
+        """
+        kind, bar_count = node[0], node[1]
+        if kind not in self.dict_kind:
+            raise ValueError(f"不支持的指标节点: {node}")
+        return kind, bar_count, self.bar_frame if len(node) < 3 or node[2] is None else node[2]
+
+    def d0declare(self, list_node):
+        """ 声明节点: 已经声明过的节点直接忽略
+        @param list_node: 节点的列表
+        """
+        for node in list_node:
+            kind, bar_count, frame = node = self.d0normal(node)
+            dict_need = self.dict_node.setdefault(frame, {})
+            if node not in dict_need:
+                dict_need[node] = bar_count + 1  # 多一根K线以保证每根K线都有前收盘
+
+    def d0values(self, list_node):
+        """ 读取节点的值(未声明的节点自动声明)
+        @param list_node: 节点的列表
+        @return: {节点(与参数的写法一致): 值}
+        """
+        dict_normal = {node: self.d0normal(node) for node in list_node}
+        self.d0declare(dict_normal.values())
+        dict_memo = {frame: self.d0evaluate(frame) for frame in {i[2] for i in dict_normal.values()}}
+        return {node: dict_memo[normal[2]][normal] for node, normal in dict_normal.items()}
+
+    def d0evaluate(self, frame):
+        """ 计算某个周期的全部节点: 正在形成的K线没有变化时直接返回缓存
+        @param frame: 周期
+        @return: {节点: 值}
+        """
+        dict_need = self.dict_node[frame]
+        bar = self.bar_cache(max(dict_need.values()), frame)
+        stamp = (bar['time'][-1], bar['high'][-1], bar['low'][-1], bar['close'][-1], len(dict_need))
+        memo = self.dict_memo.get(frame)
+        if memo is not None and memo[0] == stamp:
+            self.count_hit += 1
+            return memo[1]
+        self.count_compute += 1
+        dict_value = {}
+        list_ma = [i[1] for i in dict_need if i[0] == "ma"]
+        if list_ma:
+            engine = self.dict_ma.get(frame)
+            if engine is None or not set(list_ma) <= set(engine.list_count):
+                engine = self.dict_ma[frame] = C0Ma(list_ma)
+            dict_ma = engine.d0update(bar)
+            dict_value.update({("ma", i, frame): dict_ma[i] for i in list_ma})
+        for kind, bar_count, _ in dict_need:
+            if kind == "atr":
+                engine = self.dict_atr.get((frame, bar_count))
+                if engine is None:
+                    engine = self.dict_atr[(frame, bar_count)] = C0Atr(bar_count)
+                dict_value[(kind, bar_count, frame)] = engine.d0update(bar)
+        self.dict_memo[frame] = (stamp, dict_value)
+        return dict_value
+
+
+class C0Slot:
+    __slots__ = ()
+    list_time = []  # 需要在显示时转换为日期的字段(秒)
+
+    def __init__(self, raw):
+        """ 券商数据的轻量记录: 只保留用到的字段, 不创建pandas对象, 只有显示时才转换为df
+        @param raw: MT5返回的结构(字段为其超集)
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(raw, name))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{i}={getattr(self, i)}' for i in self.__slots__)})"
+
+    @classmethod
+    def d0frame(cls, list_record):
+        """ 转换为df(仅用于显示)
+        @param list_record: 同一类型的记录
+        @return: df格式的数据, 每条记录一行
+        """
+        frame = pandas.DataFrame([[getattr(i, name) for name in cls.__slots__] for i in list_record],
+                                 columns=list(cls.__slots__))
+        for name in cls.list_time:
+            frame[name] = pandas.to_datetime(frame[name], unit='s')
+        return frame
+
+
+class C0Hold(C0Slot):
+    """ 持单: ticket/int, time/int(秒), type/int, volume/float, price_open/float, sl/float, tp/float,
+    profit/float, symbol/str, magic/int
+    """
+    __slots__ = ('ticket', 'time', 'type', 'volume', 'price_open', 'sl', 'tp', 'profit', 'symbol', 'magic')
+    list_time = ['time']
+
+
+class C0Pend(C0Slot):
+    """ 挂单: ticket/int, time_setup/int(秒), type/int, volume_current/float, price_open/float, symbol/str, magic/int
+    """
+    __slots__ = ('ticket', 'time_setup', 'type', 'volume_current', 'price_open', 'symbol', 'magic')
+    list_time = ['time_setup']
+
+
+class C0Account(C0Slot):
+    """ 账户: login/int, balance/float, profit/float, equity/float, margin/float, margin_free/float,
+    margin_level/float(*100%, 没有持单时为0)
+    """
+    __slots__ = ('login', 'balance', 'profit', 'equity', 'margin', 'margin_free', 'margin_level')
+
+
+class C0Tick(C0Slot):
+    """ 报价快照: time/int(秒), bid/float, ask/float, last/float, time_msc/int(毫秒), spread/float(ask-bid)
+    同一次决策中的买价/卖价/点差都来自同一个报价
+    """
+    __slots__ = ('time', 'bid', 'ask', 'last', 'time_msc', 'spread')
+
+    def __init__(self, raw):
+        self.time = int(raw.time)
+        self.bid = float(raw.bid)
+        self.ask = float(raw.ask)
+        self.last = float(raw.last)
+        self.time_msc = int(raw.time_msc)
+        self.spread = self.ask - self.bid
+
+
+class C0Spec(C0Slot):
+    """ 标的规格: name/str, point/float, trade_tick_value/float, volume_min/float, volume_step/float,
+    volume_max/float, digits/int, trade_stops_level/int(点), filling_mode/int(允许的成交模式, SYMBOL_FILLING_*的组合)
+    """
+    __slots__ = ('name', 'point', 'trade_tick_value', 'volume_min', 'volume_step', 'volume_max', 'digits',
+                 'trade_stops_level', 'filling_mode')
+
+
 # noinspection PyProtectedMember
 class C0Into:
-    def __init__(self, c1help, symbol, bar_frame):
+    def __init__(self, c1help, symbol, bar_frame, bar_keep, bar_fresh, tick_keep=1000, bar_base=None):
         """ 从外部输入数据
         @param c1help: 实例化主类
         @param symbol: 进程标的
         @param bar_frame: 用于判断分析方向的K线周期
+        @param bar_keep: 每个(标的, 周期)缓存的K线数量
+        @param bar_fresh: K线缓存的最短刷新间隔(秒), 间隔之内的重复读取直接使用缓存
+        @param tick_keep: 保留的最近报价的数量
+        @param bar_base: 本地合成其他周期所用的基础周期(默认操作周期), 只有它向券商拉取K线
         """
         # &实例一赋&
         self.symbol = symbol
         self.bar_frame = bar_frame
+        self.bar_base = bar_frame if bar_base is None else bar_base
+        self.bar_keep = bar_keep
+        self.bar_fresh = bar_fresh
         # &实例二赋&
         self.log = c1help.d0log
+        # &综合预赋&
+        self.dict_bar = {}  # (标的, 周期): numpy结构化数组格式的K线(时间升序)
+        self.dict_bar_check = {}  # (标的, 周期): 上次刷新的时间(time.monotonic)
+        self.graph = C0Graph(bar_cache=self.d0bar_cache, bar_frame=bar_frame)  # 本标的的指标计算图
+        self.aggregate = C0Aggregate(bar_base=self.bar_base)  # 由基础周期合成的其他周期
+        self.batch = None  # 多标的共用进程时由调度器设置的批量数据
+        self.feed = None  # 开启行情中心时的共享内存读取器
+        self.feed_total = 0  # 已从行情中心读取的报价总数
+        self.store = None  # 开启本地历史库时的C0Store
+        self.dict_snapshot = {}  # 本轮的券商状态快照, hold/pend/tick: 持单/挂单的元组/报价, 每轮开始和成交之后作废
+        self.list_tick = deque(maxlen=tick_keep)  # 最近的报价(C0Tick, 时间升序, 不重复)
 
     def d0price_ask(self):
-        """ 买入价格
-        @return: /
+        """ 买入价格(本轮的报价快照)
+        @return: /, 断连时返回None
         """
-        ask = MetaTrader5.symbol_info_tick(self.symbol).ask
+        tick = self.d0tick_info()
+        ask = tick.ask if tick is not None else None
         return ask
 
     def d0price_bid(self):
-        """ 卖出价格
-        @return: /
+        """ 卖出价格(本轮的报价快照)
+        @return: /, 断连时返回None
         """
-        bid = MetaTrader5.symbol_info_tick(self.symbol).bid
+        tick = self.d0tick_info()
+        bid = tick.bid if tick is not None else None
         return bid
 
+    def d0tick_info(self):
+        """ 报价快照: 每轮只获取一次, 行情中心有效时读取共享内存, 否则直接调用MT5
+        @return: C0Tick, 断连时返回None(不缓存)
+        """
+        tick = self.dict_snapshot.get("tick")
+        if tick is not None:
+            return tick
+        tick = self.d0tick_feed() if self.feed is not None and self.feed.d0fresh() else None
+        tick = MetaTrader5.symbol_info_tick(self.symbol) if tick is None else tick
+        if tick is None:
+            return
+        tick = self.dict_snapshot["tick"] = C0Tick(tick)
+        self.d0tick_keep(tick)
+        return tick
+
+    def d0tick_feed(self):
+        """ 读取行情中心上次读取之后的所有报价并保留, 两轮之间的报价也计入报价统计和本地历史库
+        @return: 行情中心的最新报价, 没有报价时返回None
+        """
+        tick, self.feed_total = self.feed.d0tick_since(self.feed_total)
+        for i in tick.view(numpy.recarray) if tick is not None else ():
+            self.d0tick_keep(C0Tick(i))
+        return self.feed.d0tick()
+
+    def d0tick_keep(self, tick):
+        """ 保留比最近的报价更新的报价, 开启本地历史库时同时写入
+        @param tick: C0Tick
+        """
+        if not self.list_tick or tick.time_msc > self.list_tick[-1].time_msc:
+            self.list_tick.append(tick)
+            self.store.d0tick_put(tick) if self.store is not None else None
+
+    def d0tick_stats(self, secs=60):
+        """ 最近的报价统计
+        @param secs: 统计最近多少秒(以最新报价的时间为准)
+        @return: {count/报价次数, rate/每分钟的报价次数, spread_mean/平均点差, spread_max/最大点差}, 没有报价时返回None
+        """
+        if not self.list_tick:
+            return
+        time_from = self.list_tick[-1].time_msc - secs * 1000
+        list_spread = [i.spread for i in reversed(self.list_tick) if i.time_msc > time_from]
+        stats = {"count": len(list_spread),
+                 "rate": len(list_spread) * 60 / secs,
+                 "spread_mean": sum(list_spread) / len(list_spread),
+                 "spread_max": max(list_spread)}
+        return stats
+
+    def d0symbol_spec(self):
+        """ 标的规格: 读取当前会话的缓存
+        @return: C0Spec
+        """
+        spec = C0Core.mt5_session.d0spec(self.symbol)
+        return spec
+
     def d0tick_size(self):
         """ 每跳大小
         @return: /
         """
-        size = MetaTrader5.symbol_info(self.symbol).point
+        size = self.d0symbol_spec().point
         return size
 
     def d0tick_value(self):
-        """ 每跳价值
+        """ 每跳价值(已应用规格修正表)
         @return: /
         """
-        value = MetaTrader5.symbol_info(self.symbol).trade_tick_value
-        if self.symbol == "XAUUSD":  # mt5给出的XAUUSD的点值是0.1, 不知道为什么
-            return 1
+        value = self.d0symbol_spec().trade_tick_value
+        return value
+
+    def d0volume_round(self, volume):
+        """ 按标的的手数步长取整
+        @param volume: 手数
+        @return: 最接近的有效手数(不超过最大手数), 不足最小手数时返回0
+        """
+        spec = self.d0symbol_spec()
+        volume = min(round(volume / spec.volume_step) * spec.volume_step, spec.volume_max)
+        volume = round(volume, 8) if volume >= spec.volume_min else 0.0
+        return volume
+
+    def d0type_filling(self):
+        """ 市价单的成交模式: 按标的允许的模式选择, 优先FOK, 其次IOC, 都不允许时为RETURN
+        @return: MetaTrader5.ORDER_FILLING_*
+        """
+        filling_mode = self.d0symbol_spec().filling_mode
+        if filling_mode & MetaTrader5.SYMBOL_FILLING_FOK:
+            return MetaTrader5.ORDER_FILLING_FOK
+        elif filling_mode & MetaTrader5.SYMBOL_FILLING_IOC:
+            return MetaTrader5.ORDER_FILLING_IOC
+        else:
+            return MetaTrader5.ORDER_FILLING_RETURN
+
+    @staticmethod
+    def d0frame_secs(bar_frame):
+        """ K线周期的时长
+        @param bar_frame: MT5的K线周期代号
+        @return: 秒数, 周线/月线等长度不固定的周期返回None
+        """
+        if bar_frame & 0x8000:  # W1/MN1
+            return None
+        elif bar_frame & 0x4000:  # H1~D1, 低位为小时数
+            return (bar_frame & 0x3FFF) * 3600
+        else:  # M1~M30, 即为分钟数
+            return bar_frame * 60
+
+    def d0bar_open(self, tick_time):
+        """ 报价所在K线的开盘时间
+        @param tick_time: 报价时间(服务器时间的秒数)
+        @return: 开盘时间(与K线的time一致)
+        """
+        secs = self.d0frame_secs(self.bar_frame)
+        if secs is not None and secs <= 24 * 3600:
+            return tick_time // secs * secs
+        bar = self.d0bar_cache(1)
+        return bar['time'][-1] if bar is not None else None
+
+    def d0bar_cache(self, bar_count, bar_frame=None):
+        """ K线缓存: 首次全量拉取, 之后只拉取缓存中最后一根K线(含)之后的K线, 并原地修补正在形成的K线
+        行情中心有效并且周期/数量都满足时直接读取共享内存; 可以由基础周期合成的周期不向券商拉取, 而是在内存中合成
+        开启本地历史库时, 首次先用本地的已收盘K线预热缓存(之后只需拉取断档的部分), 并追加保存新收盘的K线
+        @param bar_count: 至少需要的K线数量(超过bar_keep时自动扩大缓存)
+        @param bar_frame: K线周期(默认操作周期)
+        @return: numpy结构化数组格式的K线(时间升序, 最后一根为正在形成的K线), 拉取失败并且没有缓存时返回None
+        """
+        frame = self.bar_frame if bar_frame is None else bar_frame
+        key = (self.symbol, frame)
+        if (self.feed is not None and frame == self.feed.bar_frame and bar_count <= self.feed.bar_keep and
+                self.feed.d0fresh()):
+            bar = self.feed.d0bar()
+            if bar is not None and len(bar) >= bar_count:
+                self.dict_bar[key] = bar
+                self.dict_bar_check[key] = time.monotonic()
+                self.store.d0bar_save(frame, bar) if self.store is not None else None
+                return bar
+        ratio = self.aggregate.d0ratio(frame)
+        if ratio is not None:  # 多拉取一根目标周期的基础K线, 以弥补舍弃的最早的不完整K线
+            base = self.d0bar_cache((bar_count + 1) * ratio, self.bar_base)
+            return None if base is None or len(base) == 0 else self.aggregate.d0update(frame, base)
+        self.bar_keep = max(self.bar_keep, bar_count)
+        cache = self.dict_bar.get(key)
+        if cache is None and self.store is not None:
+            cache = self.store.d0bars(frame, count=self.bar_keep)
+            if cache is not None and len(cache) >= bar_count:
+                self.dict_bar_check[key] = float("-inf")  # 本地数据没有正在形成的K线, 必须立即刷新
+                self.log(f"$历史数据$ {self.symbol}_{frame} 从本地预热K线: {len(cache)}根, "
+                         f"最后={pandas.to_datetime(cache['time'][-1], unit='s')}")
+            else:
+                cache = None
+        now = time.monotonic()
+        if cache is not None and len(cache) >= bar_count and now - self.dict_bar_check[key] < self.bar_fresh:
+            return cache
+
+        if cache is None or len(cache) < bar_count:
+            bar = MetaTrader5.copy_rates_from_pos(self.symbol, frame, 0, self.bar_keep)
         else:
-            return value
+            count = 2  # 通常只有正在形成的K线和最多一根新K线, 断档时倍增直到与缓存重叠
+            while True:
+                bar = MetaTrader5.copy_rates_from_pos(self.symbol, frame, 0, count)
+                if (bar is None or len(bar) < count or count >= self.bar_keep or
+                        bar['time'][0] <= cache['time'][-1]):
+                    break
+                count *= 2
+            if bar is not None and len(bar) > 0 and bar['time'][0] <= cache['time'][-1]:
+                keep = numpy.searchsorted(cache['time'], bar['time'][0])
+                if keep + len(bar) == len(cache) and numpy.array_equal(cache[keep:], bar):
+                    bar = cache  # 没有任何变化, 沿用原数组
+                else:
+                    bar = numpy.concatenate((cache[:keep], bar))
+        if bar is None or len(bar) == 0:
+            return cache
+        self.dict_bar[key] = bar if len(bar) <= self.bar_keep else bar[-self.bar_keep:]
+        self.dict_bar_check[key] = now
+        self.store.d0bar_save(frame, self.dict_bar[key]) if self.store is not None else None
+        return self.dict_bar[key]
 
     def d0bar_source(self, bar_count):
         """ 数据源
         @param bar_count: K线数量
         @return: /
         """
-        bar = MetaTrader5.copy_rates_from_pos(
-            self.symbol, self.bar_frame, 0, bar_count)
-        bar = pandas.DataFrame(bar)
+        bar = self.d0bar_cache(bar_count)
+        bar = pandas.DataFrame(bar[-bar_count:] if bar is not None else None)
         return bar
 
     def d0bar_format(self, bar_count):
@@ -214,22 +1114,38 @@ class C0Into:
         @param bar_count: 分析ma的K线的数量
         @return: ma
         """
-        ma = self.d0bar_format(bar_count + 1).close.rolling(bar_count).mean()[-1]
+        ma = self.d0indicator_mas([bar_count])[bar_count]
         return ma
 
-    def d0indicator_atr(self):
-        """ atr指标
+    def d0indicator_mas(self, list_count):
+        """ 多条ma指标: 经由指标计算图, 同一周期共用一个引擎, 一次读取K线即可得到所有ma
+        @param list_count: 分析ma的K线的数量的列表
+        @return: {K线数量: ma}
+        """
+        dict_value = self.graph.d0values([("ma", i) for i in list_count])
+        return {i: dict_value[("ma", i)] for i in list_count}
+
+    def d0indicator_atr(self, bar_count=300):
+        """ atr指标: 经由指标计算图, 只在新K线收盘时递推
+        @param bar_count: 分析atr的K线的数量(默认300)
         @return: atr
         """
-        bar = self.d0bar_format(300)
-        for i in range(0, len(bar)):
-            a = bar['high'][i] - bar['low'][i]
-            b = abs(bar['close'][i - 1] - bar['high'][i])
-            c = abs(bar['close'][i - 1]) - bar['low'][i]
-            bar.loc[bar.index[i], 'TR'] = max(a, b, c)
-        atr = bar['TR'].rolling(300).mean()[-1]
+        atr = self.graph.d0values([("atr", bar_count)])[("atr", bar_count)]
         return atr
 
+    def d0indicator_declare(self, list_node):
+        """ 预先声明需要的指标节点: 使首次计算时就覆盖所有策略实例的节点, 避免引擎重建和重复读取K线
+        @param list_node: [(种类, K线数量[, 周期])], 种类见C0Graph.dict_kind
+        """
+        self.graph.d0declare(list_node)
+
+    def d0indicator_values(self, list_node):
+        """ 读取指标节点的值: 同一根K线之内的重复请求直接返回缓存
+        @param list_node: [(种类, K线数量[, 周期])]
+        @return: {节点: 值}
+        """
+        return self.graph.d0values(list_node)
+
     @staticmethod
     def d0id_valid(id_):
         """ 判断id是否依然有效(仍然持有仓位)
@@ -242,70 +1158,109 @@ class C0Into:
             return False
 
     def d0order_hold(self):
-        """ 持单数据
-        @return: df格式的持单数据(只能使用if xxx is not None/if xxx is None来判断返回值是否存在, 不能使用if xxx/if not xxx)
+        """ 持单数据: 每轮只获取一次, 之后读取快照
+        @return: C0Hold的元组(没有持单时为空元组), 获取失败时返回None(不缓存, 此时持单状态未知)
         """
-        try:
-            hold = MetaTrader5.positions_get(symbol=self.symbol)
-            hold = pandas.DataFrame(list(hold), columns=hold[0]._asdict().keys())
-            hold['time'] = pandas.to_datetime(hold['time'], unit='s')
-            hold = hold[['ticket', 'time', 'type', 'volume', 'price_open', 'sl', 'tp', 'profit', 'symbol']]
-            return hold
-        except IndexError:
+        if "hold" in self.dict_snapshot:
+            return self.dict_snapshot["hold"]
+        hold = self.batch.d0hold(self.symbol) if self.batch is not None else \
+            MetaTrader5.positions_get(symbol=self.symbol)
+        if hold is None:
+            self.log("$持单数据$ 获取失败: 返回空值, 可能是MT5暂时断连", level="error")
             return
+        hold = self.dict_snapshot["hold"] = tuple(C0Hold(i) for i in hold)
+        return hold
 
     def d0order_pend(self):
-        """ 挂单数据
-        @return: df格式的挂单数据(只能使用if xxx is not None/if xxx is None来判断返回值是否存在, 不能使用if xxx/if not xxx)
+        """ 挂单数据: 每轮只获取一次, 之后读取快照
+        @return: C0Pend的元组(没有挂单时为空元组), 获取失败时返回None(不缓存, 此时挂单状态未知)
         """
-        try:
-            pend = MetaTrader5.orders_get(symbol=self.symbol)
-            pend = pandas.DataFrame(list(pend), columns=pend[0]._asdict().keys())
-            pend['time_setup'] = pandas.to_datetime(pend['time_setup'], unit='s')
-            pend = pend[['ticket', 'time_setup', 'type', 'volume_current', 'price_open', 'symbol']]
-            return pend
-        except IndexError:
+        if "pend" in self.dict_snapshot:
+            return self.dict_snapshot["pend"]
+        pend = self.batch.d0pend(self.symbol) if self.batch is not None else \
+            MetaTrader5.orders_get(symbol=self.symbol)
+        if pend is None:
+            self.log("$挂单数据$ 获取失败: 返回空值, 可能是MT5暂时断连", level="error")
             return
+        pend = self.dict_snapshot["pend"] = tuple(C0Pend(i) for i in pend)
+        return pend
 
     def d0account_info(self):
         """ 账户信息
-        @return: df格式的账户信息
+        @return: C0Account, 获取失败时返回None
         """
-        try:
-            account = MetaTrader5.account_info()._asdict()
-            account = pandas.DataFrame(list(account.items()), columns=['property', 'value'])
-            account.index = account['property']
-            account = account[['value']]
-            account = account.loc[['login', 'balance', 'profit', 'equity', 'margin', 'margin_free', 'margin_level']]
-            return account
-        except IndexError:
-            self.log("$账户信息$ 分析失败: 类型错误", level="error")
+        account = self.batch.d0account() if self.batch is not None else MetaTrader5.account_info()
+        if account is None:
+            self.log("$账户信息$ 分析失败: 返回空值, 可能是MT5暂时断连", level="error")
+            return
+        return C0Account(account)
+
+    def d0account_frame(self):
+        """ 账户信息(仅用于显示)
+        @return: df格式的账户信息, 获取失败时返回None
+        """
+        account = self.d0account_info()
+        if account is None:
+            return
+        frame = pandas.DataFrame({'value': [getattr(account, i) for i in C0Account.__slots__]},
+                                 index=pandas.Index(C0Account.__slots__, name='property'), dtype=object)
+        return frame
+
+    def d0snapshot_refresh(self):
+        """ 新的一轮: 作废持单/挂单/报价的快照, 下次读取时重新获取
+        """
+        self.dict_snapshot.clear()
+
+    def d0trade_expire(self):
+        """ 发送订单/平仓之后: 作废持单/挂单/报价的快照, 以及批量数据中已经过时的部分
+        """
+        self.dict_snapshot.clear()
+        self.batch.d0expire() if self.batch is not None else None
 
 
 class C0Away:
-    def __init__(self, c1help, c2help, c0into, symbol, decimal, fail_max):
+    def __init__(self, c0core, c1help, c2help, c0into, symbol, decimal, fail_max,
+                 flatten_worker=4, flatten_retry=3, flatten_pass=2, flatten_deviation=100):
         """ 向外部输出数据
-        注意: 所有指令均只执行发出而不判定执行结果. 如果需要的话, 可能需要进行人工确认
+        注意: 除了清空订单之外, 所有指令均只执行发出而不判定执行结果. 如果需要的话, 可能需要进行人工确认
+        @param c0core: 实例化主类
         @param c1help: 实例化主类
         @param c2help: 实例化主类
         @param c0into: 实例化主类
         @param symbol: 进程标的
         @param decimal: 通用小数
         @param fail_max: 发送订单的最高"连续"失败次数
+        @param flatten_worker: 清空订单时的最大并发数
+        @param flatten_retry: 清空订单时每个单号遇到暂时性返回码的最大重试次数
+        @param flatten_pass: 清空订单的最大轮数(每轮之后重新核对)
+        @param flatten_deviation: 清空持单时的最大成交偏差(点)
         """
         # &实例一赋&
         self.symbol = symbol
         self.decimal = decimal
         self.fail_max = fail_max
+        self.flatten_worker = flatten_worker
+        self.flatten_retry = flatten_retry
+        self.flatten_pass = flatten_pass
+        self.flatten_deviation = flatten_deviation
         # &实例二赋&
         self.log = c1help.d0log
         self.time_secs = c2help.d0time_secs
+        self.time_pause = c2help.d0time_pause
         self.remind_strong = c2help.d0remind_strong
         self.order_hold = c0into.d0order_hold
         self.order_pend = c0into.d0order_pend
+        self.trade_expire = c0into.d0trade_expire
+        self.volume_round = c0into.d0volume_round
+        self.type_filling = c0into.d0type_filling
+        self.ploy_quit = c0core.d0ploy_quit
         # &综合直赋&
         self.new_count_fail = 0
-        self.ploy_quit = C0Core(symbol).d0ploy_quit
+        self.set_retcode_retry = {getattr(MetaTrader5, f"TRADE_RETCODE_{i}", None)
+                                  for i in ("REQUOTE", "PRICE_CHANGED", "PRICE_OFF", "TIMEOUT", "CONNECTION",
+                                            "TOO_MANY_REQUESTS", "LOCKED")} - {None}  # 暂时性的返回码, 可以重试
+        self.set_retcode_gone = {getattr(MetaTrader5, f"TRADE_RETCODE_{i}", None)
+                                 for i in ("POSITION_CLOSED", "INVALID_ORDER")} - {None}  # 订单已经不存在
 
     @staticmethod
     def d0type_buy():
@@ -317,7 +1272,7 @@ class C0Away:
         sell = MetaTrader5.ORDER_TYPE_SELL
         return sell
 
-    def d0send_order(self, type_, volume, price, sl, tp, deviation):
+    def d0send_order(self, type_, volume, price, sl, tp, deviation, magic=0):
         """ 发送订单
         @param type_: 交易类型
         @param volume: 交易数量
@@ -325,19 +1280,22 @@ class C0Away:
         @param sl: 自动止损
         @param tp: 自动止盈
         @param deviation: 最大的成交偏差(点)
+        @param magic: 魔术号(同一标的的多个策略实例以此区分各自的持单)
         @return: fail/交易失败, 订单信息/订单id
         """
         request = {"action": MetaTrader5.TRADE_ACTION_DEAL,
                    "symbol": self.symbol,
                    "type": type_,
-                   "volume": round(volume, 2),
+                   "volume": self.volume_round(volume),
                    "price": price,
                    "sl": float(sl),
                    "tp": float(tp),
                    "deviation": round(deviation),
+                   "magic": magic,
                    "type_time": MetaTrader5.ORDER_TIME_GTC,
-                   "type_filling": MetaTrader5.ORDER_FILLING_FOK}
+                   "type_filling": self.type_filling()}
         result = MetaTrader5.order_send(request)
+        self.trade_expire()
         if result is None:
             self.remind_strong("$发送订单$ 发送失败: 返回空值, 可能是非交易时段或者策略有误", exit_=True)
         elif result.retcode != MetaTrader5.TRADE_RETCODE_DONE:
@@ -358,8 +1316,8 @@ class C0Away:
             if self.new_count_fail >= self.fail_max:
                 self.remind_strong(f"$新建统计$ 新建订单连续失败{self.fail_max}次, "
                                    f"即将在{self.time_secs('super')}之后继续...")
-                self.time_secs("super", sleep=True)
                 self.new_count_fail = 0
+                self.time_pause("super", reason=f"新建订单连续失败{self.fail_max}次")
         elif result == "success":
             self.new_count_fail = 0
 
@@ -378,6 +1336,7 @@ class C0Away:
             else:
                 request = None
             result = MetaTrader5.order_send(request)
+            self.trade_expire()
             if result is None:
                 self.remind_strong(f"$修改平仓$_{id_} 修改失败: 返回空值, 可能是非交易时段或者策略有误")
             elif result.retcode != MetaTrader5.TRADE_RETCODE_DONE:
@@ -397,55 +1356,157 @@ class C0Away:
         """
         try:
             MetaTrader5.Close(self.symbol, ticket=id_)
+            self.trade_expire()
         except TypeError:
             self.log(f"$关闭单号$_{id_} 关闭失败: 类型错误", level="error")
 
+    def d0flatten_one(self, order, kind):
+        """ 关闭一个持单或者删除一个挂单(在线程池中执行), 遇到暂时性的返回码时退避重试
+        @param order: C0Hold/C0Pend
+        @param kind: hold/持单, pend/挂单
+        @return: (单号, 结果, 返回码, 尝试次数), 结果为done/成功, gone/已不存在, fail/失败
+        """
+        retcode = None
+        for i in range(1, self.flatten_retry + 2):
+            if kind == "hold":
+                tick = MetaTrader5.symbol_info_tick(order.symbol)  # 每次尝试都用最新报价, 不用决策快照
+                if tick is None:
+                    result = None
+                else:
+                    is_buy = order.type == self.d0type_buy()  # 持单类型和订单类型的买入都是0
+                    request = {"action": MetaTrader5.TRADE_ACTION_DEAL,
+                               "symbol": order.symbol,
+                               "type": self.d0type_sell() if is_buy else self.d0type_buy(),
+                               "volume": order.volume,
+                               "position": order.ticket,
+                               "price": tick.bid if is_buy else tick.ask,
+                               "deviation": round(self.flatten_deviation),
+                               "magic": order.magic,
+                               "type_time": MetaTrader5.ORDER_TIME_GTC,
+                               "type_filling": self.type_filling()}
+                    result = MetaTrader5.order_send(request)
+            else:
+                request = {"order": order.ticket,
+                           "action": MetaTrader5.TRADE_ACTION_REMOVE,
+                           "type_time": MetaTrader5.ORDER_TIME_GTC,
+                           "type_filling": MetaTrader5.ORDER_FILLING_IOC}
+                result = MetaTrader5.order_send(request)
+            retcode = None if result is None else result.retcode
+            if retcode == MetaTrader5.TRADE_RETCODE_DONE:
+                return order.ticket, "done", retcode, i
+            elif retcode in self.set_retcode_gone:
+                return order.ticket, "gone", retcode, i
+            elif retcode is not None and retcode not in self.set_retcode_retry:
+                break
+            elif i <= self.flatten_retry:
+                time.sleep(0.1 * 2 ** (i - 1))
+        return order.ticket, "fail", retcode, i
+
+    def d0flatten_left(self, hold, pend, magic):
+        """ 重新核对剩余的订单: 先作废快照
+        @param hold: 是否包含持单
+        @param pend: 是否包含挂单
+        @param magic: 只包含该魔术号的订单(None为全部)
+        @return: [(C0Hold/C0Pend, hold/pend)], 获取失败(例如断连)时返回None, 此时订单状态未知
+        """
+        self.trade_expire()
+        list_hold = self.order_hold() if hold else ()
+        list_pend = self.order_pend() if pend else ()
+        if list_hold is None or list_pend is None:
+            return
+        list_left = [(i, "hold") for i in list_hold if magic in (None, i.magic)] + \
+                    [(i, "pend") for i in list_pend if magic in (None, i.magic)]
+        return list_left
+
+    def d0flatten(self, hold=True, pend=True, magic=None):
+        """ 清空持单和挂单: 由有界线程池并发发送, 汇总每个单号的结果, 发送完毕后作废快照并重新核对,
+        仍有剩余时再补一轮, 最后报告清空耗时. 仍然清空不了的话就强提醒人工处理.
+        获取持单/挂单失败时不视为已经清空: 退避之后在下一轮重新获取, 用完轮数仍然未知时同样强提醒
+        @param hold: 是否清空持单
+        @param pend: 是否清空挂单
+        @param magic: 只清空该魔术号的订单(默认None, 即该标的的全部订单)
+        @return: {单号: (类型, 结果, 返回码, 尝试次数)}, 其中类型为hold/持单, pend/挂单
+        """
+        time_begin = time.perf_counter()
+        dict_outcome = {}
+        list_left = None
+        for i in range(self.flatten_pass):
+            list_left = self.d0flatten_left(hold, pend, magic)
+            if list_left is None:
+                self.log(f"$清空订单$ 获取持单/挂单失败: 第{i + 1}轮, 订单状态未知", level="warning")
+                time.sleep(0.1 * 2 ** i)
+                continue
+            if not list_left:
+                break
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.flatten_worker, len(list_left)),
+                                                       thread_name_prefix=f"flatten_{self.symbol}") as pool:
+                list_future = [(kind, pool.submit(self.d0flatten_one, order, kind)) for order, kind in list_left]
+                for kind, future in list_future:
+                    try:
+                        ticket, result, retcode, count = future.result()
+                    except Exception as e:
+                        self.log(f"$清空订单$ 线程异常: {e!r}", level="error")
+                        continue
+                    dict_outcome[ticket] = (kind, result, retcode, count)
+        else:
+            list_left = self.d0flatten_left(hold, pend, magic)
+        msecs = (time.perf_counter() - time_begin) * 1000
+        if dict_outcome:
+            list_result = [i[1] for i in dict_outcome.values()]
+            self.log(f"$清空订单$ "
+                     f"持单={sum(i[0] == 'hold' for i in dict_outcome.values())}, "
+                     f"挂单={sum(i[0] == 'pend' for i in dict_outcome.values())}, "
+                     f"成功={list_result.count('done')}, "
+                     f"已不存在={list_result.count('gone')}, "
+                     f"失败={list_result.count('fail')}, "
+                     f"尝试={sum(i[3] for i in dict_outcome.values())}次, "
+                     f"剩余={'未知' if list_left is None else len(list_left)}, "
+                     f"耗时={msecs:.1f}ms", level="warning")
+            for ticket, (kind, result, retcode, count) in dict_outcome.items():
+                if result == "fail":
+                    self.log(f"$清空订单$_{ticket} 清空失败: 类型={kind}, 返回码={retcode}, 尝试={count}次",
+                             level="warning")
+        if list_left is None:
+            self.log(f"$清空订单$ 清空{self.flatten_pass}轮之后仍然无法获取持单/挂单", level="error")
+            self.remind_strong(f"$清空订单$ 清空{self.flatten_pass}轮之后订单状态仍然未知, 需要人工处理")
+        elif list_left:
+            self.remind_strong(f"$清空订单$ 清空{self.flatten_pass}轮之后仍有{len(list_left)}个订单, 需要人工处理")
+        return dict_outcome
+
     def d0clear_hold(self):
         """ 清空所有持单
         """
-        if len(self.order_hold()) > 0:
-            try:
-                for i in self.order_hold()['ticket']:
-                    MetaTrader5.Close(self.symbol, ticket=i)
-            except TypeError:
-                self.log("$清空持单$ 清空失败: 类型错误", level="error")
+        return self.d0flatten(hold=True, pend=False)
 
     def d0clear_pend(self):
         """ 清空所有挂单
         """
-        if len(self.order_pend()) > 0:
-            try:
-                for i in self.order_pend()['ticket']:
-                    request = {"order": i,
-                               "action": MetaTrader5.TRADE_ACTION_REMOVE,
-                               "type_time": MetaTrader5.ORDER_TIME_GTC,
-                               "type_filling": MetaTrader5.ORDER_FILLING_IOC}
-                    result = MetaTrader5.order_send(request)
-                    if result.retcode != MetaTrader5.TRADE_RETCODE_DONE:
-                        self.log(f"$清空挂单$ 清空失败: 单号={i}", level="warning")
-            except TypeError:
-                self.log("$清空挂单$ 清空失败: 类型错误", level="error")
+        return self.d0flatten(hold=False, pend=True)
 
 
 class C3Help:
-    def __init__(self, c1help, c2help, c0into, c0away, symbol, decimal,
-                 balance_begin, balance_margin, balance_shrink):
+    def __init__(self, c0core, c1help, c2help, c0into, c0away, c0calendar, symbol, decimal,
+                 balance_begin, balance_margin, balance_shrink, process_share=False):
         """ 辅助类3/3: 只适用于且部分适用于进程
+        @param c0core: 实例化主类
         @param c1help: 实例化主类
         @param c2help: 实例化主类
         @param c0into: 实例化主类
         @param c0away: 实例化主类
+        @param c0calendar: 实例化主类
         @param symbol: 进程标的
         @param decimal: 通用小鼠
         @param balance_begin: 初始资金
         @param balance_margin: 预付比例
         @param balance_shrink: 最大回撤
+        @param process_share: 是否与其他标的共用进程(共用时由调度器跳过休市的标的, 不在这里休眠)
         """
         # %实例一赋%
         self.decimal = decimal
         self.balance_begin = balance_begin
         self.balance_margin = balance_margin
         self.balance_shrink = balance_shrink
+        self.process_share = process_share
 
         # %实例二赋%
         self.log = c1help.d0log
@@ -453,30 +1514,31 @@ class C3Help:
         self.remind_strong = c2help.d0remind_strong
         self.order_hold = c0into.d0order_hold
         self.order_pend = c0into.d0order_pend
+        self.snapshot_refresh = c0into.d0snapshot_refresh
         self.account_info = c0into.d0account_info
-        self.clear_hold = c0away.d0clear_hold
-        self.clear_pend = c0away.d0clear_pend
+        self.flatten = c0away.d0flatten
+        self.calendar_open = c0calendar.d0is_open
+        self.calendar_sleep = c0calendar.d0sleep_open
+        self.config_connect = c0core.d0config_connect
+        self.ploy_quit = c0core.d0ploy_quit
         # &综合预赋&
         self.done_show_shrink = False
         self.done_show_margin = False
-        # %综合混赋%
-        self.config_connect = C0Core(symbol).d0config_connect
-        self.ploy_quit = C0Core(symbol).d0ploy_quit
 
     def _arrange_holiday(self):
-        """ 节假日/休息日的时间安排
+        """ 节假日/休息日的时间安排: 交易时段内每轮只比较一次时间, 休市时一次性休眠到交易日历给出的下次开盘
         """
-        content_end = "@事务处理@_假期收尾 正在进行假期休眠..."
-        content_start = "$事务处理$_假期收尾 进入开盘并退出休眠"
-        schedule.every().friday.at("23:59:00").do(self.log, content=content_end, level="warning")
-        schedule.every().friday.at("23:59:00").do(time.sleep, 48 * 3600 + 2 * 60)
-        schedule.every().monday.at("00:01:00").do(self.log, content=content_start, level="warning")
-        schedule.run_pending()
+        if self.process_share or self.calendar_open():
+            return
+        self.calendar_sleep()
 
     def _capital_shrink(self):
         """ 最大的回撤比例: 分析当前的账户回撤是否符合要求
         """
-        balance = self.account_info().loc['balance', 'value']
+        account = self.account_info()
+        if account is None:
+            return
+        balance = account.balance
         shrink = (self.balance_begin - balance) / self.balance_begin
         if shrink > 0:
             if shrink > self.balance_shrink:
@@ -491,7 +1553,10 @@ class C3Help:
     def _capital_margin(self):
         """ 最小的预付比例: 分析当前的预付款的比例是否符合要求
         """
-        margin = self.account_info().loc['margin_level', 'value'] / 100
+        account = self.account_info()
+        if account is None:
+            return
+        margin = account.margin_level / 100
         if margin > 0:
             if margin < self.balance_margin:
                 self.remind_strong(f"$事务处理$_最小预付 "
@@ -506,7 +1571,10 @@ class C3Help:
     def _capital_balance(self):
         """ 期初时的资金复位: 在期初分析账户资金是否复位(每次启动程序都视为期初并显示且仅显示一次)
         """
-        balance = round(self.account_info().loc['balance', 'value'])
+        account = self.account_info()
+        if account is None:
+            return
+        balance = round(account.balance)
         differ = abs(self.balance_begin - balance)
         percent = balance / self.balance_begin
         deal = "补充" if balance < self.balance_begin else "提取"
@@ -514,11 +1582,12 @@ class C3Help:
                  f"结余/期初={balance}USD/{self.balance_begin}USD={round(percent * 100)}%, "
                  f"需要{deal}={differ}USD", level="warning")
 
-    def _ensure_blank(self):
-        """ 确保持单和挂单为空: 确保当前没有持单和挂单
+    def _ensure_blank(self, magic=None):
+        """ 确保持单和挂单为空: 确保当前没有持单和挂单(先作废快照, 以券商的最新状态为准)
+        @param magic: 只清空该魔术号的订单(默认None, 即该标的的全部订单)
         """
-        self.clear_hold() if self.order_hold() is not None else None
-        self.clear_pend() if self.order_pend() is not None else None
+        self.snapshot_refresh()
+        self.flatten(magic=magic) if self.order_hold() or self.order_pend() else None
 
     def d0toolbox_common(self):
         """ 自定义组合_通用: 登录程序的时候需要处理的事项
@@ -533,15 +1602,267 @@ class C3Help:
         self._capital_shrink()
         self._capital_margin()
 
-    def d0toolbox_blank(self):
+    def d0toolbox_blank(self, magic=None):
         """ 自定义组合_空仓: 确保当前没有持单和挂单
+        @param magic: 只清空该魔术号的订单(默认None, 即该标的的全部订单)
         """
-        self._ensure_blank()
+        self._ensure_blank(magic=magic)
+
+
+class C0Record:
+    dict_field = {"open_id": int,
+                  "open_price": float,
+                  "open_type": str,
+                  "done_open": bool,
+                  "done_protect": bool}  # 字段: 类型
+
+    def __init__(self, c1help, name):
+        """ 策略状态的记录文件: 启动时只解析一次, 之后只在状态变化时写入
+        写入时先写临时文件并落盘, 再原子替换正式文件, 因此任何时刻崩溃都只会留下完整的旧记录或者完整的新记录
+        @param c1help: 实例化主类
+        @param name: 记录文件名(通常为标的)
+        """
+        # &实例一赋&
+        self.path = ".\\record"
+        self.file = f"{self.path}\\{name}.json"
+        self.file_old = f"{self.path}\\{name}.txt"  # 旧版的记录文件
+        # &实例二赋&
+        self.log = c1help.d0log
+        # &综合预赋&
+        self.saved = None  # 最后一次写入(或读取)的状态
+
+    def d0load(self):
+        """ 读取记录: 没有json记录时兼容读取一次旧版的txt记录
+        @return: None/没有有效记录, {字段: 值}/读取成功
+        """
+        try:
+            if os.path.exists(self.file):
+                with open(self.file) as f:
+                    record = json.load(f)
+            else:
+                with open(self.file_old) as f:
+                    record = dict(zip(self.dict_field, [ast.literal_eval(i) for i in f.read().split()]))
+            record = {key: type_(record[key]) for key, type_ in self.dict_field.items()}
+        except FileNotFoundError:
+            self.log("$记录处理$ 读取失败: 没有记录文件", level="warning")
+            return
+        except (ValueError, TypeError, KeyError, SyntaxError):
+            self.log("$记录处理$ 读取失败: 无效记录数据", level="warning")
+            return
+        self.saved = record
+        return record
+
+    def d0save(self, record):
+        """ 写入记录: 与上次相同时直接跳过
+        @param record: {字段: 值}
+        @return: True/已写入, False/无变化或者写入失败
+        """
+        if record == self.saved:
+            return False
+        os.makedirs(self.path) if not os.path.exists(self.path) else None
+        file_tmp = f"{self.file}.tmp"
+        try:
+            with open(file_tmp, "w") as f:
+                json.dump(record, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(file_tmp, self.file)
+        except (OSError, TypeError):
+            self.log("$记录处理$ 写入失败: 类型错误/无法写入", level="error")
+            return False
+        self.saved = dict(record)
+        return True
+
+
+class C0Store:
+    dtype_tick = numpy.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8')])
+
+    def __init__(self, c1help, path, symbol, count_flush=256):
+        """ 本地历史库: 每个标的一组按列存储的追加文件, 每个周期(以及报价)一组, 每个字段一个文件, 另有一个json索引
+        追加时先写各列再原子替换索引, 因此崩溃时最多在列文件末尾留下索引之外的数据, 下次打开时截掉
+        读取时按列内存映射(零拷贝), 时间列有序, 因此按时间的区间查询只需二分查找
+        @param c1help: 实例化主类
+        @param path: 历史库文件夹
+        @param symbol: 标的
+        @param count_flush: 报价缓冲达到该数量时追加写入
+        """
+        # &实例一赋&
+        self.path = path
+        self.symbol = symbol
+        self.count_flush = count_flush
+        # &实例二赋&
+        self.log = c1help.d0log
+        # &综合预赋&
+        self.dict_index = {}  # 种类(周期或者tick): 索引
+        self.list_tick = []  # 尚未写入的报价(time_msc, bid, ask)
+        atexit.register(self.d0flush)
+
+    def d0base(self, kind):
+        """ 某一种类的文件名前缀
+        @param kind: 周期(MT5的K线周期代号)或者tick
+        @return: 文件名前缀
+        """
+        return f"{self.path}\\{self.symbol}_{kind}"
+
+    def d0index(self, kind):
+        """ 读取索引: 每个种类只在首次读取时检查一次列文件, 截掉索引之外的数据, 列文件缺损时按最短的列修正索引
+        @param kind: 周期或者tick
+        @return: {dtype/字段, key/时间字段, count/行数, time_last/最后的时间}, 没有数据时返回None
+        """
+        if kind in self.dict_index:
+            return self.dict_index[kind]
+        base = self.d0base(kind)
+        try:
+            with open(f"{base}.json") as f:
+                index = json.load(f)
+            dtype = numpy.dtype([tuple(i) for i in index["dtype"]])
+            count = index["count"]
+            for name in dtype.names:
+                size = os.path.getsize(f"{base}.{name}") if os.path.exists(f"{base}.{name}") else 0
+                count = min(count, size // dtype[name].itemsize)
+            for name in dtype.names:
+                size = count * dtype[name].itemsize
+                if os.path.exists(f"{base}.{name}") and os.path.getsize(f"{base}.{name}") > size:
+                    os.truncate(f"{base}.{name}", size)
+            if count != index["count"]:
+                self.log(f"$历史数据$ {self.symbol}_{kind} 索引修正: {index['count']}->{count}行", level="warning")
+                time_ = numpy.memmap(f"{base}.{index['key']}", dtype=dtype[index['key']], mode='r', shape=(count,)) \
+                    if count > 0 else None
+                index.update(count=count, time_last=int(time_[-1]) if count > 0 else None)
+                self.d0index_save(kind, index)
+        except FileNotFoundError:
+            index = None
+        except (OSError, ValueError, TypeError, KeyError):
+            self.log(f"$历史数据$ {self.symbol}_{kind} 读取失败: 无效索引", level="error")
+            index = None
+        self.dict_index[kind] = index
+        return index
+
+    def d0index_save(self, kind, index):
+        """ 写入索引: 先写临时文件再原子替换
+        @param kind: 周期或者tick
+        @param index: 索引
+        """
+        file = f"{self.d0base(kind)}.json"
+        with open(f"{file}.tmp", "w") as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{file}.tmp", file)
+
+    def d0append(self, kind, data, key):
+        """ 追加数据: 只追加时间晚于已有数据的行
+        @param kind: 周期或者tick
+        @param data: numpy结构化数组(时间升序)
+        @param key: 时间字段
+        @return: 追加的行数
+        """
+        index = self.d0index(kind)
+        if index is not None and index["time_last"] is not None:
+            data = data[data[key] > index["time_last"]]
+        if len(data) == 0:
+            return 0
+        if index is None:
+            index = {"dtype": [[name, data.dtype[name].str] for name in data.dtype.names],
+                     "key": key, "count": 0, "time_last": None}
+        dtype = numpy.dtype([tuple(i) for i in index["dtype"]])
+        base = self.d0base(kind)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            for name in dtype.names:
+                with open(f"{base}.{name}", "ab") as f:
+                    f.write(numpy.ascontiguousarray(data[name], dtype=dtype[name]).tobytes())
+            index = dict(index, count=index["count"] + len(data), time_last=int(data[key][-1]))
+            self.d0index_save(kind, index)
+        except (OSError, ValueError):
+            self.log(f"$历史数据$ {self.symbol}_{kind} 写入失败: 无法写入/字段不一致", level="error")
+            self.dict_index.pop(kind, None)  # 下次读取时按列文件重新检查
+            return 0
+        self.dict_index[kind] = index
+        return len(data)
+
+    def d0bar_save(self, bar_frame, bar):
+        """ 保存已收盘的K线(最后一根视为正在形成的K线, 不保存), 没有新收盘的K线时只比较一次时间
+        新K线收盘时顺便写入缓冲的报价
+        @param bar_frame: 周期
+        @param bar: numpy结构化数组格式的K线(时间升序)
+        """
+        if bar is None or len(bar) < 2:
+            return
+        index = self.d0index(bar_frame)
+        if index is not None and index["time_last"] is not None and bar['time'][-2] <= index["time_last"]:
+            return
+        self.d0append(bar_frame, bar[:-1], "time")
+        self.d0flush()
+
+    def d0tick_put(self, tick):
+        """ 缓冲一个报价, 达到count_flush时追加写入
+        @param tick: C0Tick
+        """
+        self.list_tick.append((tick.time_msc, tick.bid, tick.ask))
+        self.d0flush() if len(self.list_tick) >= self.count_flush else None
+
+    def d0flush(self):
+        """ 写入缓冲的报价
+        """
+        if self.list_tick:
+            self.d0append("tick", numpy.array(self.list_tick, dtype=self.dtype_tick), "time_msc")
+            self.list_tick = []
+
+    def d0columns(self, kind, time_from=None, time_to=None):
+        """ 按时间区间读取各列: 内存映射, 零拷贝
+        @param kind: 周期或者tick
+        @param time_from: 起始时间(含, K线为秒, 报价为毫秒), 默认最早
+        @param time_to: 结束时间(含), 默认最晚
+        @return: {字段: 只读的numpy.memmap}, 没有数据时返回空字典
+        """
+        index = self.d0index(kind)
+        if index is None or index["count"] == 0:
+            return {}
+        dtype = numpy.dtype([tuple(i) for i in index["dtype"]])
+        base = self.d0base(kind)
+        count = index["count"]
+        time_ = numpy.memmap(f"{base}.{index['key']}", dtype=dtype[index['key']], mode='r', shape=(count,))
+        start = 0 if time_from is None else numpy.searchsorted(time_, time_from, side='left')
+        end = count if time_to is None else numpy.searchsorted(time_, time_to, side='right')
+        dict_column = {name: time_[start:end] if name == index['key'] else
+                       numpy.memmap(f"{base}.{name}", dtype=dtype[name], mode='r', shape=(count,))[start:end]
+                       for name in dtype.names}
+        return dict_column
+
+    def d0bars(self, kind, count=None, time_from=None, time_to=None):
+        """ 按时间区间读取为结构化数组(复制), 用于预热K线缓存/回放/回测
+        @param kind: 周期或者tick
+        @param count: 只取区间内最后的count行(默认全部)
+        @param time_from: 起始时间(含)
+        @param time_to: 结束时间(含)
+        @return: numpy结构化数组(时间升序), 没有数据时返回None
+        """
+        dict_column = self.d0columns(kind, time_from, time_to)
+        if not dict_column:
+            return
+        length = len(next(iter(dict_column.values())))
+        length = length if count is None else min(count, length)
+        data = numpy.empty(length, dtype=[(name, column.dtype) for name, column in dict_column.items()])
+        for name, column in dict_column.items():
+            data[name] = column[len(column) - length:]
+        return data
 
 
 class C1Ploy:
-    def __init__(self, c1help, c2help, c0into, c0away, c3help, symbol, decimal, bar_frame):
-        """ 交易策略P1
+    # 回测参数: 择时快线/择时慢线/择位快线/择位慢线/择向快线/择向慢线(根), 实际止损(USD)
+    dict_test_param = {"AUDUSD": [],
+                       "EURUSD": [2, 3, 21, 38, 110, 186, 3.22],
+                       "GBPUSD": [2, 3, 27, 46, 115, 195, 3.12],
+                       "NZDUSD": [],
+                       "USDCAD": [],
+                       "USDCHF": [],
+                       "USDJPY": [2, 3, 20, 36, 119, 166, 3.46]}  # TODO
+
+    def __init__(self, c0core, c1help, c2help, c0into, c0away, c3help, symbol, decimal, bar_frame,
+                 circle_event, secs_tick, name="P1", magic=0, risk=1.0, list_param=None):
+        """ 交易策略P1: 同一标的可以运行多个实例, 各自以魔术号区分持单, 各自有记录文件和风险预算
+        @param c0core: 实例化主类
         @param c1help: 实例化主类
         @param c2help: 实例化主类
         @param c0into: 实例化主类
@@ -550,11 +1871,23 @@ class C1Ploy:
         @param symbol: 通用标的
         @param decimal: 通用小数
         @param bar_frame: 操作周期
+        @param circle_event: 是否使用事件驱动的循环
+        @param secs_tick: 事件驱动时轮询报价的间隔(秒)
+        @param name: 策略名称(策略注册表中的名称)
+        @param magic: 魔术号, 0为默认实例(记录文件沿用标的名称)
+        @param risk: 风险预算(*实际止损)
+        @param list_param: 回测参数(默认None, 即dict_test_param中该标的的参数)
         """
         # &实例一赋&
         self.symbol = symbol
         self.decimal = decimal
         self.bar_frame = bar_frame
+        self.circle_event = circle_event
+        self.secs_tick = secs_tick
+        self.name = name
+        self.magic = magic
+        self.risk = risk
+        self.list_param = list_param
         # &实例二赋&
         self.log = c1help.d0log
         self.time_secs = c2help.d0time_secs
@@ -563,16 +1896,22 @@ class C1Ploy:
         self.price_bid = c0into.d0price_bid
         self.tick_size = c0into.d0tick_size
         self.tick_value = c0into.d0tick_value
-        self.indicator_ma = c0into.d0indicator_ma
-        self.indicator_atr = c0into.d0indicator_atr
+        self.volume_round = c0into.d0volume_round
+        self.indicator_values = c0into.d0indicator_values
         self.id_valid = c0into.d0id_valid
+        self.tick_info = c0into.d0tick_info
+        self.tick_stats = c0into.d0tick_stats
+        self.bar_open = c0into.d0bar_open
         self.order_hold = c0into.d0order_hold
+        self.snapshot_refresh = c0into.d0snapshot_refresh
         self.type_buy = c0away.d0type_buy
         self.type_sell = c0away.d0type_sell
         self.send_order = c0away.d0send_order
         self.modify_close = c0away.d0modify_close
         self.toolbox_ploy = c3help.d0toolbox_ploy
         self.toolbox_blank = c3help.d0toolbox_blank
+        self.ploy_quit = c0core.d0ploy_quit
+        self.record = C0Record(c1help=c1help, name=symbol if magic == 0 else f"{symbol}_{magic}")
         # &策略预赋&
         self.count_when_fast = 0
         self.count_when_slow = 0
@@ -612,94 +1951,157 @@ class C1Ploy:
         self.occupy_sl_protect_move = 0.1
         self.occupy_sl_spread = 0.2
         self.common_point_spread = 30
-        # &综合混赋&
-        self.ploy_quit = C0Core(self.symbol).d0ploy_quit
+        self.count_atr = 300  # 分析atr的K线的数量
+        self.count_delay = 1000  # 事件驱动时保留的最近耗时的数量
+        # &事件预赋&
+        self.event_tick_time = None  # 上次处理的报价时间(毫秒)
+        self.event_bar_time = None  # 当前K线的开盘时间
+        self.event_check_time = 0  # 上次运行策略环境的时间(time.monotonic)
+        self.event_count_tick = 0  # 当前K线期间的新报价次数
+        self.event_list_delay = deque(maxlen=self.count_delay)  # 最近的耗时(秒)
 
     def d0circle_center(self):
         """ 统御所有分支函数以及其返回值的中心
         """
+        self.d0circle_begin()
+        if self.circle_event:
+            self.d0circle_event()
+        while True:
+            self.time_secs("short", sleep=True)
+            self.d0circle_step()
+
+    def d0circle_begin(self):
+        """ 进入循环之前: 同步上次退出时未处理完成的订单数据
+        """
         if self.d0record_sync() is False:
             self.d0clear_data(always=True)
             self.log("~循环中心~ 即将开启新一轮的循环. 正在循环...")
         else:
             self.log("~循环中心~ 继续执行上一轮的循环. 正在循环...")
+
+    def d0circle_step(self):
+        """ 固定间隔的循环中的一轮: 运行策略环境并且重新计算全部指标
+        """
+        self.snapshot_refresh()
+        self.toolbox_ploy()
+        self.d0circle_work()
+
+    def d0circle_work(self):
+        """ 固定间隔的循环中的策略部分: 不刷新快照也不运行策略环境(同一标的的多个策略实例共用)
+        """
+        self.d0param_analyse()
+        self.d0param_show()
+        self.d0ma_cross()
+        self.d0make_order() if self.d0common_limit() else None
+        self.d0protect_cost()
+        self.d0clear_data()
+        self.d0record_save()
+
+    def d0circle_event(self):
+        """ 事件驱动的循环: 每隔secs_tick轮询一次报价
+        报价变化: 只做逐笔检查(点差限制/开仓/平保), 新K线开盘: 才重新计算全部指标, 每隔secs_short: 运行策略环境
+        """
         while True:
-            self.time_secs("short", sleep=True)
+            time.sleep(self.secs_tick)
+            self.d0event_step()
+
+    def d0event_step(self):
+        """ 事件驱动的循环中的一次轮询
+        """
+        self.snapshot_refresh()
+        if time.monotonic() - self.event_check_time >= self.time_secs("short").total_seconds():
             self.toolbox_ploy()
+            self.event_check_time = time.monotonic()
+        self.d0event_work()
+
+    def d0event_work(self):
+        """ 事件驱动的循环中的策略部分: 不刷新快照也不运行策略环境(同一标的的多个策略实例共用)
+        """
+        tick = self.tick_info()
+        if tick is None or tick.time_msc == self.event_tick_time:
+            return
+        begin = time.perf_counter()
+        self.event_tick_time = tick.time_msc
+        bar_new = self.bar_open(tick.time)
+        bar_event = bar_new != self.event_bar_time
+        if bar_event:
+            self.d0event_show(self.event_bar_time, self.event_count_tick, self.event_list_delay) \
+                if self.event_bar_time is not None else None
+            self.event_bar_time = bar_new
+            self.event_count_tick = 0
             self.d0param_analyse()
             self.d0param_show()
             self.d0ma_cross()
-            self.d0make_order() if self.d0common_limit() else None
-            self.d0protect_cost()
-            self.d0clear_data()
-            self.d0record_deal(deal="write", content=f"{self.open_id} "
-                                                     f"{self.open_price} "
-                                                     f"'{self.open_type}' "
-                                                     f"{self.done_open} "
-                                                     f"{self.done_protect}")
+        self.event_count_tick += 1
+        self.d0make_order() if self.d0common_limit() else None
+        self.d0protect_cost()
+        self.d0clear_data() if bar_event else None
+        self.d0record_save()
+        self.event_list_delay.append(time.perf_counter() - begin)
+
+    def d0event_show(self, bar_time, count_tick, list_delay):
+        """ 显示事件驱动的统计: 从发现新报价到处理完成的耗时(另有最多secs_tick的轮询等待)
+        @param bar_time: 上一根K线的开盘时间
+        @param count_tick: 上一根K线期间的新报价次数
+        @param list_delay: 最近的耗时(秒)
+        """
+        if len(list_delay) > 0:
+            delay = numpy.percentile(numpy.array(list_delay) * 1000, [50, 99, 100])
+            stats = self.tick_stats()
+            content = "" if stats is None else \
+                f", 最近1分钟: 报价={stats['count']}次, " \
+                f"平均点差={round(stats['spread_mean'] / self.tick_size())}点, " \
+                f"最大点差={round(stats['spread_max'] / self.tick_size())}点"
+            self.log(f"~事件循环~ K线={pandas.to_datetime(bar_time, unit='s')}, 新报价={count_tick}次, "
+                     f"报价到处理耗时: p50={round(delay[0], 2)}ms, p99={round(delay[1], 2)}ms, "
+                     f"最大={round(delay[2], 2)}ms, 轮询间隔={self.secs_tick}s{content}")
+
+    def d0record_save(self):
+        """ 将当前的订单数据写入记录文件(只在数据变化时写入)
+        """
+        self.record.d0save({"open_id": self.open_id,
+                            "open_price": self.open_price,
+                            "open_type": self.open_type,
+                            "done_open": self.done_open,
+                            "done_protect": self.done_protect})
 
     def d0record_sync(self):
         """ 每次启动程序的时候, 检查一下是否有上次程序退出之时未处理完成的订单数据
         @return: False/同步失败, 相关数据/同步成功
         """
-        if self.d0record_deal() is False:
+        record = self.record.d0load()
+        if record is None:
             return False
-        else:
-            try:
-                open_id = self.d0record_deal()[0]
-                if not self.id_valid(open_id):
-                    self.log("$记录同步$ 同步失败: 单号为空/无效", level="warning")
-                    return False
-            except TypeError:
-                self.log("$记录同步$ 同步失败: 类型错误", level="error")
-                return False
-            self.open_id = open_id
-            self.open_price = self.d0record_deal()[1]
-            self.open_type = self.d0record_deal()[2]
-            self.done_open = self.d0record_deal()[3]
-            self.done_protect = self.d0record_deal()[4]
-
-    def d0record_deal(self, deal="read", content=None):
-        """ 读取和写入数据到记录文件
-        @param deal: write/写入, read/读取(默认)
-        @param content: 写入内容(默认无)
-        @return: False/处理失败, 相关数据/处理成功
-        """
-        os.makedirs(".\\record") if not os.path.exists(".\\record") else None
-        file = f".\\record\\{self.symbol}.txt"
-        if deal == "write":
-            try:
-                with open(file, 'w+') as f:
-                    f.write(str(content))
-            except TypeError:
-                self.log("$记录处理$ 写入失败: 类型错误", level="error")
-                return False
-        elif deal == "read":
-            try:
-                list_data = []
-                with open(file) as f:
-                    for line in f:
-                        list_data.extend([eval(i) for i in line.split()])
-                    return list_data
-            except FileNotFoundError:
-                self.log("$记录处理$ 读取失败: 没有记录文件", level="warning")
-                return False
-            except SyntaxError:
-                self.log("$记录处理$ 读取失败: 无效记录数据", level="warning")
-                return False
+        if not self.id_valid(record["open_id"]):
+            self.log("$记录同步$ 同步失败: 单号为空/无效", level="warning")
+            return False
+        self.open_id = record["open_id"]
+        self.open_price = record["open_price"]
+        self.open_type = record["open_type"]
+        self.done_open = record["done_open"]
+        self.done_protect = record["done_protect"]
+        return record
+
+    def d0hold_own(self):
+        """ 本策略实例的持单: 从同一份持单快照中按魔术号筛选, 不额外调用MT5
+        @return: C0Hold的元组, 获取失败时返回None
+        """
+        hold = self.order_hold()
+        return None if hold is None else tuple(i for i in hold if i.magic == self.magic)
+
+    def d0indicator_node(self):
+        """ 本策略实例需要的指标节点: 配置时预先声明, 同一标的的多个策略实例的相同节点只计算一次
+        @return: [(种类, K线数量)]
+        """
+        list_test_param = self.dict_test_param.get(self.symbol, []) if self.list_param is None else self.list_param
+        list_node = [("ma", i) for i in list_test_param[:6]] + [("atr", self.count_atr)]
+        return list_node
 
     def d0param_analyse(self):
         """ 分析所有策略需要用到的参数
         """
-        dict_test_param = {"AUDUSD": [],
-                           "EURUSD": [2, 3, 21, 38, 110, 186, 3.22],
-                           "GBPUSD": [2, 3, 27, 46, 115, 195, 3.12],
-                           "NZDUSD": [],
-                           "USDCAD": [],
-                           "USDCHF": [],
-                           "USDJPY": [2, 3, 20, 36, 119, 166, 3.46]}  # TODO
-        list_test_param = dict_test_param[self.symbol]
-        if self.symbol not in dict_test_param or list_test_param == []:
+        list_test_param = self.dict_test_param.get(self.symbol, []) if self.list_param is None else self.list_param
+        if list_test_param == []:
             self.log("$分析参数$ 分析失败: 尚未配置标的/标的参数为空", level="error")
             self.ploy_quit()
         else:
@@ -709,22 +2111,25 @@ class C1Ploy:
             self.count_where_slow = list_test_param[3]
             self.count_which_fast = list_test_param[4]
             self.count_which_slow = list_test_param[5]
-            self.actual_sl_amount = list_test_param[6]
-
-        self.when_fast = self.indicator_ma(self.count_when_fast)
-        self.when_slow = self.indicator_ma(self.count_when_slow)
-        self.where_fast = self.indicator_ma(self.count_where_fast)
-        self.where_slow = self.indicator_ma(self.count_where_slow)
-        self.which_fast = self.indicator_ma(self.count_which_fast)
-        self.which_slow = self.indicator_ma(self.count_which_slow)
+            self.actual_sl_amount = list_test_param[6] * self.risk
+
+        dict_value = self.indicator_values(self.d0indicator_node())
+        self.when_fast = dict_value[("ma", self.count_when_fast)]
+        self.when_slow = dict_value[("ma", self.count_when_slow)]
+        self.where_fast = dict_value[("ma", self.count_where_fast)]
+        self.where_slow = dict_value[("ma", self.count_where_slow)]
+        self.which_fast = dict_value[("ma", self.count_which_fast)]
+        self.which_slow = dict_value[("ma", self.count_which_slow)]
         try:
-            self.range_sl = self.indicator_atr() * self.occupy_atr_sl
-            self.range_cross_where = self.indicator_atr() * self.occupy_atr_cross_where
+            atr = dict_value[("atr", self.count_atr)]
+            self.range_sl = atr * self.occupy_atr_sl
+            self.range_cross_where = atr * self.occupy_atr_cross_where
             self.range_protect_touch = self.range_sl * self.occupy_sl_protect_touch
             self.range_protect_move = self.range_sl * self.occupy_sl_protect_move
             self.limit_point_spread = self.range_sl * self.occupy_sl_spread / self.tick_size()
             self.open_deviation = self.range_sl / self.tick_size() / 10
-            self.open_volume = self.actual_sl_amount / (self.range_sl / self.tick_size() * self.tick_value())
+            self.open_volume = self.volume_round(self.actual_sl_amount /
+                                                 (self.range_sl / self.tick_size() * self.tick_value()))
         except ZeroDivisionError or AttributeError:
             self.log("$分析参数$ 分析失败: 可能是MT5暂时断连(必要时需人工排查)", level="error")
 
@@ -733,6 +2138,9 @@ class C1Ploy:
         """
         if not self.done_show:
             self.log(f"\n核心配置0: "
+                     f"策略={self.name}, "
+                     f"魔术号={self.magic}, "
+                     f"风险预算={self.risk}*实际止损, "
                      f"操作周期={self.bar_frame}(MT5代号)\n"
                      f"策略直赋0: "
                      f"标准止损={self.datum_sl_amount}USD, "
@@ -765,7 +2173,11 @@ class C1Ploy:
             self.done_show = True
 
     def d0common_limit(self):
-        spread_ratio = (self.price_ask() - self.price_bid()) / self.range_sl
+        tick = self.tick_info()
+        if tick is None:
+            self.log("$常规限制$ 报价获取失败: 返回空值, 可能是MT5暂时断连", level="error")
+            return False
+        spread_ratio = tick.spread / self.range_sl
         result = True if spread_ratio <= self.occupy_sl_spread and self.open_volume > 0 else False
         if self.open_volume <= 0:
             self.log("$常规限制$ 开仓数量<=0(通过调整止损比例/操作周期/开仓金额等可以避免此类问题)", level="warning")
@@ -792,14 +2204,15 @@ class C1Ploy:
     def d0make_order(self):
         """ 判定是否可以制作订单
         """
-        if self.order_hold() is None and not self.done_open and self.open_type != "/":
+        if self.d0hold_own() == () and not self.done_open and self.open_type != "/":
             basic = True if self.open_type == "buy" else False
             send = self.send_order(type_=self.type_buy() if basic else self.type_sell(),
                                    volume=self.open_volume,
                                    price=self.price_ask() if basic else self.price_bid(),
                                    sl=0,
                                    tp=0,
-                                   deviation=self.open_deviation)
+                                   deviation=self.open_deviation,
+                                   magic=self.magic)
             if send != "fail":
                 self.open_id = send[0]
                 self.open_price = send[1]
@@ -810,11 +2223,12 @@ class C1Ploy:
     def d0protect_cost(self):
         """ 判定是否需要执行平保
         """
-        if self.order_hold() is not None and not self.done_protect:
-            if self.open_type == "buy" and self.price_bid() > self.open_price + self.range_protect_touch:
+        tick = self.tick_info()
+        if tick is not None and self.d0hold_own() and not self.done_protect:
+            if self.open_type == "buy" and tick.bid > self.open_price + self.range_protect_touch:
                 self.modify_close(id_=self.open_id, price=self.open_price + self.range_protect_move)
                 self.done_protect = True
-            elif self.open_type == "sell" and self.price_ask() < self.open_price - self.range_protect_touch:
+            elif self.open_type == "sell" and tick.ask < self.open_price - self.range_protect_touch:
                 self.modify_close(id_=self.open_id, price=self.open_price - self.range_protect_move)
                 self.done_protect = True
 
@@ -830,13 +2244,873 @@ class C1Ploy:
         if (always or
                 self.open_type == "buy" and self.cross_where_new == "short" or
                 self.open_type == "sell" and self.cross_where_new == "long"):
-            self.toolbox_blank()
+            self.toolbox_blank(magic=self.magic)
             self.open_id = self.open_price = 0
             self.open_type = "/"
             self.done_open = self.done_protect = False
 
 
+class C0PloySet:
+    def __init__(self, c1help, c2help, c0into, c3help, list_ploy, circle_event, secs_tick):
+        """ 同一标的的多个策略实例: 共用一个进程/一个会话/一份报价和K线/一份持单快照
+        每轮只刷新一次快照并且只运行一次策略环境, 然后每个策略实例只运行自己的策略部分, 因此增加策略不会增加MT5调用
+        @param c1help: 实例化主类
+        @param c2help: 实例化主类
+        @param c0into: 实例化主类
+        @param c3help: 实例化主类
+        @param list_ploy: 策略实例(C1Ploy或者接口相同的策略类)
+        @param circle_event: 是否使用事件驱动的循环
+        @param secs_tick: 事件驱动时轮询报价的间隔(秒)
+        """
+        # &实例一赋&
+        self.list_ploy = list_ploy
+        self.circle_event = circle_event
+        self.secs_tick = secs_tick
+        # &实例二赋&
+        self.log = c1help.d0log
+        self.time_secs = c2help.d0time_secs
+        self.snapshot_refresh = c0into.d0snapshot_refresh
+        self.toolbox_ploy = c3help.d0toolbox_ploy
+        # &综合预赋&
+        self.event_check_time = 0  # 上次运行策略环境的时间(time.monotonic)
+
+    def d0circle_center(self):
+        """ 统御所有策略实例的循环中心
+        """
+        self.d0circle_begin()
+        while True:
+            if self.circle_event:
+                time.sleep(self.secs_tick)
+                self.d0event_step()
+            else:
+                self.time_secs("short", sleep=True)
+                self.d0circle_step()
+
+    def d0circle_begin(self):
+        """ 进入循环之前: 每个策略实例各自同步自己的记录文件
+        """
+        self.log(f"~循环中心~ 策略实例: {', '.join(f'{i.name}#{i.magic}' for i in self.list_ploy)}") \
+            if len(self.list_ploy) > 1 else None
+        for ploy in self.list_ploy:
+            ploy.d0circle_begin()
+
+    def d0circle_step(self):
+        """ 固定间隔的循环中的一轮
+        """
+        self.snapshot_refresh()
+        self.toolbox_ploy()
+        for ploy in self.list_ploy:
+            ploy.d0circle_work()
+
+    def d0event_step(self):
+        """ 事件驱动的循环中的一次轮询
+        """
+        self.snapshot_refresh()
+        if time.monotonic() - self.event_check_time >= self.time_secs("short").total_seconds():
+            self.toolbox_ploy()
+            self.event_check_time = time.monotonic()
+        for ploy in self.list_ploy:
+            ploy.d0event_work()
+
+
+class C0Session:
+    def __init__(self, c1help, login, password, server, secs_retry, secs_retry_max, count_retry, secs_health=1,
+                 dict_spec_override=None):
+        """ MT5会话: 每个进程只有一个, 只在首次或者健康检查失败时才initialize/login, 平时每轮只调用一次terminal_info
+        标的规格在确认标的可见时顺便缓存, 重新连接(可能换了服务器/账户)时全部作废
+        @param c1help: 实例化主类
+        @param login: mt5账号
+        @param password: mt5密码
+        @param server: mt5服务器
+        @param secs_retry: 重连的初始等待时长(秒), 之后每次翻倍
+        @param secs_retry_max: 重连的最长等待时长(秒)
+        @param count_retry: 登录的最多尝试次数, 全部失败时退出进程
+        @param secs_health: 健康检查的最短间隔(秒), 同一进程的多个标的在一轮之内共用一次检查
+        @param dict_spec_override: 标的: {规格字段: 值}, 用于修正券商给出的有误的规格
+        """
+        # &实例一赋&
+        self.login = login
+        self.password = password
+        self.server = server
+        self.secs_retry = secs_retry
+        self.secs_retry_max = secs_retry_max
+        self.count_retry = count_retry
+        self.secs_health = secs_health
+        self.dict_spec_override = dict_spec_override or {}
+        # &实例二赋&
+        self.log = c1help.d0log
+        # &综合直赋&
+        self.pid = os.getpid()
+        self.done_connect = False
+        self.time_health = -secs_health  # 上次健康检查通过的时间(time.monotonic)
+        self.set_symbol = set()  # 本次连接之中已经确认可见的标的
+        self.dict_spec = {}  # 标的: 本次连接之中的标的规格
+        self.count_check = 0  # 健康检查的次数
+        self.count_connect = 0  # 实际(重新)连接的次数
+        self.count_saved = 0  # 相比每轮都initialize/login/symbol_info所节省的API调用次数
+        self.wait = True  # 重连失败时是否在这里退避休眠, 调度器开始调度之后改为否(不阻塞同一进程的其他标的)
+        self.secs_wait = secs_retry  # 当前的退避时长(秒)
+        self.time_retry = 0  # 不休眠时: 下次重连的最早时间(time.monotonic)
+        self.count_fail = 0  # 本次重连之中登录失败的次数
+
+    def d0health(self):
+        """ 健康检查
+        @return: True/终端在线并且已连接交易服务器, False/需要重连
+        """
+        info = MetaTrader5.terminal_info()
+        return info is not None and info.connected
+
+    def d0connect(self, symbol):
+        """ 确保连接可用并且标的可见: 健康时只做一次检查, 失败时才退避重连
+        @param symbol: 需要使用的标的
+        @return: False/找不到或者无法显示标的, True/可用, None/尚未重连成功(只有不休眠时, 下次重连见time_retry)
+        """
+        if self.done_connect and time.monotonic() - self.time_health < self.secs_health:
+            self.count_saved += 3 if symbol in self.set_symbol else 2
+        elif self.done_connect and self.d0health():
+            self.time_health = time.monotonic()
+            self.count_check += 1
+            self.count_saved += 2 if symbol in self.set_symbol else 0
+        elif not self.d0reconnect():
+            return
+        else:
+            self.time_health = time.monotonic()
+        if symbol not in self.set_symbol:
+            info = MetaTrader5.symbol_info(symbol)
+            if info is None or not info.visible and not MetaTrader5.symbol_select(symbol, True):
+                return False
+            self.set_symbol.add(symbol)
+            self.d0spec_load(symbol, info)
+        return True
+
+    def d0spec_load(self, symbol, info):
+        """ 缓存标的规格并应用修正表
+        @param symbol: 标的
+        @param info: MT5的标的信息
+        @return: C0Spec
+        """
+        spec = self.dict_spec[symbol] = C0Spec(info)
+        for key, value in self.dict_spec_override.get(symbol, {}).items():
+            setattr(spec, key, value)
+        self.log(f"$标的规格$ {symbol}: 每跳大小={spec.point}, 每跳价值={spec.trade_tick_value}, "
+                 f"手数={spec.volume_min}~{spec.volume_max}/{spec.volume_step}, 小数={spec.digits}位, "
+                 f"止损距离={spec.trade_stops_level}点, 成交模式={spec.filling_mode}")
+        return spec
+
+    def d0spec(self, symbol):
+        """ 标的规格: 本次连接之中只获取一次
+        @param symbol: 标的
+        @return: C0Spec, 获取失败时返回None
+        """
+        spec = self.dict_spec.get(symbol)
+        if spec is None:
+            info = MetaTrader5.symbol_info(symbol)
+            spec = self.d0spec_load(symbol, info) if info is not None else None
+        return spec
+
+    def d0spec_refresh(self, symbol=None):
+        """ 作废标的规格(例如券商调整了合约), 下次读取时重新获取
+        @param symbol: 标的(默认全部)
+        """
+        self.dict_spec.clear() if symbol is None else self.dict_spec.pop(symbol, None)
+
+    def d0reconnect(self):
+        """ 退避重连: initialize失败时无限重试, login连续失败count_retry次时退出进程
+        不休眠时(共用进程)每次最多尝试一次: 失败时只记下下次重连的时间, 退避期间直接返回
+        @return: True/连接成功, False/尚未连接成功(只有不休眠时)
+        """
+        if self.done_connect:
+            self.log("$会话管理$ 正在连接...", level="warning")
+            self.done_connect = False
+            self.set_symbol.clear()
+            self.dict_spec.clear()
+            self.secs_wait = self.secs_retry
+            self.count_fail = 0
+        if not self.wait and time.monotonic() < self.time_retry:
+            return False
+        while True:
+            MetaTrader5.shutdown() if self.count_connect else None
+            if not MetaTrader5.initialize():
+                pass
+            elif MetaTrader5.login(login=self.login, password=self.password, server=self.server):
+                break
+            else:
+                self.count_fail += 1
+                if self.count_fail >= self.count_retry:
+                    self.log("$配置连接$ 登录失败: 直接退出进程", level="error")
+                    quit()
+            secs = self.secs_wait
+            self.secs_wait = min(self.secs_wait * 2, self.secs_retry_max)
+            if not self.wait:
+                self.time_retry = time.monotonic() + secs
+                self.log(f"$会话管理$ 连接失败: {secs}秒之后重试", level="warning")
+                return False
+            time.sleep(secs)
+        self.secs_wait = self.secs_retry
+        self.count_fail = 0
+        self.done_connect = True
+        self.count_connect += 1
+        self.log(f"$会话管理$ 连接成功: 第{self.count_connect}次连接, "
+                 f"检查={self.count_check}次, 节省={self.count_saved}次API调用", level="warning") \
+            if self.count_connect > 1 else None
+        return True
+
+
+class C0Calendar:
+    secs_day = 24 * 3600
+    secs_week = 7 * 24 * 3600
+
+    def __init__(self, c1help, c0into, symbol, list_window, list_holiday, hours_offset=None, secs_sleep=3600):
+        """ 交易时段日历: 每个标的一个, 全部使用券商服务器时间(MT5报价的时间戳), 与本机时区和夏令时无关
+        启动时把每周的交易时段预先换算为周内秒数, 之后只缓存"当前状态在何时改变", 每轮只比较一次时间.
+        状态改变(开盘/收盘/节假日)时才重新计算下一个边界, 因此内存和每轮的开销都是常数
+        @param c1help: 实例化主类
+        @param c0into: 实例化主类
+        @param symbol: 进程标的
+        @param list_window: 每周的交易时段[(开盘星期, "HH:MM", 收盘星期, "HH:MM")], 星期一为0
+        @param list_holiday: 券商全天休市的日期["YYYY-MM-DD"](服务器时间)
+        @param hours_offset: 服务器时间相对于UTC的偏移(小时), None为根据最新报价自动推算(可以跟随券商的夏令时)
+        @param secs_sleep: 休眠时每段的最长时长(秒), 每段醒来后按当前时间重新计算剩余时长
+        """
+        # &实例一赋&
+        self.symbol = symbol
+        self.hours_offset = hours_offset
+        self.secs_sleep = secs_sleep
+        # &实例二赋&
+        self.log = c1help.d0log
+        self.tick_info = c0into.d0tick_info
+        # &综合混赋&
+        self.list_window = self.d0window_parse(list_window)
+        self.list_holiday = sorted({pandas.Timestamp(i).value // 10 ** 9 // self.secs_day for i in list_holiday})
+        self.set_holiday = set(self.list_holiday)
+        # &综合直赋&
+        self.secs_offset = 0 if hours_offset is None else round(hours_offset * 3600)
+        self.done_offset = hours_offset is not None  # 是否已经确定服务器时间的偏移
+        self.state_open = False  # 缓存的状态: 是否处于交易时段
+        self.time_change = float("-inf")  # 缓存的状态在该服务器时间改变
+        self.count_check = 0  # 查询状态的次数
+        self.count_compute = 0  # 实际重新计算边界的次数
+
+    @classmethod
+    def d0window_parse(cls, list_window):
+        """ 把每周的交易时段换算为周内秒数: 跨越周末的时段拆为两段, 相邻或者重叠的时段合并
+        @param list_window: [(开盘星期, "HH:MM", 收盘星期, "HH:MM")]
+        @return: [(开盘秒数, 收盘秒数)], 按开盘排序, 均在[0, secs_week]之内
+        """
+        list_secs = []
+        for day_open, hm_open, day_close, hm_close in list_window:
+            secs_open = day_open * cls.secs_day + pandas.Timedelta(f"{hm_open}:00").seconds
+            secs_close = day_close * cls.secs_day + pandas.Timedelta(f"{hm_close}:00").seconds
+            if secs_close > secs_open:
+                list_secs.append((secs_open, secs_close))
+            else:
+                list_secs.extend([(secs_open, cls.secs_week), (0, secs_close)] if secs_close > 0 else
+                                 [(secs_open, cls.secs_week)])
+        list_merge = []
+        for secs_open, secs_close in sorted(list_secs):
+            if list_merge and secs_open <= list_merge[-1][1]:
+                list_merge[-1] = (list_merge[-1][0], max(list_merge[-1][1], secs_close))
+            else:
+                list_merge.append((secs_open, secs_close))
+        if not list_merge:
+            raise ValueError("交易时段不能为空")
+        return list_merge
+
+    def d0window_at(self, time_server):
+        """ 只按每周的交易时段判断(不考虑节假日)
+        @param time_server: 服务器时间(秒)
+        @return: (是否处于交易时段, 该状态改变的服务器时间)
+        """
+        time_week = time_server - ((time_server // self.secs_day + 3) % 7) * self.secs_day - \
+            time_server % self.secs_day  # 1970-01-01是星期四
+        secs = time_server - time_week
+        for secs_open, secs_close in self.list_window:
+            if secs < secs_open:
+                return False, time_week + secs_open
+            elif secs < secs_close:
+                if secs_close == self.secs_week and self.list_window[0][0] == 0:  # 跨越周末的时段在下周继续
+                    return True, time_week + self.secs_week + self.list_window[0][1]
+                return True, time_week + secs_close
+        return False, time_week + self.secs_week + self.list_window[0][0]
+
+    def d0state(self, time_server):
+        """ 综合每周的交易时段和节假日
+        @param time_server: 服务器时间(秒)
+        @return: (是否处于交易时段, 该状态改变的服务器时间)
+        """
+        time_open = time_server
+        for _ in range(len(self.list_holiday) + 2 * len(self.list_window) + 16):
+            day = time_open // self.secs_day
+            if day in self.set_holiday:
+                time_open = (day + 1) * self.secs_day
+                continue
+            open_, time_change = self.d0window_at(time_open)
+            if not open_:
+                time_open = time_change
+            elif time_open > time_server:
+                return False, time_open
+            else:
+                index = bisect.bisect_right(self.list_holiday, day)
+                time_holiday = self.list_holiday[index] * self.secs_day if index < len(self.list_holiday) else None
+                return True, time_change if time_holiday is None else min(time_change, time_holiday)
+        raise ValueError("交易时段与节假日冲突: 找不到下一次开盘")
+
+    def d0offset_sync(self):
+        """ 根据最新报价推算服务器时间的偏移(按半小时取整): 只接受足够新鲜的报价, 确定之后每次最多调整1小时(夏令时)
+        偏移确定或者改变时作废缓存的状态, 下次查询时按新的服务器时间重新计算边界
+        """
+        if self.hours_offset is not None:
+            return
+        tick = self.tick_info()
+        if tick is None:
+            return
+        secs_raw = tick.time - time.time()
+        secs_offset = round(secs_raw / 1800) * 1800
+        if abs(secs_raw - secs_offset) > 600 or abs(secs_offset) > 14 * 3600:
+            return
+        if self.done_offset and abs(secs_offset - self.secs_offset) > 3600:
+            return
+        if not self.done_offset or secs_offset != self.secs_offset:
+            self.log(f"$交易日历$ 服务器时间=UTC{secs_offset / 3600:+g}小时", level="warning")
+            self.time_change = float("-inf")
+        self.secs_offset = secs_offset
+        self.done_offset = True
+
+    def d0now(self):
+        """ 当前的服务器时间
+        @return: 服务器时间(秒)
+        """
+        return time.time() + self.secs_offset
+
+    def d0is_open(self):
+        """ 当前是否处于交易时段: 状态没有改变时只比较一次时间
+        @return: True/交易时段, False/休市
+        """
+        self.count_check += 1
+        self.d0offset_sync() if not self.done_offset else None  # 偏移确定之前每次都尝试推算
+        if self.d0now() < self.time_change:
+            return self.state_open
+        self.count_compute += 1
+        self.d0offset_sync()
+        self.state_open, self.time_change = self.d0state(self.d0now())
+        return self.state_open
+
+    def d0secs_open(self):
+        """ 距离下次开盘的时长
+        @return: 0/正在交易时段, 秒数/休市
+        """
+        return 0 if self.d0is_open() else max(self.time_change - self.d0now(), 0)
+
+    def d0sleep_open(self):
+        """ 休眠到下次开盘: 分段休眠, 每段醒来后按当前时间重新计算剩余时长, 因此不会累计误差
+        @return: 休眠的总时长(秒)
+        """
+        if self.d0is_open():
+            return 0
+        begin = time.time()
+        self.log(f"@事务处理@_假期收尾 正在进行假期休眠... 下次开盘={self.d0time_text(self.time_change)}",
+                 level="warning")
+        while not self.d0is_open():
+            time.sleep(max(min(self.time_change - self.d0now(), self.secs_sleep), 0))
+        secs = time.time() - begin
+        self.log(f"$事务处理$_假期收尾 进入开盘并退出休眠: 休眠={timedelta(seconds=round(secs))}", level="warning")
+        return secs
+
+    def d0time_text(self, time_server):
+        """ 服务器时间的文本
+        @param time_server: 服务器时间(秒)
+        @return: YYYY-MM-DD HH:MM:SS(星期)
+        """
+        stamp = pandas.Timestamp(int(time_server), unit='s')
+        return f"{stamp}({stamp.day_name()[:3]})"
+
+
+class C0FeedBlock:
+    dtype_tick = numpy.dtype([('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+                              ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])  # 与MT5的报价一致
+    dtype_rates = numpy.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                               ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])  # 与MT5的K线一致
+    # 头部: 序号(写入期间为奇数), 报价总数, K线数量, K线版本, 心跳(毫秒), K线周期, K线容量, 报价容量, 行情中心pid
+    list_header = ["seq", "tick_total", "bar_len", "bar_version", "heartbeat", "bar_frame", "bar_keep", "count_tick",
+                   "pid"]
+
+    def __init__(self, symbol, create=False, bar_frame=0, bar_keep=0, count_tick=0):
+        """ 行情中心的共享内存块: 每个标的一块, 依次为头部/报价环形缓存/最新的K线
+        写入方只有行情中心一个进程, 写入前后各把序号加一, 读取方在序号为偶数并且读取前后不变时才认为数据一致
+        @param symbol: 标的
+        @param create: 是否新建(行情中心), 否则映射已有的共享内存(策略进程)
+        @param bar_frame: K线周期(新建时)
+        @param bar_keep: K线容量(新建时)
+        @param count_tick: 报价容量(新建时)
+        """
+        name = self.d0name(symbol)
+        size_header = len(self.list_header) * 8
+        if create:
+            try:
+                shared_memory.SharedMemory(name=name).unlink()  # 上次异常退出时遗留的共享内存
+            except FileNotFoundError:
+                pass
+            size = size_header + count_tick * self.dtype_tick.itemsize + bar_keep * self.dtype_rates.itemsize
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = numpy.ndarray(len(self.list_header), dtype='<i8', buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[self.list_header.index("bar_frame")] = bar_frame
+            self.header[self.list_header.index("bar_keep")] = bar_keep
+            self.header[self.list_header.index("count_tick")] = count_tick
+            self.header[self.list_header.index("pid")] = os.getpid()
+        elif os.name == "posix" and self.header[self.list_header.index("pid")] != os.getpid():
+            from multiprocessing import resource_tracker  # 只有行情中心负责释放共享内存, 策略进程不登记, 以免退出时被误删
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.bar_frame = int(self.header[self.list_header.index("bar_frame")])
+        self.bar_keep = int(self.header[self.list_header.index("bar_keep")])
+        self.count_tick = int(self.header[self.list_header.index("count_tick")])
+        self.tick = numpy.ndarray(self.count_tick, dtype=self.dtype_tick, buffer=self.shm.buf, offset=size_header)
+        self.bar = numpy.ndarray(self.bar_keep, dtype=self.dtype_rates, buffer=self.shm.buf,
+                                 offset=size_header + self.count_tick * self.dtype_tick.itemsize)
+
+    @staticmethod
+    def d0name(symbol):
+        """ 共享内存的名称
+        @param symbol: 标的
+        @return: /
+        """
+        return f"fff_feed_{symbol}"
+
+    def d0close(self, unlink=False):
+        """ 解除映射
+        @param unlink: 是否同时释放共享内存(只有行情中心)
+        """
+        del self.header, self.tick, self.bar
+        self.shm.close()
+        self.shm.unlink() if unlink else None
+
+
+class C0Feed:
+    def __init__(self, c1help, session, list_symbol, bar_frame, bar_keep, count_tick, secs_poll):
+        """ 行情中心: 单独一个进程为所有标的拉取报价和K线, 写入每个标的的共享内存, 策略进程只读共享内存而不再调用MT5
+        因此MT5的调用次数只与标的数量有关, 与策略进程的数量无关. K线沿用C0Into的增量缓存
+        @param c1help: 实例化主类
+        @param session: 当前进程的MT5会话
+        @param list_symbol: 订阅的标的
+        @param bar_frame: K线周期
+        @param bar_keep: 每个标的写入的K线数量
+        @param count_tick: 每个标的的报价环形缓存的容量
+        @param secs_poll: 轮询的间隔(秒)
+        """
+        # &实例一赋&
+        self.session = session
+        self.list_symbol = list_symbol
+        self.secs_poll = secs_poll
+        # &实例二赋&
+        self.log = c1help.d0log
+        # &综合直赋&
+        self.dict_into = {i: C0Into(c1help=c1help, symbol=i, bar_frame=bar_frame, bar_keep=bar_keep, bar_fresh=0)
+                          for i in list_symbol}
+        self.dict_block = {i: C0FeedBlock(symbol=i, create=True, bar_frame=bar_frame, bar_keep=bar_keep,
+                                          count_tick=count_tick) for i in list_symbol}
+        self.dict_tick_time = dict.fromkeys(list_symbol)  # 标的: 最后写入的报价时间(毫秒)
+        self.dict_bar_last = dict.fromkeys(list_symbol)  # 标的: 最后写入的K线数组
+        self.count_poll = 0
+        atexit.register(self.d0close)
+
+    def d0poll(self):
+        """ 轮询一次所有标的: 报价有变化时追加到环形缓存, K线有变化时整体替换, 最后更新心跳
+        """
+        self.count_poll += 1
+        for symbol, block in self.dict_block.items():
+            if not self.session.d0connect(symbol):
+                continue
+            tick = MetaTrader5.symbol_info_tick(symbol)
+            tick = tick if tick is not None and tick.time_msc != self.dict_tick_time[symbol] else None
+            bar = self.dict_into[symbol].d0bar_cache(block.bar_keep)
+            bar = bar if bar is not None and bar is not self.dict_bar_last[symbol] else None
+            if tick is not None or bar is not None:
+                self.d0write(block, tick, bar)
+                self.dict_tick_time[symbol] = tick.time_msc if tick is not None else self.dict_tick_time[symbol]
+                self.dict_bar_last[symbol] = bar if bar is not None else self.dict_bar_last[symbol]
+            block.header[4] = int(time.time() * 1000)
+
+    @staticmethod
+    def d0write(block, tick, bar):
+        """ 写入一个标的的报价和K线
+        @param block: 该标的的共享内存块
+        @param tick: MT5的报价(无变化时为None)
+        @param bar: numpy结构化数组格式的K线(无变化时为None)
+        """
+        header = block.header
+        header[0] += 1
+        if tick is not None:
+            block.tick[header[1] % block.count_tick] = (tick.time, tick.bid, tick.ask, tick.last, tick.volume,
+                                                        tick.time_msc, tick.flags, tick.volume_real)
+            header[1] += 1
+        if bar is not None:
+            bar = bar[-block.bar_keep:]
+            block.bar[:len(bar)] = bar
+            header[2] = len(bar)
+            header[3] += 1
+        header[0] += 1
+
+    def d0loop(self, event_stop):
+        """ 一直轮询, 直到收到停止信号
+        @param event_stop: multiprocessing.Event
+        """
+        self.log(f"$行情中心$ 已启动: 标的={self.list_symbol}, 轮询间隔={self.secs_poll}s", level="warning")
+        while not event_stop.is_set():
+            time.sleep(self.secs_poll)
+            self.d0poll()
+        self.log(f"$行情中心$ 已停止: 共轮询{self.count_poll}次", level="warning")
+
+    def d0close(self):
+        """ 释放所有共享内存(进程退出时自动调用)
+        """
+        for block in self.dict_block.values():
+            block.d0close(unlink=True)
+        self.dict_block.clear()
+
+
+class C0FeedReader:
+    def __init__(self, c1help, block, secs_stale, count_retry=100):
+        """ 策略进程读取行情中心: 只读共享内存, 不加锁; 心跳超时(行情中心卡住或者退出)时由调用方改为直接调用MT5
+        报价每次只复制一条; K线只在版本变化时复制一次, 版本不变时返回同一个数组
+        @param c1help: 实例化主类
+        @param block: 该标的的共享内存块
+        @param secs_stale: 心跳超过该时长(秒)时视为失效
+        @param count_retry: 读取时遇到正在写入的最多重试次数
+        """
+        # &实例一赋&
+        self.block = block
+        self.secs_stale = secs_stale
+        self.count_retry = count_retry
+        # &实例二赋&
+        self.log = c1help.d0log
+        # &综合预赋&
+        self.bar_frame = block.bar_frame
+        self.bar_keep = block.bar_keep
+        self.bar = None  # 最近一次复制的K线
+        self.bar_version = -1
+        self.done_stale = False
+
+    @staticmethod
+    def d0attach(c1help, symbol, secs_stale, secs_wait):
+        """ 映射行情中心的共享内存: 行情中心可能稍晚启动, 因此最多等待secs_wait
+        @param c1help: 实例化主类
+        @param symbol: 标的
+        @param secs_stale: 心跳失效的时长(秒)
+        @param secs_wait: 最多等待的时长(秒)
+        @return: C0FeedReader, 找不到时返回None(调用方直接使用MT5)
+        """
+        deadline = time.monotonic() + secs_wait
+        while True:
+            try:
+                return C0FeedReader(c1help=c1help, block=C0FeedBlock(symbol), secs_stale=secs_stale)
+            except FileNotFoundError:
+                if time.monotonic() >= deadline:
+                    c1help.d0log("$行情中心$ 找不到共享内存: 直接调用MT5", level="error")
+                    return
+                time.sleep(1)
+
+    def d0fresh(self):
+        """ 心跳是否有效: 状态变化时输出一次日志
+        @return: True/有效, False/失效
+        """
+        fresh = time.time() * 1000 - self.block.header[4] < self.secs_stale * 1000
+        if fresh == self.done_stale:
+            self.done_stale = not fresh
+            self.log("$行情中心$ 心跳超时: 暂时直接调用MT5" if not fresh else "$行情中心$ 心跳恢复",
+                     level="error" if not fresh else "warning")
+        return fresh
+
+    def d0tick(self):
+        """ 最新报价
+        @return: numpy.record(字段与MT5的报价一致), 没有报价或者一直在写入时返回None
+        """
+        header = self.block.header
+        for _ in range(self.count_retry):
+            seq = header[0]
+            total = header[1]
+            if seq & 1 or total == 0:
+                continue
+            index = (total - 1) % self.block.count_tick
+            tick = self.block.tick[index:index + 1].view(numpy.recarray).copy()[0]
+            if header[0] == seq:
+                return tick
+        return
+
+    def d0tick_since(self, total_from):
+        """ 某个序号之后的所有报价(超过环形缓存容量的部分已被覆盖)
+        @param total_from: 上次读取之后的报价总数
+        @return: (numpy结构化数组格式的报价, 当前的报价总数), 一直在写入时返回(None, total_from)
+        """
+        header = self.block.header
+        for _ in range(self.count_retry):
+            seq = header[0]
+            total = int(header[1])
+            if seq & 1:
+                continue
+            begin = max(total_from, total - self.block.count_tick)
+            index = numpy.arange(begin, total) % self.block.count_tick
+            tick = self.block.tick[index]
+            if header[0] == seq:
+                return tick, total
+        return None, total_from
+
+    def d0bar(self):
+        """ 最新的K线
+        @return: numpy结构化数组格式的K线(时间升序, 最后一根为正在形成的K线), 没有K线或者一直在写入时返回None
+        """
+        header = self.block.header
+        for _ in range(self.count_retry):
+            seq = header[0]
+            version = header[3]
+            if seq & 1:
+                continue
+            if version == self.bar_version:
+                return self.bar
+            bar = self.block.bar[:header[2]].copy()
+            if header[0] == seq:
+                self.bar, self.bar_version = (bar, version) if len(bar) > 0 else (None, -1)
+                return self.bar
+        return
+
+
+class C0Metric:
+    list_bucket = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]  # 直方图的上界(秒)
+    dict_help = {"mt5": ("fff_mt5_seconds", "fff_mt5_errors_total", "MetaTrader5接口", "api"),
+                 "stage": ("fff_stage_seconds", "fff_stage_errors_total", "循环中心的阶段", "stage")}
+
+    def __init__(self, path, secs_export, symbol):
+        """ 埋点统计: 每个进程只有一个, 按(类别, 名称, 标的, 魔术号)累计调用次数/耗时直方图/错误次数
+        定期以Prometheus文本格式原子写入path下的fff_<pid>.prom, 由d0collect汇总所有进程
+        @param path: 埋点文件夹
+        @param secs_export: 导出的间隔(秒)
+        @param symbol: 无法从参数中得知标的时使用的默认标的
+        """
+        # &实例一赋&
+        self.path = path
+        self.secs_export = secs_export
+        self.symbol = symbol
+        # &综合直赋&
+        self.magic = ""  # 当前阶段的魔术号(策略实例共用的阶段为空)
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.dict_series = {}  # (类别, 名称, 标的, 魔术号): [次数, 错误, 总耗时, 各区间的次数]
+        self.time_export = time.perf_counter()
+        atexit.register(self.d0export)
+
+    def d0observe(self, kind, name, symbol, secs, error, magic=""):
+        """ 记录一次调用
+        @param kind: mt5/接口, stage/阶段
+        @param name: 接口或者阶段的名称
+        @param symbol: 标的
+        @param secs: 耗时(秒)
+        @param error: 是否出错
+        @param magic: 魔术号(默认为空, 即不区分策略实例)
+        """
+        key = (kind, name, symbol, str(magic))
+        with self.lock:
+            series = self.dict_series.get(key)
+            if series is None:
+                series = self.dict_series[key] = [0, 0, 0.0, [0] * (len(self.list_bucket) + 1)]
+            series[0] += 1
+            series[1] += 1 if error else 0
+            series[2] += secs
+            series[3][bisect.bisect_left(self.list_bucket, secs)] += 1
+        if time.perf_counter() - self.time_export >= self.secs_export:
+            self.d0export()
+
+    def d0wrap(self, obj, list_name, symbol, magic=""):
+        """ 给实例的方法套上计时(实例属性优先于类方法, 关闭埋点时不调用本函数, 没有任何额外开销)
+        @param obj: 实例
+        @param list_name: 方法名或绑定的属性名
+        @param symbol: 标的
+        @param magic: 魔术号(同一标的的多个策略实例以此区分, 共用的阶段为空)
+        """
+        for name in list_name:
+            setattr(obj, name, self.d0wrap_stage(getattr(obj, name), name, symbol, magic))
+
+    def d0wrap_stage(self, func, name, symbol, magic=""):
+        """ 包装一个阶段: 同时把默认标的/魔术号切换为该阶段的标的/魔术号, 使其中的MT5调用归属正确
+        @param func: 原始方法
+        @param name: 阶段名称
+        @param symbol: 标的
+        @param magic: 魔术号
+        @return: 计时之后的方法
+        """
+        def wrap(*args, **kwargs):
+            self.symbol = symbol
+            self.magic = magic
+            begin = time.perf_counter()
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                self.d0observe("stage", name, symbol, time.perf_counter() - begin, error, magic)
+
+        return wrap
+
+    def d0text(self):
+        """ 当前进程的Prometheus文本
+        @return: 文本
+        """
+        with self.lock:
+            dict_series = {key: (value[0], value[1], value[2], list(value[3]))
+                           for key, value in self.dict_series.items()}
+        list_line = []
+        for kind, (name_secs, name_error, help_, label) in self.dict_help.items():
+            list_key = sorted(key for key in dict_series if key[0] == kind)
+            if not list_key:
+                continue
+            list_line.append(f"# HELP {name_secs} {help_}的耗时(秒)")
+            list_line.append(f"# TYPE {name_secs} histogram")
+            for key in list_key:
+                count, error, secs, list_count = dict_series[key]
+                labels = self.d0labels(key, label)
+                cumulative = 0
+                for bound, value in zip(self.list_bucket + ["+Inf"], list_count):
+                    cumulative += value
+                    list_line.append(f'{name_secs}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                list_line.append(f"{name_secs}_sum{{{labels}}} {secs}")
+                list_line.append(f"{name_secs}_count{{{labels}}} {count}")
+            list_line.append(f"# HELP {name_error} {help_}的错误次数")
+            list_line.append(f"# TYPE {name_error} counter")
+            for key in list_key:
+                list_line.append(f'{name_error}{{{self.d0labels(key, label)}}} {dict_series[key][1]}')
+        return "\n".join(list_line) + "\n"
+
+    @staticmethod
+    def d0labels(key, label):
+        """ 序列的标签: 魔术号为空时省略
+        @param key: (类别, 名称, 标的, 魔术号)
+        @param label: 名称的标签名(api/stage)
+        @return: 标签文本
+        """
+        magic = f'magic="{key[3]}",' if key[3] else ""
+        labels = f'symbol="{key[2]}",{magic}{label}="{key[1]}"'
+        return labels
+
+    def d0export(self):
+        """ 原子写入当前进程的埋点文件(进程退出时自动调用)
+        """
+        self.time_export = time.perf_counter()
+        if self.pid != os.getpid():
+            return
+        os.makedirs(self.path) if not os.path.exists(self.path) else None
+        file_name = f"{self.path}\\fff_{self.pid}.prom"
+        with open(f"{file_name}.tmp", "w", encoding="utf-8") as file:
+            file.write(self.d0text())
+        os.replace(f"{file_name}.tmp", file_name)
+
+    @staticmethod
+    def d0collect(path):
+        """ 汇总所有进程的埋点文件: 相同的序列直接相加, 次数按整数相加, 耗时按浮点数相加并且原样输出(不丢失精度)
+        @param path: 埋点文件夹
+        @return: Prometheus文本
+        """
+        list_comment = []
+        dict_value = {}
+        for name in sorted(os.listdir(path)) if os.path.exists(path) else []:
+            if not (name.startswith("fff_") and name.endswith(".prom")):
+                continue
+            with open(f"{path}\\{name}", "r", encoding="utf-8") as file:
+                for line in file:
+                    line = line.rstrip("\n")
+                    if line.startswith("#"):
+                        list_comment.append(line) if line not in list_comment else None
+                    elif line:
+                        series, value = line.rsplit(" ", 1)
+                        value = int(value) if value.lstrip("-").isdigit() else float(value)
+                        dict_value[series] = dict_value.get(series, 0) + value
+        list_line = []
+        for comment in list_comment:  # 每个指标族: 注释之后紧跟该族的全部序列
+            list_line.append(comment)
+            if comment.startswith("# TYPE"):
+                family = comment.split(" ")[2]
+                list_line += [f"{series} {value:d}" if isinstance(value, int) else f"{series} {value!r}"
+                              for series, value in dict_value.items()
+                              if series.split("{")[0] in (family, f"{family}_bucket", f"{family}_sum",
+                                                          f"{family}_count")]
+        return "\n".join(list_line) + "\n"
+
+    @staticmethod
+    def d0serve(path, port):
+        """ 在本机启动汇总端点: http://127.0.0.1:port/metrics
+        @param path: 埋点文件夹
+        @param port: 端口
+        @return: 服务器(在后台线程中运行)
+        """
+        class C0Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = C0Metric.d0collect(path).encode("utf-8")
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", port), C0Handler)
+        threading.Thread(target=server.serve_forever, name="fff-metric", daemon=True).start()
+        return server
+
+
+class C0MetricApi:
+    def __init__(self, module, metric):
+        """ MetaTrader5的计时代理: 开启埋点时替换模块全局的MetaTrader5, 每个接口首次访问时包装并缓存
+        None/False的返回值, 以及retcode不是TRADE_RETCODE_DONE的order_send结果, 均计为错误
+        @param module: 原始的MetaTrader5模块
+        @param metric: 埋点统计
+        """
+        self.module = module
+        self.metric = metric
+
+    def __getattr__(self, name):
+        attr = getattr(self.module, name)
+        if callable(attr):
+            attr = self.d0wrap(name, attr)
+        setattr(self, name, attr)  # 之后直接命中实例属性, 不再经过__getattr__
+        return attr
+
+    def d0wrap(self, name, func):
+        """ 包装一个接口
+        @param name: 接口名称
+        @param func: 原始接口
+        @return: 计时之后的接口
+        """
+        metric = self.metric
+        retcode_done = self.module.TRADE_RETCODE_DONE
+
+        def wrap(*args, **kwargs):
+            symbol = kwargs.get("symbol") or (args[0] if args and isinstance(args[0], str) else
+                                              args[0].get("symbol") if args and isinstance(args[0], dict) else
+                                              None) or metric.symbol
+            magic = args[0].get("magic", metric.magic) if args and isinstance(args[0], dict) else metric.magic
+            begin = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                error = result is None or result is False or \
+                    name == "order_send" and getattr(result, "retcode", retcode_done) != retcode_done
+                metric.d0observe("mt5", name, symbol, time.perf_counter() - begin, error, magic)
+
+        return wrap
+
+
 class C0Core:
+    mt5_session = None  # 当前进程的MT5会话, 每个进程只配置一次
+    metric_recorder = None  # 当前进程的埋点统计, 只在开启埋点时配置
+    dict_ploy_class = {"P1": C1Ploy}  # 策略注册表: 名称: 策略类(构造参数和循环接口与C1Ploy一致)
+    list_metric_stage = ["d0circle_step", "d0event_step", "toolbox_ploy", "d0param_analyse", "d0param_show", "d0ma_cross",
+                         "d0common_limit", "d0make_order", "d0protect_cost", "d0clear_data", "d0record_save"]
+
     def __init__(self, symbol):
         """ 进行具体的统筹/赋值/实例化等的核心主类
         所有百分比都是以小数的形式来填写, 如果不是则需要在函数内部转换一下
@@ -846,7 +3120,32 @@ class C0Core:
         self.symbol = symbol
         self.decimal = 5  # 默认小数位
         self.fail_max = 20  # 建立订单的最大失败次数
+        self.flatten_worker = 4  # 清空订单时的最大并发数
+        self.flatten_retry = 3  # 清空订单时每个单号遇到暂时性返回码(重新报价/价格无效/超时等)的最大重试次数
+        self.flatten_pass = 2  # 清空订单的最大轮数(每轮之后作废快照重新核对)
+        self.flatten_deviation = 100  # 清空持单时的最大成交偏差(点)
+        self.calendar_window = [(0, "00:01", 4, "23:59")]  # 每周的交易时段(服务器时间, 星期一为0) TODO
+        self.dict_calendar_override = {}  # 标的: 每周的交易时段, 用于与默认不同的标的(比如有每日休市的XAUUSD) TODO
+        self.calendar_holiday = []  # 券商全天休市的日期(服务器时间, YYYY-MM-DD) TODO
+        self.calendar_offset = None  # 服务器时间相对于UTC的偏移(小时), None为根据最新报价自动推算 TODO
+        self.dict_spec_override = {"XAUUSD": {"trade_tick_value": 1}}  # mt5给出的XAUUSD的点值是0.1, 不知道为什么
         self.bar_frame = MetaTrader5.TIMEFRAME_H1  # 操作周期 TODO
+        self.bar_base = None  # 本地合成其他周期所用的基础周期(None为操作周期, 需要更小的周期比如M15时改为该周期) TODO
+        self.bar_keep = 500  # 每个(标的, 周期)缓存的K线数量
+        self.bar_fresh = 1  # K线缓存的最短刷新间隔(秒)
+        self.circle_event = False  # 是否使用事件驱动的循环(否则每隔secs_short全部重新计算一次) TODO
+        self.secs_tick = 0.2  # 事件驱动时轮询报价的间隔(秒)
+        self.tick_keep = 1000  # 每个标的保留的最近报价的数量(用于报价频率/点差统计)
+        self.ploy_list = [{"name": "P1", "magic": 0, "risk": 1.0, "param": None}]  # 策略实例: 注册名/魔术号(不重复)/风险预算/回测参数 TODO
+        self.dict_ploy_override = {}  # 标的: 策略实例列表, 用于与默认不同的标的 TODO
+        self.process_share = False  # 是否与其他标的共用进程(由调度器设置, 退出策略时不关闭进程共用的日志/邮件)
+        self.feed_on = False  # 是否从行情中心读取报价和K线(需要先启动行情中心进程) TODO
+        self.feed_secs_poll = 0.1  # 行情中心轮询的间隔(秒)
+        self.feed_secs_stale = 5  # 行情中心的心跳超过该时长(秒)时改为直接调用MT5
+        self.feed_count_tick = 1024  # 每个标的的报价环形缓存的容量
+        self.store_on = False  # 是否把看到的K线和报价追加保存到本地历史库(重启时先从本地预热K线缓存) TODO
+        self.store_path = ".\\history"  # 本地历史库文件夹
+        self.store_count_flush = 256  # 报价缓冲达到该数量时追加写入
         self.balance_begin = 100  # 周期资金(USD), 与回测表格"完全"一致 TODO
         self.balance_shrink = 0.3  # 周期回撤(*100%), 与回测表格"近乎"2倍, 只能大不能小 TODO
         self.balance_margin = 2.0  # 保证金の最低比例(*100%) TODO
@@ -854,13 +3153,22 @@ class C0Core:
         self.secs_middle = 1 * 60
         self.secs_long = 10 * 60
         self.secs_super = 30 * 60
+        self.secs_retry = 1  # 重连的初始等待时长(秒), 之后每次翻倍直到secs_middle
+        self.count_retry = 5  # 登录的最多尝试次数
+        self.metric_on = False  # 是否开启埋点统计(关闭时不替换任何函数, 没有额外开销) TODO
+        self.metric_path = ".\\metric"  # 埋点文件夹
+        self.metric_secs = 10  # 埋点文件的导出间隔(秒)
+        self.metric_port = 9108  # 汇总端点的本机端口
         # 实例赋值
         self.c1help = None
         self.c2help = None
         self.c0into = None
         self.c0away = None
+        self.c0calendar = None
         self.c3help = None
-        self.c1ploy = None
+        self.c1ploy = None  # 第一个策略实例
+        self.list_c1ploy = []
+        self.c0ployset = None
         # 登录赋值_mt5
         self.mt5_login = 00000000000000000  # TODO
         self.mt5_password = "00000000000000000"  # TODO
@@ -871,6 +3179,10 @@ class C0Core:
         self.email_smtp_host = "smtp.qq.com"
         self.email_smtp_port = 465
         self.email_smtp_password = "00000000000000000"
+        self.email_smtp_ssl = True  # 本地测试的smtp服务需要改为False
+        self.email_secs_batch = 10  # 提醒合并批次的时长(秒)
+        self.email_secs_dedupe = 30 * 60  # 同类提醒的去重时长(秒)
+        self.email_count_hour = 20  # 每小时最多发送的邮件数量
         # 综合赋值
         self.log = C1Help(symbol).d0log
         self.title = C1Help(symbol).d0title
@@ -887,29 +3199,44 @@ class C0Core:
         # colorama
         colorama.init(autoreset=True)
 
+    def d0config_metric(self):
+        """ 配置埋点统计: 只在开启时才用计时代理替换模块全局的MetaTrader5(子进程中会重新配置)
+        """
+        global MetaTrader5
+        if not self.metric_on:
+            return
+        if C0Core.metric_recorder is None or C0Core.metric_recorder.pid != os.getpid():
+            C0Core.metric_recorder = C0Metric(path=self.metric_path, secs_export=self.metric_secs, symbol=self.symbol)
+            module = MetaTrader5.module if isinstance(MetaTrader5, C0MetricApi) else MetaTrader5
+            MetaTrader5 = C0MetricApi(module=module, metric=C0Core.metric_recorder)
+        C0Core.metric_recorder.symbol = self.symbol
+
     def d0config_connect(self):
-        """ 连接mt5/设置标的/显示标的
+        """ 连接mt5/设置标的/显示标的: 同一进程共用一个会话, 只有健康检查失败时才重新连接
         # 如果无法自动找到MT5的安装路径, 则需要在MetaTrader5.initialize()的括号内部自行输入: r"MT5的绝对安装路径"
         """
-        while not MetaTrader5.initialize():
-            time.sleep(self.secs_middle)
-        if not MetaTrader5.login(login=self.mt5_login, password=self.mt5_password, server=self.mt5_server):
-            self.log("$配置连接$ 登录失败: 直接退出进程", level="error")
-            quit()
-        symbol = MetaTrader5.symbol_info(self.symbol)
-        if symbol is None:
-            self.log("$配置连接$ 找不到标的: 直接退出进程", level="error")
+        if C0Core.mt5_session is None or C0Core.mt5_session.pid != os.getpid():
+            C0Core.mt5_session = C0Session(c1help=C1Help(self.symbol),
+                                           login=self.mt5_login,
+                                           password=self.mt5_password,
+                                           server=self.mt5_server,
+                                           secs_retry=self.secs_retry,
+                                           secs_retry_max=self.secs_middle,
+                                           count_retry=self.count_retry,
+                                           dict_spec_override=self.dict_spec_override)
+        connect = C0Core.mt5_session.d0connect(self.symbol)
+        if connect is None:
+            raise C0Pause(C0Core.mt5_session.time_retry, "MT5尚未重连成功")
+        elif not connect:
+            self.log("$配置连接$ 找不到标的/无法显示标的: 直接退出进程", level="error")
             quit()
-        if not symbol.visible:
-            if not MetaTrader5.symbol_select(self.symbol, True):
-                self.log("$配置连接$ 无法显示标的: 直接退出进程", level="error")
-                quit()
 
     def d0config_instance(self):
         """ 实例化所有主类
         """
         self.c1help = C1Help(symbol=self.symbol)
-        self.c2help = C2Help(c1help=self.c1help,
+        self.c2help = C2Help(c0core=self,
+                             c1help=self.c1help,
                              symbol=self.symbol,
                              secs_short=self.secs_short,
                              secs_middle=self.secs_middle,
@@ -919,40 +3246,99 @@ class C0Core:
                              email_addr_to=self.email_addr_to,
                              email_smtp_host=self.email_smtp_host,
                              email_smtp_port=self.email_smtp_port,
-                             email_smtp_password=self.email_smtp_password)
+                             email_smtp_password=self.email_smtp_password,
+                             email_smtp_ssl=self.email_smtp_ssl,
+                             email_secs_batch=self.email_secs_batch,
+                             email_secs_dedupe=self.email_secs_dedupe,
+                             email_count_hour=self.email_count_hour,
+                             process_share=self.process_share)
         self.c0into = C0Into(c1help=self.c1help,
                              symbol=self.symbol,
-                             bar_frame=self.bar_frame)
-        self.c0away = C0Away(c1help=self.c1help,
+                             bar_frame=self.bar_frame,
+                             bar_keep=self.bar_keep,
+                             bar_fresh=self.bar_fresh,
+                             tick_keep=self.tick_keep,
+                             bar_base=self.bar_base)
+        self.c0into.feed = C0FeedReader.d0attach(c1help=self.c1help,
+                                                 symbol=self.symbol,
+                                                 secs_stale=self.feed_secs_stale,
+                                                 secs_wait=self.secs_middle) if self.feed_on else None
+        self.c0into.store = C0Store(c1help=self.c1help,
+                                    path=self.store_path,
+                                    symbol=self.symbol,
+                                    count_flush=self.store_count_flush) if self.store_on else None
+        self.c0away = C0Away(c0core=self,
+                             c1help=self.c1help,
                              c2help=self.c2help,
                              c0into=self.c0into,
                              symbol=self.symbol,
                              decimal=self.decimal,
-                             fail_max=self.fail_max)
-        self.c3help = C3Help(c1help=self.c1help,
+                             fail_max=self.fail_max,
+                             flatten_worker=self.flatten_worker,
+                             flatten_retry=self.flatten_retry,
+                             flatten_pass=self.flatten_pass,
+                             flatten_deviation=self.flatten_deviation)
+        self.c0calendar = C0Calendar(c1help=self.c1help,
+                                     c0into=self.c0into,
+                                     symbol=self.symbol,
+                                     list_window=self.dict_calendar_override.get(self.symbol, self.calendar_window),
+                                     list_holiday=self.calendar_holiday,
+                                     hours_offset=self.calendar_offset,
+                                     secs_sleep=self.secs_long)
+        self.c3help = C3Help(c0core=self,
+                             c1help=self.c1help,
                              c2help=self.c2help,
                              c0into=self.c0into,
                              c0away=self.c0away,
+                             c0calendar=self.c0calendar,
                              symbol=self.symbol,
                              decimal=self.decimal,
                              balance_begin=self.balance_begin,
                              balance_margin=self.balance_margin,
-                             balance_shrink=self.balance_shrink)
-        self.c1ploy = C1Ploy(c1help=self.c1help,
-                             c2help=self.c2help,
-                             c0into=self.c0into,
-                             c0away=self.c0away,
-                             c3help=self.c3help,
-                             symbol=self.symbol,
-                             decimal=self.decimal,
-                             bar_frame=self.bar_frame)
+                             balance_shrink=self.balance_shrink,
+                             process_share=self.process_share)
+        list_config = self.dict_ploy_override.get(self.symbol, self.ploy_list)
+        list_magic = [i["magic"] for i in list_config]
+        if not list_config or len(set(list_magic)) != len(list_magic):
+            self.log(f"$配置策略$ 策略实例为空/魔术号重复: {list_magic}, 直接退出进程", level="error")
+            quit()
+        self.list_c1ploy = [self.dict_ploy_class[i["name"]](c0core=self,
+                                                            c1help=self.c1help,
+                                                            c2help=self.c2help,
+                                                            c0into=self.c0into,
+                                                            c0away=self.c0away,
+                                                            c3help=self.c3help,
+                                                            symbol=self.symbol,
+                                                            decimal=self.decimal,
+                                                            bar_frame=self.bar_frame,
+                                                            circle_event=self.circle_event,
+                                                            secs_tick=self.secs_tick,
+                                                            name=i["name"],
+                                                            magic=i["magic"],
+                                                            risk=i.get("risk", 1.0),
+                                                            list_param=i.get("param")) for i in list_config]
+        self.c1ploy = self.list_c1ploy[0]
+        for ploy in self.list_c1ploy:
+            self.c0into.d0indicator_declare(ploy.d0indicator_node())
+        self.c0ployset = C0PloySet(c1help=self.c1help,
+                                   c2help=self.c2help,
+                                   c0into=self.c0into,
+                                   c3help=self.c3help,
+                                   list_ploy=self.list_c1ploy,
+                                   circle_event=self.circle_event,
+                                   secs_tick=self.secs_tick)
 
     def d0config_all(self):
         """ 配置前面的所有项目
         """
         self.d0config_independent()
+        self.d0config_metric()
         self.d0config_connect()
         self.d0config_instance()
+        if self.metric_on:
+            for ploy in self.list_c1ploy:
+                C0Core.metric_recorder.d0wrap(ploy, self.list_metric_stage, self.symbol, ploy.magic)
+            C0Core.metric_recorder.d0wrap(self.c0ployset, self.list_metric_stage[:3], self.symbol)
 
     def d0common_start(self):
         """ 适用于所有进程的启动信息
@@ -961,7 +3347,7 @@ class C0Core:
         self.d0config_all()
         self.c3help.d0toolbox_common()
         self.log(self.title("账户信息", position="up", sub=True))
-        self.log(f"\n{self.c0into.d0account_info()}")
+        self.log(f"\n{self.c0into.d0account_frame()}")
         self.log(self.title("通用信息", position="up", sub=True))
         self.log(f"综合: "
                  f"小数={self.decimal}位, "
@@ -979,20 +3365,603 @@ class C0Core:
         """
         self.log(self.title("通用退出", position="up"))
         self.d0config_all()
-        self.log(f"\n{self.c0into.d0account_info()}")
+        self.log(f"\n{self.c0into.d0account_frame()}")
         self.log(self.title("通用退出", position="down"))
 
     def d0ploy_start(self):
         """ 启动策略
         """
         self.d0config_all()
-        self.c1ploy.d0circle_center()
+        self.c0ployset.d0circle_center()
+
+    def d0feed_start(self, list_symbol, event_stop):
+        """ 启动行情中心: 在当前进程中为所有标的拉取报价和K线, 直到收到停止信号
+        @param list_symbol: 订阅的标的
+        @param event_stop: multiprocessing.Event
+        """
+        self.d0config_independent()
+        self.d0config_metric()
+        self.d0config_connect()
+        feed = C0Feed(c1help=C1Help(self.symbol),
+                      session=C0Core.mt5_session,
+                      list_symbol=list_symbol,
+                      bar_frame=self.bar_frame,
+                      bar_keep=self.bar_keep,
+                      count_tick=self.feed_count_tick,
+                      secs_poll=self.feed_secs_poll)
+        feed.d0loop(event_stop)
+        feed.d0close()
+        C0Core.d0process_quit(self.secs_middle)
 
     def d0ploy_quit(self):
         """ 退出策略
         """
-        self.d0config_all()
+        self.d0config_all() if self.c3help is None else None
         self.c3help.d0toolbox_blank()
         self.log(f"~退出策略~ 最后错误={str(MetaTrader5.last_error())}", level="error")
         self.log("$退出策略$", level="warning")
+        if not self.process_share:
+            C0Core.d0process_quit(self.secs_middle)
         quit()
+
+    @staticmethod
+    def d0process_quit(secs_flush):
+        """ 进程退出之前: 发完剩余的邮件, 导出埋点, 写完剩余的日志
+        @param secs_flush: 等待邮件发送的最长时长(秒)
+        """
+        C2Help.mail_sender.d0flush(secs_flush) if C2Help.mail_sender is not None else None
+        C0Core.metric_recorder.d0export() if C0Core.metric_recorder is not None else None
+        C1Help.log_listener.d0stop()
+
+
+class C0Batch:
+    def __init__(self):
+        """ 多标的共用进程时的批量数据: 每轮开始时由调度器作废, 同一轮之内所有标的共用一次MT5调用
+        账户信息/持单/挂单: 不带标的一次获取全部, 再按标的分组; 报价没有批量接口(symbols_get不含毫秒时间),
+        因此仍由每个标的每轮获取一次快照(开启行情中心时读取共享内存, 不调用MT5)
+        成交会改变账户信息和持单/挂单, 因此发送订单/平仓之后也会作废
+        """
+        # &综合预赋&
+        self.dict_data = {}  # account/hold/pend: 本轮的数据(账户为MT5原始结构, 持单/挂单为{标的: MT5原始结构的列表})
+        self.count_fetch = 0  # 实际调用MT5的次数
+        self.count_hit = 0  # 直接使用本轮数据的次数
+
+    def d0refresh(self):
+        """ 新的一轮: 作废上一轮的全部数据
+        """
+        self.dict_data.clear()
+
+    def d0expire(self):
+        """ 成交之后: 作废账户信息和持单/挂单
+        """
+        self.dict_data.clear()
+
+    def d0fetch(self, kind):
+        """ 本轮的某一种数据: 每轮只调用一次MT5
+        @param kind: account/账户信息, hold/全部持单, pend/全部挂单
+        @return: 账户为MT5原始结构, 持单/挂单为{标的: MT5原始结构的列表}, 获取失败时返回None(不缓存)
+        """
+        if kind in self.dict_data:
+            self.count_hit += 1
+            return self.dict_data[kind]
+        self.count_fetch += 1
+        if kind == "account":
+            data = MetaTrader5.account_info()
+        else:
+            data = MetaTrader5.positions_get() if kind == "hold" else MetaTrader5.orders_get()
+            if data is not None:
+                dict_group = {}
+                for i in data:
+                    dict_group.setdefault(i.symbol, []).append(i)
+                data = dict_group
+        if data is not None:
+            self.dict_data[kind] = data
+        return data
+
+    def d0account(self):
+        """ 本轮的账户信息
+        @return: MT5的账户信息, 获取失败时返回None(不缓存)
+        """
+        account = self.d0fetch("account")
+        return account
+
+    def d0hold(self, symbol):
+        """ 本轮某个标的的持单
+        @param symbol: 标的
+        @return: MT5持单结构的列表, 获取失败时返回None(不缓存)
+        """
+        dict_hold = self.d0fetch("hold")
+        return dict_hold.get(symbol, []) if dict_hold is not None else None
+
+    def d0pend(self, symbol):
+        """ 本轮某个标的的挂单
+        @param symbol: 标的
+        @return: MT5挂单结构的列表, 获取失败时返回None(不缓存)
+        """
+        dict_pend = self.d0fetch("pend")
+        return dict_pend.get(symbol, []) if dict_pend is not None else None
+
+
+class C0Scheduler:
+    def __init__(self, symbol, list_symbol):
+        """ 单进程多标的调度器: 所有标的共用一个进程/一个MT5会话/一套日志和邮件, 在同一线程中按轮次依次运行
+        每轮只休眠一次, 然后每个标的运行一步(固定间隔为d0circle_step, 事件驱动为d0event_step)
+        某个标的退出策略时只移出调度, 其余标的继续运行; 某个标的需要等待(连续失败/MT5重连的退避)时抛出C0Pause,
+        只在期限之前跳过该标的, 不在调度线程中休眠; 日志/邮件/会话由调用方所在的进程负责关闭
+        @param symbol: 调度器自身日志使用的标的(通常为占位标的)
+        @param list_symbol: 需要调度的标的
+        """
+        # &实例一赋&
+        self.symbol = symbol
+        self.list_symbol = list_symbol
+        # &实例二赋&
+        self.log = C1Help(symbol).d0log
+        # &综合预赋&
+        self.list_core = []
+        self.batch = C0Batch()
+        self.dict_pause = {}  # 标的: 暂停到该时间(time.monotonic)
+        self.count_round = 0
+        self.done_close = False  # 是否全部标的均已休市
+
+    def d0schedule_config(self):
+        """ 配置所有标的: 同一进程只会建立一次会话
+        """
+        for symbol in self.list_symbol:
+            core = C0Core(symbol)
+            core.process_share = True
+            try:
+                core.d0config_all()
+                core.c0into.batch = self.batch
+                core.c0ployset.d0circle_begin()
+            except SystemExit:
+                self.log(f"$调度中心$ {symbol}配置失败: 不参与调度", level="error")
+                continue
+            self.list_core.append(core)
+
+    def d0schedule_start(self):
+        """ 启动调度: 所有标的均已退出时返回
+        """
+        self.d0schedule_config()
+        if not self.list_core:
+            return
+        C0Core.mt5_session.wait = False  # 配置阶段可以等待重连, 开始调度之后不再在调度线程中休眠
+        core_first = self.list_core[0]
+        self.log(f"$调度中心$ 共{len(self.list_core)}个标的, "
+                 f"模式={'事件驱动' if core_first.circle_event else '固定间隔'}", level="warning")
+        while self.list_core:
+            time.sleep(core_first.secs_tick if core_first.circle_event else core_first.secs_short)
+            self.d0schedule_round()
+        self.log(f"$调度中心$ 全部标的均已退出: 共{self.count_round}轮, 批量数据"
+                 f"调用={self.batch.count_fetch}次/复用={self.batch.count_hit}次", level="warning")
+        C2Help.mail_sender.d0flush(core_first.secs_middle) if C2Help.mail_sender is not None else None
+        C0Core.metric_recorder.d0export() if C0Core.metric_recorder is not None else None
+
+    def d0schedule_round(self):
+        """ 一轮调度: 每个处于交易时段并且没有暂停的标的运行一步, 退出策略的标的移出调度
+        全部标的都休市时休眠到最早的下次开盘(分段休眠, 每段醒来后重新计算)
+        """
+        list_open = [core for core in self.list_core if core.c0calendar.d0is_open()]
+        if not list_open:
+            secs = min(core.c0calendar.d0secs_open() for core in self.list_core)
+            self.log(f"$调度中心$ 全部标的均已休市: {timedelta(seconds=round(secs))}之后开盘", level="warning") \
+                if not self.done_close else None
+            self.done_close = True
+            time.sleep(min(secs, self.list_core[0].secs_long))
+            return
+        self.log("$调度中心$ 进入开盘并退出休眠", level="warning") if self.done_close else None
+        self.done_close = False
+        self.count_round += 1
+        self.batch.d0refresh()
+        for core in list_open:
+            if time.monotonic() < self.dict_pause.get(core.symbol, float("-inf")):
+                continue
+            try:
+                core.c0ployset.d0event_step() if core.circle_event else core.c0ployset.d0circle_step()
+            except C0Pause as e:
+                self.dict_pause[core.symbol] = e.time_resume
+                secs = max(e.time_resume - time.monotonic(), 0)
+                self.log(f"$调度中心$ {core.symbol}暂停{timedelta(seconds=round(secs))}: {e}", level="warning")
+            except SystemExit:
+                self.list_core.remove(core)
+                self.log(f"$调度中心$ {core.symbol}已退出策略: 剩余{len(self.list_core)}个标的", level="warning")
+
+
+class C0Test:
+    def __init__(self, symbol, list_param=None, tick_size=0.00001, tick_value=1.0, volume_min=0.01, volume_step=0.01,
+                 volume_max=100.0, balance_begin=100, point_spread=None, count_atr=300, occupy_atr_sl=2, occupy_atr_cross_where=0.1,
+                 occupy_sl_protect_touch=1, occupy_sl_protect_move=0.1, occupy_sl_spread=0.2):
+        """ 回测引擎: 用历史K线逐根重现C1Ploy的d0ma_cross/d0make_order/d0protect_cost/d0clear_data
+        所有指标一次性向量化计算, 只有持仓状态使用逐根循环. 每根K线在开盘时按事件驱动循环的顺序做一次决策,
+        此时正在形成的K线的最高/最低/收盘价均等于开盘价; 盘中按阳线O-L-H-C/阴线O-H-L-C的路径判断止损和平保的先后
+        K线价格视为bid, ask=bid+点差. 不模拟_capital_shrink/_capital_margin的资金风控
+        @param symbol: 回测标的
+        @param list_param: 回测参数(默认C1Ploy.dict_test_param中该标的的参数)
+        @param tick_size: 每跳大小
+        @param tick_value: 每跳价值
+        @param volume_min: 最小手数
+        @param volume_step: 手数步长
+        @param volume_max: 最大手数
+        @param balance_begin: 初始资金
+        @param point_spread: 固定点差(点), 默认使用K线自带的spread
+        @param count_atr: 分析atr的K线的数量
+        @param occupy_atr_sl: 止损比例(*ATR)
+        @param occupy_atr_cross_where: 择位差幅(*ATR)
+        @param occupy_sl_protect_touch: 触发平保(*止损)
+        @param occupy_sl_protect_move: 移动平保(*止损)
+        @param occupy_sl_spread: 限制点差(*止损)
+        """
+        # &实例一赋&
+        self.symbol = symbol
+        self.list_param = C1Ploy.dict_test_param.get(symbol, []) if list_param is None else list(list_param)
+        self.tick_size = tick_size
+        self.tick_value = tick_value
+        self.volume_min = volume_min
+        self.volume_step = volume_step
+        self.volume_max = volume_max
+        self.balance_begin = balance_begin
+        self.point_spread = point_spread
+        self.count_atr = count_atr
+        self.occupy_atr_sl = occupy_atr_sl
+        self.occupy_atr_cross_where = occupy_atr_cross_where
+        self.occupy_sl_protect_touch = occupy_sl_protect_touch
+        self.occupy_sl_protect_move = occupy_sl_protect_move
+        self.occupy_sl_spread = occupy_sl_spread
+
+    def d0volume_round(self, volume):
+        """ 按手数步长取整(与C0Into.d0volume_round一致)
+        @param volume: 手数
+        @return: 最接近的有效手数(不超过最大手数), 不足最小手数时返回0
+        """
+        volume = min(round(volume / self.volume_step) * self.volume_step, self.volume_max)
+        volume = round(volume, 8) if volume >= self.volume_min else 0.0
+        return volume
+
+    @staticmethod
+    def d0ma_open(close, open_, count):
+        """ 每根K线开盘时的ma(与C0Ma一致: 最近count-1根已收盘K线+正在形成的K线)
+        @param close: 收盘价数组
+        @param open_: 开盘价数组
+        @param count: 分析ma的K线的数量
+        @return: ma数组, 数据不足的位置为nan
+        """
+        prefix = numpy.concatenate(([0.0], numpy.cumsum(close)))
+        ma = numpy.full(len(close), numpy.nan)
+        index = numpy.arange(count - 1, len(close))
+        ma[index] = (prefix[index] - prefix[index - count + 1] + open_[index]) / count
+        return ma
+
+    def d0atr_open(self, bar):
+        """ 每根K线开盘时的atr(与C0Atr一致: 正在形成的K线的TR=|开盘价-前收盘|)
+        @param bar: numpy结构化数组格式的K线
+        @return: atr数组, 数据不足的位置为nan
+        """
+        close = bar['close']
+        prefix = numpy.concatenate(([0.0], numpy.cumsum(C0Atr.d0true_range(bar['high'], bar['low'], close))))
+        tr_forming = numpy.abs(bar['open'][1:] - close[:-1])
+        count = self.count_atr
+        atr = numpy.full(len(close), numpy.nan)
+        index = numpy.arange(count, len(close))
+        atr[index] = (prefix[index] - prefix[index - count + 1] + tr_forming[index - 1]) / count
+        return atr
+
+    def d0backtest(self, bar):
+        """ 回测
+        @param bar: numpy结构化数组格式的K线(时间升序, 同copy_rates_from_pos的返回值)
+        @return: (df格式的成交记录, 每根K线收盘时的净值, 每根K线收盘时的回撤)
+        """
+        if len(self.list_param) != 7:
+            raise ValueError(f"{self.symbol}的回测参数为空/不完整")
+        count_when_fast, count_when_slow, count_where_fast, count_where_slow, \
+            count_which_fast, count_which_slow, actual_sl_amount = self.list_param
+        open_, high, low, close = bar['open'], bar['high'], bar['low'], bar['close']
+        spread = numpy.full(len(bar), float(self.point_spread)) if self.point_spread is not None else \
+            bar['spread'].astype(float)
+        spread = spread * self.tick_size
+
+        # 向量化: 所有指标和参数
+        when_fast = self.d0ma_open(close, open_, count_when_fast)
+        when_slow = self.d0ma_open(close, open_, count_when_slow)
+        where_fast = self.d0ma_open(close, open_, count_where_fast)
+        where_slow = self.d0ma_open(close, open_, count_where_slow)
+        which_fast = self.d0ma_open(close, open_, count_which_fast)
+        which_slow = self.d0ma_open(close, open_, count_which_slow)
+        atr = self.d0atr_open(bar)
+        range_sl = atr * self.occupy_atr_sl
+        range_cross_where = atr * self.occupy_atr_cross_where
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            open_volume = actual_sl_amount / (range_sl / self.tick_size * self.tick_value)
+            limit = (spread / range_sl <= self.occupy_sl_spread) & (open_volume > 0)
+        where_long = where_fast > where_slow + range_cross_where
+        where_short = where_fast < where_slow - range_cross_where
+        which_long = which_fast > which_slow
+        which_short = which_fast < which_slow
+        when_long = when_fast > when_slow
+        when_short = when_fast < when_slow
+        start = max(count_when_fast, count_when_slow, count_where_fast, count_where_slow,
+                    count_which_fast, count_which_slow, self.count_atr + 1) - 1
+        list_value = [i.tolist() for i in (open_, high, low, close, spread, range_sl, open_volume, limit,
+                                           where_long, where_short, which_long, which_short, when_long, when_short)]
+
+        # 逐根循环: 只处理持仓状态
+        value = self.tick_value / self.tick_size
+        touch, move = self.occupy_sl_protect_touch, self.occupy_sl_protect_move
+        cross_where_old = cross_where_new = ""
+        wait_buy = wait_sell = done_open = done_protect = False
+        open_type = "/"
+        hold = 0  # 1/持有多单, -1/持有空单, 0/空仓
+        open_price = sl_price = volume = 0.0
+        open_index = 0
+        balance = float(self.balance_begin)
+        equity = numpy.full(len(bar), balance)
+        list_trade = []
+
+        def close_hold(index, price, reason):
+            nonlocal hold, balance
+            profit = (price - open_price) * hold * volume * value
+            balance += profit
+            list_trade.append((open_index, index, "buy" if hold > 0 else "sell", volume, open_price, price,
+                               sl_price, profit, reason))
+            hold = 0
+
+        for i in range(start, len(bar)):
+            o, h, lo, c, spr, rsl, vol, lim, w_long, w_short, x_long, x_short, t_long, t_short = \
+                [v[i] for v in list_value]
+            # 开盘跳空越过止损
+            if hold > 0 and o <= sl_price or hold < 0 and o + spr >= sl_price:
+                close_hold(i, o if hold > 0 else o + spr, "sl")
+            # d0ma_cross
+            if w_long:
+                cross_where_old, cross_where_new = cross_where_new, "long"
+            elif w_short:
+                cross_where_old, cross_where_new = cross_where_new, "short"
+            if cross_where_old == "short" and cross_where_new == "long" and x_long:
+                wait_buy = True
+            elif cross_where_old == "long" and cross_where_new == "short" and x_short:
+                wait_sell = True
+            if wait_buy and t_long:
+                open_type = "buy"
+            elif wait_sell and t_short:
+                open_type = "sell"
+            # d0make_order
+            if lim and hold == 0 and not done_open and open_type != "/" and self.d0volume_round(vol) > 0:
+                hold = 1 if open_type == "buy" else -1
+                open_price = o + spr if hold > 0 else o
+                sl_price = open_price - rsl * hold
+                volume = self.d0volume_round(vol)
+                open_index = i
+                done_open = True
+            # d0protect_cost
+            if hold != 0 and not done_protect:
+                if open_type == "buy" and o > open_price + rsl * touch:
+                    sl_price = open_price + rsl * move
+                    done_protect = True
+                elif open_type == "sell" and o + spr < open_price - rsl * touch:
+                    sl_price = open_price - rsl * move
+                    done_protect = True
+            # d0clear_data
+            if cross_where_new == "short":
+                wait_buy = False
+            elif cross_where_new == "long":
+                wait_sell = False
+            if open_type == "buy" and cross_where_new == "short" or open_type == "sell" and cross_where_new == "long":
+                close_hold(i, o if hold > 0 else o + spr, "clear") if hold != 0 else None
+                open_type = "/"
+                done_open = done_protect = False
+            # 盘中: 止损和平保
+            if hold != 0:
+                for price in ((lo, h, c) if c >= o else (h, lo, c)):
+                    if hold > 0 and price <= sl_price or hold < 0 and price + spr >= sl_price:
+                        close_hold(i, sl_price, "sl")
+                        break
+                    if not done_protect:
+                        if hold > 0 and price > open_price + rsl * touch:
+                            sl_price = open_price + rsl * move
+                            done_protect = True
+                        elif hold < 0 and price + spr < open_price - rsl * touch:
+                            sl_price = open_price - rsl * move
+                            done_protect = True
+            equity[i] = balance + ((c if hold > 0 else c + spr) - open_price) * hold * volume * value \
+                if hold != 0 else balance
+
+        time_ = pandas.to_datetime(bar['time'], unit='s')
+        trade = pandas.DataFrame(list_trade, columns=['time_open', 'time_close', 'type', 'volume', 'price_open',
+                                                      'price_close', 'sl', 'profit', 'reason'])
+        trade['time_open'] = time_[trade['time_open'].to_numpy(dtype=int)]
+        trade['time_close'] = time_[trade['time_close'].to_numpy(dtype=int)]
+        equity = pandas.Series(equity, index=time_, name='equity')
+        drawdown = (equity.cummax() - equity).rename('drawdown')
+        return trade, equity, drawdown
+
+    def d0summary(self, trade, equity, drawdown):
+        """ 回测汇总
+        @param trade: d0backtest返回的成交记录
+        @param equity: d0backtest返回的净值
+        @param drawdown: d0backtest返回的回撤
+        @return: {指标: 值}
+        """
+        profit = trade['profit']
+        summary = {"symbol": self.symbol,
+                   "param": self.list_param,
+                   "trade": len(trade),
+                   "win": round(float((profit > 0).mean()), 4) if len(trade) else 0.0,
+                   "profit": round(float(profit.sum()), 2),
+                   "drawdown": round(float(drawdown.max()), 2),
+                   "shrink": round(float((drawdown / equity.cummax()).max()), 4),
+                   "final": round(float(equity.iloc[-1]), 2)}
+        return summary
+
+
+class C0Optimize:
+    list_key = ["count_when_fast", "count_when_slow", "count_where_fast", "count_where_slow",
+                "count_which_fast", "count_which_slow", "actual_sl_amount"]  # 与dict_test_param的顺序一致
+    bar_worker = None  # 子进程中映射到共享内存的K线(只读)
+    shm_worker = None
+    dict_test_worker = None  # 子进程中C0Test的其余参数
+
+    def __init__(self, symbol, bar, file_checkpoint, count_process=None, **dict_test):
+        """ 参数优化: 用进程池并行回测大量参数组合, K线只放入一次共享内存, 子进程直接映射而不是各自复制一份
+        每完成一组参数就追加到断点文件, 重新运行时自动跳过已完成的参数.
+        断点按(标的, 回测设置, K线)区分: 点差/资金等设置或者K线改变之后, 之前的结果不再沿用
+        @param symbol: 优化标的
+        @param bar: numpy结构化数组格式的K线
+        @param file_checkpoint: 断点文件(每行一个json)
+        @param count_process: 进程数(默认cpu核数)
+        @param dict_test: 传递给C0Test的其余参数(tick_size/tick_value/volume_step/balance_begin等)
+        """
+        # &实例一赋&
+        self.symbol = symbol
+        self.bar = bar
+        self.file_checkpoint = file_checkpoint
+        self.count_process = count_process or os.cpu_count()
+        self.dict_test = dict_test
+        # &综合直赋&
+        self.key_checkpoint = self.d0checkpoint_key()
+
+    @staticmethod
+    def d0param_valid(param):
+        """ 参数是否有意义: 三组均线都必须是快线<慢线
+        @param param: 7个回测参数
+        @return: True/有效, False/无效
+        """
+        return param[0] < param[1] and param[2] < param[3] and param[4] < param[5] and param[6] > 0
+
+    def d0param_value(self, dict_range):
+        """ 每个参数的可选值
+        @param dict_range: {list_key中的参数名: 可选值的列表}, 未给出的参数使用dict_test_param中的当前值
+        @return: 与list_key顺序一致的可选值的列表
+        """
+        current = C1Ploy.dict_test_param.get(self.symbol) or []
+        list_miss = [key for i, key in enumerate(self.list_key) if key not in dict_range and i >= len(current)]
+        if list_miss:
+            raise ValueError(f"{self.symbol}的参数{list_miss}既不在优化范围之内, 也没有在dict_test_param中配置")
+        list_value = [dict_range[key] if key in dict_range else [current[i]] for i, key in enumerate(self.list_key)]
+        return list_value
+
+    def d0param_grid(self, dict_range):
+        """ 网格参数
+        @param dict_range: {list_key中的参数名: 可选值的列表}, 未给出的参数使用dict_test_param中的当前值
+        @return: 所有有效的参数组合
+        """
+        list_value = self.d0param_value(dict_range)
+        list_param = [list(i) for i in itertools.product(*list_value) if self.d0param_valid(i)]
+        return list_param
+
+    def d0param_random(self, dict_range, count, seed=0):
+        """ 随机参数
+        @param dict_range: {list_key中的参数名: 可选值的列表}, 未给出的参数使用dict_test_param中的当前值
+        @param count: 抽样数量
+        @param seed: 随机种子(相同的种子得到相同的抽样, 便于断点续跑)
+        @return: 不重复的有效参数组合
+        """
+        list_value = self.d0param_value(dict_range)
+        rng = numpy.random.default_rng(seed)
+        dict_param = {}
+        for _ in range(count * 20):
+            param = tuple(i[rng.integers(len(i))] for i in list_value)
+            if not self.d0param_valid(param):
+                continue
+            dict_param[param] = None
+            if len(dict_param) >= count:
+                break
+        list_param = [list(i) for i in dict_param][:count]
+        return list_param
+
+    @staticmethod
+    def d0worker_init(name, shape, dtype, dict_test):
+        """ 子进程初始化: 映射共享内存中的K线
+        """
+        C0Optimize.shm_worker = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":  # 只有主进程负责释放共享内存, 子进程不登记, 以免退出时被误删
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(C0Optimize.shm_worker._name, "shared_memory")
+        C0Optimize.bar_worker = numpy.ndarray(shape, dtype=dtype, buffer=C0Optimize.shm_worker.buf)
+        C0Optimize.dict_test_worker = dict_test
+
+    @staticmethod
+    def d0worker_run(task):
+        """ 子进程: 回测一组参数
+        @param task: (标的, 参数)
+        @return: 回测汇总
+        """
+        symbol, param = task
+        test = C0Test(symbol=symbol, list_param=param, **C0Optimize.dict_test_worker)
+        trade, equity, drawdown = test.d0backtest(C0Optimize.bar_worker)
+        summary = test.d0summary(trade, equity, drawdown)
+        return summary
+
+    def d0checkpoint_key(self):
+        """ 断点的键: 标的/回测设置/K线的摘要
+        @return: 16位十六进制文本
+        """
+        digest = hashlib.sha1(json.dumps([self.symbol, self.dict_test], sort_keys=True, default=str).encode("utf-8"))
+        digest.update(numpy.ascontiguousarray(self.bar).tobytes())
+        return digest.hexdigest()[:16]
+
+    def d0checkpoint_load(self):
+        """ 读取断点文件: 只沿用本次的标的/回测设置/K线的结果
+        @return: 已完成的回测汇总
+        """
+        list_summary = []
+        if os.path.exists(self.file_checkpoint):
+            with open(self.file_checkpoint) as f:
+                for line in f:
+                    try:
+                        summary = json.loads(line)
+                    except ValueError:  # 中断时写了一半的行
+                        continue
+                    list_summary.append(summary) if summary.pop("key", None) == self.key_checkpoint else None
+        return list_summary
+
+    def d0optimize(self, list_param, log=None):
+        """ 并行回测所有参数(跳过断点文件中已完成的参数)
+        @param list_param: 参数组合的列表
+        @param log: 进度输出函数(默认不输出)
+        @return: df格式的排名表(按收益/最大回撤从高到低)
+        """
+        list_summary = self.d0checkpoint_load()
+        set_done = {tuple(i["param"]) for i in list_summary}
+        list_task = [(self.symbol, i) for i in list_param if tuple(i) not in set_done]
+        if list_task:
+            shm = shared_memory.SharedMemory(create=True, size=max(self.bar.nbytes, 1))
+            try:
+                bar = numpy.ndarray(self.bar.shape, dtype=self.bar.dtype, buffer=shm.buf)
+                bar[:] = self.bar
+                chunk = max(len(list_task) // (self.count_process * 8), 1)
+                with multiprocessing.Pool(self.count_process, initializer=C0Optimize.d0worker_init,
+                                          initargs=(shm.name, self.bar.shape, self.bar.dtype, self.dict_test)) as pool, \
+                        open(self.file_checkpoint, "a") as f:
+                    begin = time.perf_counter()
+                    for i, summary in enumerate(pool.imap_unordered(C0Optimize.d0worker_run, list_task, chunk), 1):
+                        f.write(json.dumps(dict(summary, key=self.key_checkpoint)) + "\n")
+                        f.flush()
+                        list_summary.append(summary)
+                        if log is not None and (i % 100 == 0 or i == len(list_task)):
+                            log(f"~参数优化~ {self.symbol}: {i}/{len(list_task)}组, "
+                                f"{round(i / (time.perf_counter() - begin), 1)}组/秒")
+                del bar
+            finally:
+                shm.close()
+                shm.unlink()
+        return self.d0rank(list_summary)
+
+    @staticmethod
+    def d0rank(list_summary):
+        """ 排名表
+        @param list_summary: 回测汇总的列表
+        @return: df格式的排名表(按收益/最大回撤从高到低)
+        """
+        rank = pandas.DataFrame(list_summary)
+        if len(rank) == 0:
+            return rank
+        rank['score'] = rank['profit'] / rank['drawdown'].where(rank['drawdown'] > 0, numpy.nan)
+        rank = rank.sort_values(['score', 'profit'], ascending=False, na_position='last').reset_index(drop=True)
+        return rank
+
+    @staticmethod
+    def d0param_best(rank):
+        """ 排名第一的参数, 可以直接填入dict_test_param
+        @param rank: d0optimize返回的排名表
+        @return: {标的: 7个回测参数}
+        """
+        best = {} if len(rank) == 0 else {rank['symbol'][0]: list(rank['param'][0])}
+        return best
@@ -0,0 +1,316 @@
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fff01x_v16t100_opms_beta_sim as sim
+
+sim.d0install()  # 基准测试在模拟MT5上运行, 必须在导入策略之前注册
+import fff01x_v16t100_opms_beta as fff
+from fff01x_v16t100_opms_beta import *
+
+
+class C0Bench:
+    symbol_bench = "BENCH"
+    count_log = 20000
+    list_symbol = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "NZDUSD", "USDCAD", "USDCHF"]
+    list_stage = ["toolbox_ploy", "d0param_analyse", "d0param_show", "d0ma_cross", "d0common_limit",
+                  "d0make_order", "d0protect_cost", "d0clear_data", "d0record_save"]  # 循环中心的各个阶段
+    list_case = [(1, 500), (1, 2000), (4, 500), (7, 500)]  # (标的数量, 缓存K线数量)
+    count_iteration = 2000  # 每个标的计时的循环次数
+    count_warm = 20  # 预热的循环次数(首轮全量取数/全量计算), 不计入统计
+    count_trace = 200  # 计时之后再用tracemalloc统计内存分配的循环次数
+    dir_baseline = ".\\bench"
+    file_baseline = ".\\bench\\baseline.json"
+    ratio_latency = 1.5  # 耗时超过基线的倍数时视为退化(计时受机器负载影响, 留足余量)
+    ms_floor = 0.05  # 基线低于该耗时(毫秒)的阶段不比较, 避免微秒级的噪声
+    ratio_alloc = 1.2  # 内存分配超过基线的倍数时视为退化
+    count_call_more = 0.05  # MT5调用次数/每次循环超过基线的数量时视为退化(确定性指标)
+
+    @staticmethod
+    def d0log_before(content, level="info"):
+        """ 旧版的输出和保存日志: 每行都重新创建Formatter/FileHandler/StreamHandler
+        @param content: 日志内容
+        @param level: info(默认)/warning/error/critical依次提高
+        """
+        logger = logging.getLogger()
+        logger.setLevel(logging.DEBUG)
+        txt = f"[{C0Bench.symbol_bench}/%(asctime)s] %(message)s"
+        date = "%Y.%m.%d/%H:%M:%S"
+        dict_color = {"warning": colorama.Fore.GREEN,
+                      "error": colorama.Fore.YELLOW,
+                      "critical": colorama.Fore.RED}
+        fmt = logging.Formatter(dict_color[level] + txt, date) if level in dict_color else \
+            logging.Formatter(txt, date)
+
+        os.makedirs(".\\log") if not os.path.exists(".\\log") else None
+        handler_file = logging.FileHandler(f".\\log\\{C0Bench.symbol_bench}.txt")
+        handler_stream = logging.StreamHandler()
+        handler_file.setFormatter(fmt)
+        handler_stream.setFormatter(fmt)
+        logger.addHandler(handler_file)
+        logger.addHandler(handler_stream)
+
+        logger.warning(content) if level == "warning" else (
+            logger.error(content)) if level == "error" else (
+            logger.critical(content)) if level == "critical" else (
+            logger.info(content))
+        logger.handlers.clear()
+
+    @staticmethod
+    def d0bench_log():
+        """ 日志吞吐量: 旧版逐行创建handler vs 新版队列+监听线程(控制台输出会被丢弃, 只比较日志本身的开销)
+        """
+        count_log = C0Bench.count_log
+        log_after = C1Help(C0Bench.symbol_bench).d0log
+        stderr = sys.stderr
+        sys.stderr = open(os.devnull, "w")
+        try:
+            begin = time.perf_counter()
+            for i in range(count_log):
+                C0Bench.d0log_before(f"~基准测试~ 第{i}行")
+            secs_before = time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            for i in range(count_log):
+                log_after(f"~基准测试~ 第{i}行")
+            secs_call = time.perf_counter() - begin
+            C1Help.log_listener.d0stop()
+            secs_after = time.perf_counter() - begin
+        finally:
+            sys.stderr.close()
+            sys.stderr = stderr
+        print(title("日志吞吐", position="up"))
+        print(f"旧版: {round(count_log / secs_before)}行/秒")
+        print(f"新版: 调用方={round(count_log / secs_call)}行/秒, "
+              f"含落盘={round(count_log / secs_after)}行/秒, "
+              f"提升={round(secs_before / secs_after, 1)}倍")
+        print(title("日志吞吐", position="down"))
+
+    @staticmethod
+    def d0stage_wrap(ploy, name, dict_stage):
+        """ 给策略实例的某个阶段套上计时(实例属性优先于类方法, 不改动策略本身)
+        @param ploy: C1Ploy实例或者C0PloySet实例
+        @param name: 阶段名称(方法名或绑定的属性名)
+        @param dict_stage: 阶段: 耗时列表(毫秒), 多个策略实例的同一阶段计入同一列表
+        """
+        func = getattr(ploy, name)
+        list_secs = dict_stage.setdefault(name, [])
+
+        def wrap(*args, **kwargs):
+            begin = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                list_secs.append((time.perf_counter() - begin) * 1000)
+
+        setattr(ploy, name, wrap)
+
+    @staticmethod
+    def d0bench_worker(symbol, bar_keep):
+        """ 单个标的的循环基准: 在临时目录中用合成数据运行C0PloySet.d0circle_center(与运行脚本一致),
+        每次虚拟休眠视为一次循环的边界
+        @param symbol: 标的
+        @param bar_keep: 缓存K线数量
+        @return: 原始统计(各阶段耗时, 每次循环耗时, 内存分配, MT5调用)
+        """
+        dir_work = tempfile.mkdtemp(prefix="fff_bench_")
+        os.chdir(dir_work)
+        sys.stdout = sys.stderr = open(os.devnull, "w")
+        C1Ploy.dict_test_param.setdefault(symbol, [])
+        if not C1Ploy.dict_test_param[symbol]:  # 基准测试只关心耗时, 没有参数的标的借用EURUSD的参数
+            C1Ploy.dict_test_param[symbol] = C1Ploy.dict_test_param["EURUSD"]
+        count_total = C0Bench.count_warm + C0Bench.count_iteration + C0Bench.count_trace
+        core = C0Core(symbol)
+        core.bar_keep = bar_keep
+        core.email_count_hour = 0  # 不发送邮件
+        day_warm = bar_keep * 7 // (24 * 5) + 3  # 操作周期为H1, 周末没有K线
+        sim.d0synthetic([symbol], day_count=day_warm + count_total * core.secs_short // 86400 + 3,
+                        seed=C0Bench.list_symbol.index(symbol) if symbol in C0Bench.list_symbol else 0)
+        sim.d0clock_reset(day_warmup=day_warm, balance=core.balance_begin)
+        sim.d0clock_patch(fff)
+        core.d0config_all()
+
+        dict_stage = {}
+        for i in C0Bench.list_stage:  # 策略环境由策略实例共用(在C0PloySet上), 其余阶段在每个策略实例上
+            for ploy in [core.c0ployset] if hasattr(core.c0ployset, i) else core.list_c1ploy:
+                C0Bench.d0stage_wrap(ploy, i, dict_stage)
+        list_loop = []
+        list_alloc = []
+        dict_state = {"count": 0, "time": None, "memory": 0, "memory_begin": 0}
+        sleep = sim.clock.sleep
+
+        def sleep_hook(secs):
+            now = time.perf_counter()
+            count = dict_state["count"]
+            if count == C0Bench.count_warm:  # 预热结束: 清空统计
+                for i in dict_stage.values():
+                    i.clear()
+                sim.broker.dict_call.clear()
+            elif C0Bench.count_warm < count <= C0Bench.count_warm + C0Bench.count_iteration:
+                list_loop.append((now - dict_state["time"]) * 1000)
+            if count == C0Bench.count_warm + C0Bench.count_iteration:  # 计时结束: 之后的耗时受tracemalloc影响
+                dict_state["call"] = dict(sim.broker.dict_call)
+                dict_state["stage"] = {key: list(value) for key, value in dict_stage.items()}
+                tracemalloc.start()
+                dict_state["memory_begin"] = tracemalloc.get_traced_memory()[0]
+            elif count > C0Bench.count_warm + C0Bench.count_iteration:
+                current, peak = tracemalloc.get_traced_memory()
+                list_alloc.append(peak - dict_state["memory"])
+                dict_state["memory_end"] = current
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+                dict_state["memory"] = tracemalloc.get_traced_memory()[0]
+            dict_state["count"] = count + 1
+            if dict_state["count"] > count_total:
+                raise sim.C0SimEnd("基准测试的循环次数已满")
+            sleep(secs)
+            dict_state["time"] = time.perf_counter()
+
+        sim.clock.sleep = sleep_hook
+        done = "完成"
+        try:
+            core.c0ployset.d0circle_center()
+        except sim.C0SimEnd:
+            pass
+        except SystemExit:
+            done = "策略中途退出"
+        tracemalloc.stop()
+        C1Help.log_listener.d0stop()
+        os.chdir(os.path.dirname(dir_work))
+        shutil.rmtree(dir_work, ignore_errors=True)
+        return {"symbol": symbol,
+                "done": done,
+                "stage": dict_state.get("stage", dict_stage),
+                "loop": list_loop,
+                "alloc": list_alloc,
+                "growth": (dict_state.get("memory_end", 0) - dict_state["memory_begin"]) / max(len(list_alloc), 1),
+                "call": dict_state.get("call", {}),
+                "hours": C0Bench.count_iteration * core.secs_short / 3600}
+
+    @staticmethod
+    def d0bench_case(symbol_count, bar_keep):
+        """ 一个基准场景: 每个标的一个进程(与运行脚本一致), 同时运行
+        @param symbol_count: 标的数量
+        @param bar_keep: 缓存K线数量
+        @return: 汇总统计
+        """
+        list_symbol = C0Bench.list_symbol[:symbol_count]
+        begin = time.perf_counter()
+        with multiprocessing.Pool(processes=symbol_count, maxtasksperchild=1) as pool:
+            list_result = pool.starmap(C0Bench.d0bench_worker, [(i, bar_keep) for i in list_symbol])
+        secs_wall = time.perf_counter() - begin
+        loop = numpy.concatenate([i["loop"] for i in list_result])
+        alloc = numpy.concatenate([i["alloc"] for i in list_result])
+        dict_call = {}
+        for result in list_result:
+            for key, value in result["call"].items():
+                dict_call[key] = dict_call.get(key, 0) + value
+        count_loop = max(len(loop), 1)
+        summary = {"loop_p50": numpy.percentile(loop, 50),
+                   "loop_p90": numpy.percentile(loop, 90),
+                   "loop_p99": numpy.percentile(loop, 99),
+                   "loop_max": loop.max(),
+                   "throughput": len(loop) / (loop.sum() / 1000),
+                   "hours_minute": sum(i["hours"] for i in list_result) / (loop.sum() / 1000 / symbol_count) * 60,
+                   "alloc_peak": numpy.percentile(alloc, 50) if len(alloc) else 0.0,
+                   "alloc_growth": numpy.mean([i["growth"] for i in list_result]),
+                   "call_iteration": sum(dict_call.values()) / count_loop,
+                   "call": {key: value / count_loop for key, value in sorted(dict_call.items())},
+                   "stage": {},
+                   "wall": secs_wall,
+                   "done": {i["symbol"]: i["done"] for i in list_result}}
+        for name in C0Bench.list_stage:
+            stage = numpy.concatenate([i["stage"].get(name, []) for i in list_result])
+            if len(stage) == 0:
+                continue
+            percentile = numpy.percentile(stage, [50, 90, 99, 100])
+            summary["stage"][name] = {"p50": percentile[0], "p90": percentile[1], "p99": percentile[2],
+                                      "max": percentile[3], "share": stage.sum() / loop.sum()}
+        return json.loads(json.dumps(summary, default=float))
+
+    @staticmethod
+    def d0bench_show(name, summary):
+        """ 显示一个基准场景的结果
+        @param name: 场景名称
+        @param summary: 汇总统计
+        """
+        print(title(name, position="up", sub=True))
+        print(f"循环: p50={summary['loop_p50']:.3f}ms, p90={summary['loop_p90']:.3f}ms, "
+              f"p99={summary['loop_p99']:.3f}ms, 最大={summary['loop_max']:.3f}ms")
+        print(f"吞吐: {summary['throughput']:.0f}次/秒/标的, {summary['hours_minute']:.0f}模拟小时/分钟(全部标的), "
+              f"墙钟={summary['wall']:.1f}秒")
+        print(f"内存: 每次循环的分配峰值={summary['alloc_peak'] / 1024:.1f}KB, "
+              f"每次循环的净增长={summary['alloc_growth']:.0f}B")
+        print(f"MT5: {summary['call_iteration']:.2f}次/循环 "
+              + ", ".join(f"{key}={value:.2f}" for key, value in summary["call"].items()))
+        for key, value in summary["stage"].items():
+            print(f"阶段: {key:<16} p50={value['p50']:.3f}ms, p90={value['p90']:.3f}ms, p99={value['p99']:.3f}ms, "
+                  f"最大={value['max']:.3f}ms, 占比={value['share'] * 100:.1f}%")
+        list_quit = [key for key, value in summary["done"].items() if value != "完成"]
+        print(f"注意: 策略中途退出={list_quit}") if list_quit else None
+
+    @staticmethod
+    def d0bench_compare(name, summary, baseline):
+        """ 与基线比较
+        @param name: 场景名称
+        @param summary: 汇总统计
+        @param baseline: 该场景的基线
+        @return: 退化项目的列表
+        """
+        list_regress = []
+        list_check = [("loop_p50", C0Bench.ratio_latency), ("loop_p99", C0Bench.ratio_latency),
+                      ("alloc_peak", C0Bench.ratio_alloc)]
+        for key, ratio in list_check:
+            if summary[key] > baseline[key] * ratio:
+                list_regress.append(f"{name} {key}: {summary[key]:.3f} > 基线{baseline[key]:.3f}*{ratio}")
+        for key, value in summary["stage"].items():
+            value_base = baseline["stage"].get(key)
+            if value_base is None or value_base["p50"] < C0Bench.ms_floor:
+                continue
+            if value["p50"] > value_base["p50"] * C0Bench.ratio_latency:
+                list_regress.append(f"{name} {key}.p50: {value['p50']:.3f}ms > "
+                                    f"基线{value_base['p50']:.3f}ms*{C0Bench.ratio_latency}")
+        if summary["call_iteration"] > baseline["call_iteration"] + C0Bench.count_call_more:
+            list_regress.append(f"{name} call_iteration: {summary['call_iteration']:.2f} > "
+                                f"基线{baseline['call_iteration']:.2f}")
+        return list_regress
+
+    @staticmethod
+    def d0bench_loop(save=False):
+        """ 循环中心的基准: 逐个场景运行, 与基线比较, 退化时以非零状态退出
+        @param save: 是否把本次结果保存为新的基线(基线文件不存在时也会保存)
+        """
+        print(title("循环基准", position="up"))
+        dict_baseline = {}
+        if os.path.exists(C0Bench.file_baseline):
+            with open(C0Bench.file_baseline, "r", encoding="utf-8") as file:
+                dict_baseline = json.load(file)
+        dict_summary = {}
+        list_regress = []
+        for symbol_count, bar_keep in C0Bench.list_case:
+            name = f"标的{symbol_count}_K线{bar_keep}"
+            dict_summary[name] = C0Bench.d0bench_case(symbol_count, bar_keep)
+            C0Bench.d0bench_show(name, dict_summary[name])
+            if not save and name in dict_baseline:
+                list_regress += C0Bench.d0bench_compare(name, dict_summary[name], dict_baseline[name])
+        if save or not dict_baseline:
+            os.makedirs(C0Bench.dir_baseline) if not os.path.exists(C0Bench.dir_baseline) else None
+            with open(C0Bench.file_baseline, "w", encoding="utf-8") as file:
+                json.dump(dict_summary, file, ensure_ascii=False, indent=1)
+            print(f"基线: 已保存到{C0Bench.file_baseline}")
+        print(title("循环基准", position="down"))
+        if list_regress:
+            print(colorama.Fore.RED + "性能退化:\n" + "\n".join(list_regress))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    title = C1Help.d0title
+    C0Bench.d0bench_log()
+    C0Bench.d0bench_loop(save="--save" in sys.argv)
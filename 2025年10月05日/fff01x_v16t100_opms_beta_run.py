@@ -5,6 +5,7 @@ from fff01x_v16t100_opms_beta import *
 if __name__ == '__main__':
     symbol_placeholder = "USDZAR"
     symbol_list_operate = ["AUDUSD", "EURUSD", "GBPUSD", "NZDUSD", "USDCAD", "USDCHF", "USDJPY"]
+    process_share = False  # True: 所有标的在同一进程中调度(一个MT5会话), False: 每个标的一个进程
     log = C1Help(symbol_placeholder).d0log
     title = C1Help(symbol_placeholder).d0title
 
@@ -17,8 +18,45 @@ if __name__ == '__main__':
             log(title("启动程序", position="up"))
             log("名称: <FreeFlyFrame> by JesseLiu, NO.fff01x_v16t100_opms_beta.py")
             log(f"标的: 占位={symbol_placeholder}, 操作={symbol_list_operate}")
+            log(f"模式: {'单进程调度' if process_share else '每个标的一个进程'}")
             log(title("启动程序", position="down"))
 
+        @staticmethod
+        def d0metric_start():
+            """ 开启埋点时: 清理上次运行的埋点文件, 并在本机启动汇总所有进程的端点
+            """
+            core = C0Core(symbol_placeholder)
+            if not core.metric_on:
+                return
+            for i in os.listdir(core.metric_path) if os.path.exists(core.metric_path) else []:
+                os.remove(f"{core.metric_path}\\{i}") if i.endswith(".prom") else None
+            C0Metric.d0serve(path=core.metric_path, port=core.metric_port)
+            log(f"埋点: 汇总端点=http://127.0.0.1:{core.metric_port}/metrics")
+
+        @staticmethod
+        def d0feed_start():
+            """ 开启行情中心时: 在单独的进程中为所有操作标的拉取报价和K线, 策略进程只读共享内存
+            @return: (进程, 停止信号), 未开启时返回(None, None)
+            """
+            if not C0Core(symbol_placeholder).feed_on:
+                return None, None
+            event_stop = multiprocessing.Event()
+            process = multiprocessing.Process(target=C0Core(symbol_placeholder).d0feed_start,
+                                              args=(symbol_list_operate, event_stop))
+            process.start()
+            log("行情: 已启动行情中心进程")
+            return process, event_stop
+
+        @staticmethod
+        def d0feed_quit(process, event_stop):
+            """ 所有策略退出之后: 停止行情中心并等待其释放共享内存
+            """
+            if process is None:
+                return
+            event_stop.set()
+            process.join()
+            log("行情: 已停止行情中心进程")
+
         @staticmethod
         def d0process_start():
             """ 根据操作标的分配进程
@@ -34,6 +72,14 @@ if __name__ == '__main__':
             for i in list_process:
                 i.join()
 
+        @staticmethod
+        def d0schedule_start():
+            """ 所有标的在当前进程中调度
+            """
+            log(title("启动调度", position="up"))
+            C0Scheduler(symbol_placeholder, symbol_list_operate).d0schedule_start()
+            log(title("启动调度", position="down"))
+
         @staticmethod
         def d0program_quit():
             """ 整个程序的退出口
@@ -44,7 +90,10 @@ if __name__ == '__main__':
 
 
     C0Main.d0program_start()
+    C0Main.d0metric_start()
     C0Core(symbol_placeholder).d0common_start()
-    C0Main.d0process_start()
+    feed_process, feed_stop = C0Main.d0feed_start()
+    C0Main.d0schedule_start() if process_share else C0Main.d0process_start()
+    C0Main.d0feed_quit(feed_process, feed_stop)
     C0Core(symbol_placeholder).d0common_quit()
     C0Main.d0program_quit()
@@ -0,0 +1,587 @@
+""" 模拟MT5: 与MetaTrader5模块的已用接口保持一致, 由M1K线(录制或者合成)和虚拟时钟驱动, 可以在Linux上高速回放
+用法:
+    import fff01x_v16t100_opms_beta_sim as sim
+    sim.d0install()  # 必须在导入fff01x_v16t100_opms_beta之前
+    import fff01x_v16t100_opms_beta as fff
+    sim.d0synthetic(["EURUSD", "GBPUSD"], day_count=120)
+    sim.d0clock_patch(fff)  # fff模块内部的time.sleep/time.monotonic/time.time改为虚拟时钟
+    C0Core("EURUSD").d0ploy_start()  # 数据回放完毕时抛出C0SimEnd
+"""
+import bisect
+import sys
+import time as time_real
+from collections import namedtuple
+
+import numpy
+
+# 常量: 与MetaTrader5模块的取值一致
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 0x4001
+TIMEFRAME_H4 = 0x4004
+TIMEFRAME_D1 = 0x4018
+TIMEFRAME_W1 = 0x8001
+TIMEFRAME_MN1 = 0xC001
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+TRADE_ACTION_REMOVE = 8
+ORDER_TIME_GTC = 0
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+SYMBOL_FILLING_FOK = 1
+SYMBOL_FILLING_IOC = 2
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_INVALID_FILL = 10030
+TRADE_RETCODE_INVALID_ORDER = 10035
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+# 返回值: 字段为MetaTrader5同名结构的子集
+Tick = namedtuple("Tick", ["time", "bid", "ask", "last", "volume", "time_msc", "flags", "volume_real"])
+SymbolInfo = namedtuple("SymbolInfo", ["name", "visible", "select", "digits", "spread", "point", "trade_tick_value",
+                                       "trade_tick_size", "trade_contract_size", "trade_stops_level",
+                                       "volume_min", "volume_step", "volume_max", "filling_mode", "bid", "ask",
+                                       "time"])
+TerminalInfo = namedtuple("TerminalInfo", ["connected", "trade_allowed", "ping_last", "name", "company"])
+AccountInfo = namedtuple("AccountInfo", ["login", "leverage", "balance", "credit", "profit", "equity", "margin",
+                                         "margin_free", "margin_level", "name", "server", "currency", "company"])
+TradePosition = namedtuple("TradePosition", ["ticket", "time", "time_msc", "time_update", "time_update_msc", "type",
+                                             "magic", "identifier", "reason", "volume", "price_open", "sl", "tp",
+                                             "price_current", "swap", "profit", "symbol", "comment", "external_id"])
+TradeOrder = namedtuple("TradeOrder", ["ticket", "time_setup", "time_setup_msc", "type", "magic", "volume_initial",
+                                       "volume_current", "price_open", "sl", "tp", "price_current", "symbol",
+                                       "comment"])
+OrderSendResult = namedtuple("OrderSendResult", ["retcode", "deal", "order", "volume", "price", "bid", "ask",
+                                                 "comment", "request_id", "retcode_external", "request"])
+
+dtype_rates = numpy.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                           ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+dict_spec_default = {"EURUSD": (5, 1.10, 1.0), "GBPUSD": (5, 1.27, 1.0), "AUDUSD": (5, 0.66, 1.0),
+                     "NZDUSD": (5, 0.61, 1.0), "USDCAD": (5, 1.36, 0.73), "USDCHF": (5, 0.90, 1.11),
+                     "USDJPY": (3, 150.0, 0.67), "USDZAR": (5, 18.5, 0.054), "XAUUSD": (2, 2000.0, 0.1)}  # 小数位, 价格, 每跳价值
+
+
+class C0SimEnd(BaseException):
+    """ 虚拟时钟超过了数据的末尾(继承BaseException, 不会被策略中的except Exception吞掉)
+    """
+
+
+class C0Clock:
+    def __init__(self, now, end):
+        """ 虚拟时钟: sleep只推进虚拟时间而不真正等待, 其余属性沿用真实的time模块
+        perf_counter保持真实时间, 用于测量代码本身的耗时
+        @param now: 开始时间(服务器时间的秒数)
+        @param end: 数据结束时间, 超过时抛出C0SimEnd
+        """
+        self.now = float(now)
+        self.end = end
+        self.count_sleep = 0
+
+    def __getattr__(self, name):
+        return getattr(time_real, name)
+
+    def sleep(self, secs):
+        self.count_sleep += 1
+        self.now += secs
+        if self.now >= self.end:
+            raise C0SimEnd(f"模拟数据已回放完毕: {self.end}")
+        broker.d0advance()
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+class C0Symbol:
+    def __init__(self, name, bar_m1, digits, tick_value, spread):
+        """ 单个标的的数据: M1K线是唯一的数据源, 其余周期和报价均由其推导
+        @param name: 标的
+        @param bar_m1: numpy结构化数组格式的M1K线(时间升序)
+        @param digits: 小数位
+        @param tick_value: 每跳价值
+        @param spread: 默认点差(点), 用于K线自带spread为0的情况
+        """
+        self.name = name
+        self.bar = bar_m1
+        self.time = numpy.ascontiguousarray(bar_m1['time'])
+        self.list_time = self.time.tolist()  # 标量查询使用列表+bisect, 比numpy.searchsorted快一个数量级
+        self.list_ohlc = list(zip(*(bar_m1[i].tolist() for i in ('open', 'high', 'low', 'close'))))
+        self.digits = digits
+        self.point = 10.0 ** -digits
+        self.tick_value = tick_value
+        self.spread = numpy.where(bar_m1['spread'] > 0, bar_m1['spread'], spread) * self.point
+        self.dict_frame = {}  # 周期: (每根K线的第一根M1的下标, 已聚合的完整K线)
+        self.tick = (None, None)  # (时间, 报价): 同一时刻的重复查询直接复用
+        self.filling_mode = SYMBOL_FILLING_FOK  # 允许的成交模式(SYMBOL_FILLING_*的组合)
+
+    @staticmethod
+    def d0bucket(time_, frame):
+        """ 每个时间所属K线的开盘时间
+        """
+        if frame == TIMEFRAME_MN1:
+            return time_.astype('datetime64[s]').astype('datetime64[M]').astype('datetime64[s]').astype('<i8')
+        elif frame == TIMEFRAME_W1:  # 周线从周日开始, 1970-01-04是周日
+            return (time_ - 3 * 86400) // (7 * 86400) * (7 * 86400) + 3 * 86400
+        secs = (frame & 0x3FFF) * 3600 if frame & 0x4000 else frame * 60
+        return time_ // secs * secs
+
+    def d0frame(self, frame):
+        """ 某周期的完整K线(首次调用时一次性聚合)
+        """
+        if frame not in self.dict_frame:
+            bucket = self.d0bucket(self.time, frame)
+            start = numpy.flatnonzero(numpy.r_[True, bucket[1:] != bucket[:-1]])
+            bar = numpy.zeros(len(start), dtype_rates)
+            bar['time'] = bucket[start]
+            bar['open'] = self.bar['open'][start]
+            bar['high'] = numpy.maximum.reduceat(self.bar['high'], start)
+            bar['low'] = numpy.minimum.reduceat(self.bar['low'], start)
+            bar['close'] = self.bar['close'][numpy.r_[start[1:] - 1, len(self.bar) - 1]]
+            bar['tick_volume'] = numpy.add.reduceat(self.bar['tick_volume'], start)
+            bar['spread'] = self.bar['spread'][start]
+            self.dict_frame[frame] = (start.tolist(), bar)
+        return self.dict_frame[frame]
+
+    def d0points(self, index):
+        """ M1K线内部的价格路径的顶点: 阳线O-L-H-C, 阴线O-H-L-C, 分别位于第0/20/40/60秒
+        """
+        o, h, lo, c = self.list_ohlc[index]
+        return (o, lo, h, c) if c >= o else (o, h, lo, c)
+
+    def d0price_at(self, points, secs):
+        """ 路径上某一秒的价格(每段20秒线性插值)
+        """
+        segment = min(int(secs // 20), 2)
+        return points[segment] + (points[segment + 1] - points[segment]) * (secs - segment * 20) / 20
+
+    def d0path(self, index, now):
+        """ M1K线内部的价格路径: 从开盘到now
+        @return: (当前价格, 至今最高价, 至今最低价)
+        """
+        price, high, low = self.d0path_range(index, self.list_time[index], now)
+        return round(price, self.digits), high, low
+
+    def d0path_range(self, index, time_from, time_to):
+        """ M1K线内部的价格路径在[time_from, time_to]之内的极值(超出该分钟的部分截到分钟的两端)
+        @return: (time_to的价格, 区间最高价, 区间最低价)
+        """
+        points = self.d0points(index)
+        secs_from = min(max(time_from - self.list_time[index], 0), 60)
+        secs_to = min(max(time_to - self.list_time[index], secs_from), 60)
+        price = self.d0price_at(points, secs_to)
+        reached = [self.d0price_at(points, secs_from), price] + \
+                  [points[i] for i in (1, 2) if secs_from < i * 20 < secs_to]
+        return price, max(reached), min(reached)
+
+    def d0index(self, now):
+        """ 当前时间所在(或最近一根已开盘)的M1K线
+        @return: 下标, -1表示还没有数据
+        """
+        return bisect.bisect_right(self.list_time, now) - 1
+
+    def d0tick(self, now):
+        if self.tick[0] == now:
+            return self.tick[1]
+        index = self.d0index(now)
+        if index < 0:
+            return None
+        time_ = min(now, self.list_time[index] + 59)  # 休市期间停留在最后一个报价
+        price = self.d0path(index, time_)[0]
+        spread = float(self.spread[index])
+        tick = Tick(time=int(time_), bid=price, ask=round(price + spread, self.digits), last=0.0, volume=0,
+                    time_msc=int(time_ * 1000), flags=6, volume_real=0.0)
+        self.tick = (now, tick)
+        return tick
+
+    def d0rates(self, frame, now, pos, count):
+        index = self.d0index(now)
+        if index < 0:
+            return None
+        list_start, bar = self.d0frame(frame)
+        current = bisect.bisect_right(list_start, index) - 1  # 正在形成的K线
+        start = list_start[current]
+        forming = bar[current].copy()
+        price, high, low = self.d0path(index, now)
+        forming['high'] = max(self.bar['high'][start:index].max(initial=high), high)
+        forming['low'] = min(self.bar['low'][start:index].min(initial=low), low)
+        forming['close'] = price
+        forming['tick_volume'] = self.bar['tick_volume'][start:index].sum()
+        rates = bar[max(current - pos - count + 1, 0):max(current - pos + 1, 0)].copy()
+        if pos == 0 and len(rates) > 0:
+            rates[-1] = forming
+        return rates
+
+
+class C0Broker:
+    def __init__(self):
+        """ 模拟经纪商: 持仓/挂单/账户, 止损止盈按M1K线的路径在虚拟时钟推进时触发
+        """
+        self.dict_symbol = {}
+        self.dict_hold = {}  # 单号: 持仓(dict)
+        self.dict_pend = {}
+        self.balance = 0.0
+        self.leverage = 100
+        self.ticket = 100000
+        self.error = (1, "Success")
+        self.time_check = 0.0  # 上次检查止损止盈的时间
+        self.connected = False
+        self.dict_call = {}  # 接口: 调用次数
+        self.list_deal = []  # 已平仓的成交
+        self.list_retcode = []  # 注入的返回码: 依次作为之后几次order_send的结果(不执行请求)
+
+    def d0count(self, name):
+        self.dict_call[name] = self.dict_call.get(name, 0) + 1
+
+    def d0price(self, symbol):
+        tick = self.dict_symbol[symbol].d0tick(clock.now)
+        return tick
+
+    def d0profit(self, hold, tick):
+        data = self.dict_symbol[hold['symbol']]
+        price = tick.bid if hold['type'] == ORDER_TYPE_BUY else tick.ask
+        sign = 1 if hold['type'] == ORDER_TYPE_BUY else -1
+        profit = (price - hold['price_open']) * sign / data.point * data.tick_value * hold['volume']
+        return price, round(profit, 2)
+
+    def d0advance(self):
+        """ 虚拟时钟推进之后: 按期间(上次检查之后到现在)的M1K线路径检查所有持仓的止损止盈
+        首尾两根M1K线只取区间之内的路径, 中间的M1K线取整根的最高/最低价
+        """
+        now = clock.now
+        for ticket, hold in list(self.dict_hold.items()):
+            data = self.dict_symbol[hold['symbol']]
+            end = data.d0index(now)
+            if end < 0:
+                continue
+            time_from = self.time_check if self.time_check else now
+            begin = max(data.d0index(time_from), 0)
+            buy = hold['type'] == ORDER_TYPE_BUY
+            if begin == end:
+                _, high_first, low_first = data.d0path_range(end, time_from, now)
+                low = numpy.array([low_first])
+                high = numpy.array([high_first])
+            else:
+                _, high_first, low_first = data.d0path_range(begin, time_from, now)
+                _, high_now, low_now = data.d0path_range(end, data.list_time[end], now)
+                low = numpy.concatenate(([low_first], data.bar['low'][begin + 1:end], [low_now]))
+                high = numpy.concatenate(([high_first], data.bar['high'][begin + 1:end], [high_now]))
+            spread = data.spread[begin:end + 1]
+            hit_sl = (low <= hold['sl']) if buy else (high + spread >= hold['sl'])
+            hit_sl &= hold['sl'] > 0
+            hit_tp = (high >= hold['tp']) if buy else (low + spread <= hold['tp'])
+            hit_tp &= hold['tp'] > 0
+            hit = numpy.flatnonzero(hit_sl | hit_tp)
+            if len(hit) > 0:
+                self.d0close(ticket, hold['sl'] if hit_sl[hit[0]] else hold['tp'], "sl" if hit_sl[hit[0]] else "tp")
+        self.time_check = now
+
+    def d0close(self, ticket, price, reason):
+        hold = self.dict_hold.pop(ticket)
+        data = self.dict_symbol[hold['symbol']]
+        sign = 1 if hold['type'] == ORDER_TYPE_BUY else -1
+        profit = round((price - hold['price_open']) * sign / data.point * data.tick_value * hold['volume'], 2)
+        self.balance += profit
+        self.list_deal.append(dict(hold, price_close=price, time_close=int(clock.now), profit=profit, reason=reason))
+
+    def d0open(self, request, tick):
+        data = self.dict_symbol[request['symbol']]
+        type_ = request['type']
+        price = tick.ask if type_ == ORDER_TYPE_BUY else tick.bid
+        self.ticket += 1
+        self.dict_hold[self.ticket] = {"ticket": self.ticket, "time": int(clock.now), "type": type_,
+                                       "magic": request.get("magic", 0), "volume": request['volume'],
+                                       "price_open": price, "sl": float(request.get("sl", 0.0)),
+                                       "tp": float(request.get("tp", 0.0)), "symbol": data.name,
+                                       "comment": request.get("comment", "")}
+        return self.ticket, price
+
+    def d0stops_valid(self, hold, sl, tp, tick):
+        if hold['type'] == ORDER_TYPE_BUY:
+            return (sl == 0 or sl < tick.bid) and (tp == 0 or tp > tick.bid)
+        return (sl == 0 or sl > tick.ask) and (tp == 0 or tp < tick.ask)
+
+    def d0result(self, retcode, request, order=0, volume=0.0, price=0.0, tick=None):
+        self.error = (1, "Success") if retcode == TRADE_RETCODE_DONE else (retcode, "Trade request failed")
+        return OrderSendResult(retcode=retcode, deal=order, order=order, volume=volume, price=price,
+                               bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0, comment="",
+                               request_id=0, retcode_external=0, request=request)
+
+    def d0send(self, request):
+        self.d0advance()
+        action = request.get("action")
+        if action == TRADE_ACTION_DEAL:
+            symbol = request.get("symbol")
+            if symbol not in self.dict_symbol:
+                return self.d0result(TRADE_RETCODE_INVALID, request)
+            tick = self.d0price(symbol)
+            data_filling = self.dict_symbol[symbol].filling_mode
+            if tick is None or clock.now - tick.time > 60:
+                return self.d0result(TRADE_RETCODE_MARKET_CLOSED, request, tick=tick)
+            filling = request.get("type_filling")
+            if filling is not None and not (filling == ORDER_FILLING_FOK and data_filling & SYMBOL_FILLING_FOK or
+                                            filling == ORDER_FILLING_IOC and data_filling & SYMBOL_FILLING_IOC):
+                return self.d0result(TRADE_RETCODE_INVALID_FILL, request, tick=tick)
+            volume = request.get("volume", 0)
+            if volume < 0.01 or abs(round(volume / 0.01) * 0.01 - volume) > 1e-9:
+                return self.d0result(TRADE_RETCODE_INVALID_VOLUME, request, tick=tick)
+            if "position" in request:
+                hold = self.dict_hold.get(request['position'])
+                if hold is None:
+                    return self.d0result(TRADE_RETCODE_POSITION_CLOSED, request, tick=tick)
+                price = tick.bid if hold['type'] == ORDER_TYPE_BUY else tick.ask
+                self.d0close(request['position'], price, "close")
+                return self.d0result(TRADE_RETCODE_DONE, request, request['position'], volume, price, tick)
+            ticket, price = self.d0open(request, tick)
+            return self.d0result(TRADE_RETCODE_DONE, request, ticket, volume, price, tick)
+        elif action == TRADE_ACTION_SLTP:
+            hold = self.dict_hold.get(request.get("position"))
+            if hold is None:
+                return self.d0result(TRADE_RETCODE_POSITION_CLOSED, request)
+            tick = self.d0price(hold['symbol'])
+            sl = float(request.get("sl", hold['sl']))
+            tp = float(request.get("tp", hold['tp']))
+            if not self.d0stops_valid(hold, sl, tp, tick):
+                return self.d0result(TRADE_RETCODE_INVALID_STOPS, request, tick=tick)
+            hold['sl'], hold['tp'] = sl, tp
+            return self.d0result(TRADE_RETCODE_DONE, request, hold['ticket'], tick=tick)
+        elif action == TRADE_ACTION_REMOVE:
+            if self.dict_pend.pop(request.get("order"), None) is None:
+                return self.d0result(TRADE_RETCODE_INVALID_ORDER, request)
+            return self.d0result(TRADE_RETCODE_DONE, request, request['order'])
+        self.error = (-2, "Invalid arguments")
+        return None
+
+
+def d0load(symbol, bar_m1, digits=None, tick_value=None, spread=12):
+    """ 载入录制的M1K线(例如从MT5导出的copy_rates_range的返回值)
+    @param symbol: 标的
+    @param bar_m1: numpy结构化数组格式的M1K线
+    @param digits: 小数位(默认按dict_spec_default)
+    @param tick_value: 每跳价值(默认按dict_spec_default)
+    @param spread: 默认点差(点)
+    """
+    spec = dict_spec_default.get(symbol, (5, 1.0, 1.0))
+    bar = numpy.zeros(len(bar_m1), dtype_rates)
+    for name in dtype_rates.names:
+        bar[name] = bar_m1[name] if name in bar_m1.dtype.names else 0
+    broker.dict_symbol[symbol] = C0Symbol(symbol, bar, spec[0] if digits is None else digits,
+                                          spec[2] if tick_value is None else tick_value, spread)
+    d0clock_reset()
+
+
+def d0synthetic(list_symbol, day_count=120, time_begin=1704067200, volatility=0.00012, seed=0):
+    """ 合成M1K线: 对数随机游走, 跳过周六周日(与外汇的周末休市一致)
+    @param list_symbol: 标的列表
+    @param day_count: 天数(含周末)
+    @param time_begin: 开始时间(默认2024-01-01 00:00)
+    @param volatility: 每分钟收益率的标准差
+    @param seed: 随机种子
+    """
+    rng = numpy.random.default_rng(seed)
+    minute = time_begin + numpy.arange(day_count * 1440, dtype='<i8') * 60
+    weekday = (minute // 86400 + 3) % 7  # 0=周一
+    minute = minute[weekday < 5]
+    for symbol in list_symbol:
+        digits, price, tick_value = dict_spec_default.get(symbol, (5, 1.0, 1.0))
+        close = price * numpy.exp(numpy.cumsum(rng.normal(0, volatility, len(minute))))
+        open_ = numpy.r_[price, close[:-1]]
+        wick = numpy.abs(rng.normal(0, volatility * 0.5, (2, len(minute)))) * close
+        bar = numpy.zeros(len(minute), dtype_rates)
+        bar['time'] = minute
+        bar['open'] = numpy.round(open_, digits)
+        bar['close'] = numpy.round(close, digits)
+        bar['high'] = numpy.round(numpy.maximum(open_, close) + wick[0], digits)
+        bar['low'] = numpy.round(numpy.minimum(open_, close) - wick[1], digits)
+        bar['tick_volume'] = rng.integers(20, 200, len(minute))
+        bar['spread'] = 12 if digits != 2 else 30
+        broker.dict_symbol[symbol] = C0Symbol(symbol, bar, digits, tick_value, bar['spread'][0])
+    d0clock_reset()
+
+
+def d0clock_reset(day_warmup=30, balance=100.0):
+    """ 重置虚拟时钟和账户: 从数据开始之后day_warmup天开始, 以便策略有足够的历史K线
+    @param day_warmup: 预留的历史天数
+    @param balance: 初始资金
+    """
+    begin = max(i.time[0] for i in broker.dict_symbol.values()) + day_warmup * 86400
+    end = min(i.time[-1] for i in broker.dict_symbol.values()) + 60
+    clock.now = float(begin)
+    clock.end = end
+    broker.balance = balance
+    broker.dict_hold.clear()
+    broker.dict_pend.clear()
+    broker.list_deal.clear()
+    broker.list_retcode.clear()
+    broker.dict_call.clear()
+    broker.time_check = 0.0
+
+
+def d0clock_patch(module):
+    """ 把模块内部使用的time替换为虚拟时钟
+    @param module: 需要替换的模块(通常为fff01x_v16t100_opms_beta)
+    """
+    module.time = clock
+
+
+def d0install():
+    """ 以MetaTrader5的名义注册本模块, 之后import MetaTrader5得到的就是模拟MT5
+    """
+    sys.modules["MetaTrader5"] = sys.modules[__name__]
+
+
+# 与MetaTrader5同名的接口
+def initialize(*args, **kwargs):
+    broker.d0count("initialize")
+    broker.connected = bool(broker.dict_symbol)
+    return broker.connected
+
+
+def login(login=None, password=None, server=None, **kwargs):
+    broker.d0count("login")
+    return broker.connected
+
+
+def shutdown():
+    broker.d0count("shutdown")
+    broker.connected = False
+
+
+def last_error():
+    broker.d0count("last_error")
+    return broker.error
+
+
+def terminal_info():
+    broker.d0count("terminal_info")
+    if not broker.connected:
+        return None
+    return TerminalInfo(connected=True, trade_allowed=True, ping_last=1000, name="FreeFlyFrame Sim",
+                        company="FreeFlyFrame")
+
+
+def account_info():
+    broker.d0count("account_info")
+    if not broker.connected:
+        return None
+    profit = 0.0
+    margin = 0.0
+    for hold in broker.dict_hold.values():
+        tick = broker.d0price(hold['symbol'])
+        price, value = broker.d0profit(hold, tick)
+        profit += value
+        margin += hold['volume'] * 100000 / broker.leverage * (1 if hold['symbol'].startswith("USD") else price)
+    equity = broker.balance + profit
+    return AccountInfo(login=10000000, leverage=broker.leverage, balance=round(broker.balance, 2), credit=0.0,
+                       profit=round(profit, 2), equity=round(equity, 2), margin=round(margin, 2),
+                       margin_free=round(equity - margin, 2),
+                       margin_level=round(equity / margin * 100, 2) if margin > 0 else 0.0,
+                       name="sim", server="sim", currency="USD", company="FreeFlyFrame")
+
+
+def symbol_info(symbol):
+    broker.d0count("symbol_info")
+    data = broker.dict_symbol.get(symbol)
+    if data is None or not broker.connected:
+        return None
+    tick = data.d0tick(clock.now)
+    return SymbolInfo(name=symbol, visible=True, select=True, digits=data.digits,
+                      spread=int(round((tick.ask - tick.bid) / data.point)) if tick else 0, point=data.point,
+                      trade_tick_value=data.tick_value, trade_tick_size=data.point, trade_contract_size=100000.0,
+                      trade_stops_level=0, volume_min=0.01, volume_step=0.01, volume_max=100.0,
+                      filling_mode=data.filling_mode,
+                      bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0, time=tick.time if tick else 0)
+
+
+def symbol_select(symbol, enable=True):
+    broker.d0count("symbol_select")
+    return symbol in broker.dict_symbol
+
+
+def symbol_info_tick(symbol):
+    broker.d0count("symbol_info_tick")
+    if symbol not in broker.dict_symbol or not broker.connected:
+        return None
+    return broker.d0price(symbol)
+
+
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    broker.d0count("copy_rates_from_pos")
+    if symbol not in broker.dict_symbol or not broker.connected:
+        return None
+    return broker.dict_symbol[symbol].d0rates(timeframe, clock.now, start_pos, count)
+
+
+def positions_get(symbol=None, ticket=None, **kwargs):
+    broker.d0count("positions_get")
+    broker.d0advance()
+    list_hold = []
+    for hold in broker.dict_hold.values():
+        if symbol is not None and hold['symbol'] != symbol or ticket is not None and hold['ticket'] != ticket:
+            continue
+        tick = broker.d0price(hold['symbol'])
+        price, profit = broker.d0profit(hold, tick)
+        list_hold.append(TradePosition(ticket=hold['ticket'], time=hold['time'], time_msc=hold['time'] * 1000,
+                                       time_update=hold['time'], time_update_msc=hold['time'] * 1000,
+                                       type=hold['type'], magic=hold['magic'], identifier=hold['ticket'], reason=3,
+                                       volume=hold['volume'], price_open=hold['price_open'], sl=hold['sl'],
+                                       tp=hold['tp'], price_current=price, swap=0.0, profit=profit,
+                                       symbol=hold['symbol'], comment=hold['comment'], external_id=""))
+    return tuple(list_hold)
+
+
+def orders_get(symbol=None, ticket=None, **kwargs):
+    broker.d0count("orders_get")
+    return tuple(i for i in broker.dict_pend.values()
+                 if (symbol is None or i.symbol == symbol) and (ticket is None or i.ticket == ticket))
+
+
+def order_send(request):
+    broker.d0count("order_send")
+    if request is None or not broker.connected:
+        broker.error = (-2, "Invalid arguments")
+        return None
+    if broker.list_retcode:
+        return broker.d0result(broker.list_retcode.pop(0), request, tick=broker.d0price(request['symbol'])
+                               if request.get("symbol") in broker.dict_symbol else None)
+    return broker.d0send(request)
+
+
+def Close(symbol, *args, ticket=None, **kwargs):
+    """ 与MetaTrader5.Close一致: 按单号(或者该标的的全部持仓)市价平仓
+    @return: True/全部成功, False/存在失败
+    """
+    broker.d0count("Close")
+    list_ticket = [ticket] if ticket is not None else \
+        [i for i, hold in broker.dict_hold.items() if hold['symbol'] == symbol]
+    done = True
+    for i in list_ticket:
+        hold = broker.dict_hold.get(i)
+        if hold is None:
+            broker.error = (TRADE_RETCODE_POSITION_CLOSED, "Position doesn't exist")
+            done = False
+            continue
+        type_ = ORDER_TYPE_SELL if hold['type'] == ORDER_TYPE_BUY else ORDER_TYPE_BUY
+        result = broker.d0send({"action": TRADE_ACTION_DEAL, "symbol": symbol, "volume": hold['volume'],
+                                "type": type_, "position": i})
+        done = done and result is not None and result.retcode == TRADE_RETCODE_DONE
+    return done
+
+
+broker = C0Broker()
+clock = C0Clock(now=0, end=float("inf"))
@@ -0,0 +1,77 @@
+from fff01x_v16t100_opms_beta import *
+
+if __name__ == '__main__':
+    symbol_placeholder = "USDZAR"
+    symbol_list_test = ["EURUSD", "GBPUSD", "USDJPY"]
+    symbol_list_optimize = ["AUDUSD", "NZDUSD", "USDCAD", "USDCHF"]
+    bar_count_test = 5 * 6000  # 约5年的H1
+    count_optimize = 2000  # 每个标的随机抽样的参数组数
+    dict_range_optimize = {"count_when_fast": list(range(2, 6)),
+                           "count_when_slow": list(range(3, 10)),
+                           "count_where_fast": list(range(10, 40)),
+                           "count_where_slow": list(range(20, 80)),
+                           "count_which_fast": list(range(80, 160)),
+                           "count_which_slow": list(range(120, 240)),
+                           "actual_sl_amount": [3]}
+
+
+    class C0Main:
+        @staticmethod
+        def d0backtest_start():
+            """ 用MT5的历史K线回测所有标的
+            """
+            log(title("回测策略", position="up"))
+            core = C0Core(symbol_placeholder)
+            core.d0config_all()
+            for i in symbol_list_test:
+                C0Core(i).d0config_connect()
+                bar = MetaTrader5.copy_rates_from_pos(i, core.bar_frame, 0, bar_count_test)
+                spec = C0Core.mt5_session.d0spec(i)
+                test = C0Test(symbol=i,
+                              tick_size=spec.point,
+                              tick_value=spec.trade_tick_value,
+                              volume_min=spec.volume_min,
+                              volume_step=spec.volume_step,
+                              volume_max=spec.volume_max,
+                              balance_begin=core.balance_begin)
+                begin = time.perf_counter()
+                trade, equity, drawdown = test.d0backtest(bar)
+                log(f"~回测策略~ {test.d0summary(trade, equity, drawdown)}, "
+                    f"K线={len(bar)}根, 耗时={round(time.perf_counter() - begin, 3)}秒")
+            log(title("回测策略", position="down"))
+
+        @staticmethod
+        def d0optimize_start():
+            """ 用MT5的历史K线优化所有标的的参数, 可以中断之后重新运行(断点文件在.\\optimize)
+            """
+            log(title("参数优化", position="up"))
+            core = C0Core(symbol_placeholder)
+            core.d0config_all()
+            os.makedirs(".\\optimize") if not os.path.exists(".\\optimize") else None
+            dict_best = {}
+            for i in symbol_list_optimize:
+                C0Core(i).d0config_connect()
+                bar = MetaTrader5.copy_rates_from_pos(i, core.bar_frame, 0, bar_count_test)
+                spec = C0Core.mt5_session.d0spec(i)
+                optimize = C0Optimize(symbol=i,
+                                      bar=bar,
+                                      file_checkpoint=f".\\optimize\\{i}.txt",
+                                      tick_size=spec.point,
+                                      tick_value=spec.trade_tick_value,
+                                      volume_min=spec.volume_min,
+                                      volume_step=spec.volume_step,
+                                      volume_max=spec.volume_max,
+                                      balance_begin=core.balance_begin)
+                list_param = optimize.d0param_random(dict_range_optimize, count_optimize)
+                rank = optimize.d0optimize(list_param, log=log)
+                log(f"\n{rank.head(10)}")
+                dict_best.update(optimize.d0param_best(rank))
+            log(f"~参数优化~ 可直接填入dict_test_param: {dict_best}")
+            log(title("参数优化", position="down"))
+
+
+    log = C1Help(symbol_placeholder).d0log
+    title = C1Help(symbol_placeholder).d0title
+    C0Main.d0backtest_start()
+    C0Main.d0optimize_start()
+    MetaTrader5.shutdown()
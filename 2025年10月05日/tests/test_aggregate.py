@@ -0,0 +1,30 @@
+""" 多周期K线的本地合成: 由基础周期合成的K线与券商直接给出的K线一致(含正在形成的K线)
+"""
+import numpy
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.mark.parametrize("bar_base", [fff.MetaTrader5.TIMEFRAME_M1, fff.MetaTrader5.TIMEFRAME_H1])
+def test_aggregate_matches_broker(broker, bar_base):
+    mt5 = fff.MetaTrader5
+    broker.d0synthetic(["EURUSD"], day_count=100)
+    broker.d0clock_reset(day_warmup=75)
+    mt5.initialize()
+    mt5.symbol_select("EURUSD", True)
+    bar_keep = 5000 if bar_base == mt5.TIMEFRAME_M1 else 1000
+    into = fff.C0Into(fff.C1Help("EURUSD"), "EURUSD", mt5.TIMEFRAME_H1, bar_keep, 1, bar_base=bar_base)
+    dict_need = {mt5.TIMEFRAME_H1: 50, mt5.TIMEFRAME_H4: 30, mt5.TIMEFRAME_D1: 10, mt5.TIMEFRAME_W1: 3,
+                 mt5.TIMEFRAME_MN1: 1}
+    if bar_base == mt5.TIMEFRAME_M1:
+        dict_need.update({mt5.TIMEFRAME_M5: 100, mt5.TIMEFRAME_M30: 60})
+    for _ in range(150):
+        broker.clock.sleep(3607)  # 与周期错开, 覆盖K线中间/收盘/周末/月初
+        for bar_frame, count in dict_need.items():
+            bar = into.d0bar_cache(count, bar_frame)
+            ref = mt5.copy_rates_from_pos("EURUSD", bar_frame, 0, len(bar))
+            assert len(bar) >= count
+            for name in ('time', 'open', 'high', 'low', 'close', 'tick_volume'):
+                numpy.testing.assert_allclose(bar[name].astype(float), ref[name].astype(float), err_msg=name)
+    assert into.aggregate.count_update > into.aggregate.count_build
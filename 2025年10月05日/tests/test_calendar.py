@@ -0,0 +1,82 @@
+""" 交易时段日历: 每周的时段/跨越周末的时段/每日休市/节假日的边界
+"""
+from types import SimpleNamespace
+
+import pandas
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+def d0calendar(list_window, list_holiday=()):
+    return fff.C0Calendar(fff.C1Help("EURUSD"), SimpleNamespace(d0tick_info=lambda: None), "EURUSD",
+                          list_window, list(list_holiday), hours_offset=0)
+
+
+def d0secs(text):
+    return pandas.Timestamp(text).value // 10 ** 9
+
+
+@pytest.mark.parametrize("now, state, change", [
+    ("2025-12-19 23:58:59", True, "2025-12-19 23:59"),  # 周五收盘前
+    ("2025-12-19 23:59:00", False, "2025-12-22 00:01"),  # 周五收盘的一刻
+    ("2025-12-20 12:00:00", False, "2025-12-22 00:01"),  # 周末
+    ("2025-12-22 00:00:59", False, "2025-12-22 00:01"),  # 周一开盘前
+    ("2025-12-22 00:01:00", True, "2025-12-25 00:00"),  # 周一开盘的一刻, 下一个边界是节假日
+    ("2025-12-25 10:00:00", False, "2025-12-26 00:00"),  # 节假日
+    ("2025-12-26 00:00:00", True, "2025-12-26 23:59"),  # 节假日之后照常开盘(不等到00:01)
+])
+def test_state_weekly_holiday(now, state, change):
+    calendar = d0calendar([(0, "00:01", 4, "23:59")], ["2025-12-25"])
+    assert calendar.d0state(d0secs(now)) == (state, d0secs(change))
+
+
+@pytest.mark.parametrize("now, state, change", [
+    ("2025-12-22 00:30:00", False, "2025-12-22 01:01"),
+    ("2025-12-22 12:00:00", True, "2025-12-22 23:57"),
+    ("2025-12-22 23:57:00", False, "2025-12-23 01:01"),  # 每日休市
+    ("2025-12-19 23:58:00", False, "2025-12-22 01:01"),
+])
+def test_state_daily_break(now, state, change):
+    calendar = d0calendar([(i, "01:01", i, "23:57") for i in range(5)])
+    assert calendar.d0state(d0secs(now)) == (state, d0secs(change))
+
+
+@pytest.mark.parametrize("now, state, change", [
+    ("2025-12-21 23:00:00", True, "2025-12-26 21:00"),  # 周日开盘之后一直到周五
+    ("2025-12-20 10:00:00", False, "2025-12-21 22:00"),
+    ("2025-12-19 21:00:00", False, "2025-12-21 22:00"),
+])
+def test_state_across_weekend(now, state, change):
+    calendar = d0calendar([(6, "22:00", 4, "21:00")])
+    assert calendar.list_window == [(0, 4 * 86400 + 21 * 3600), (6 * 86400 + 22 * 3600, 7 * 86400)]
+    assert calendar.d0state(d0secs(now)) == (state, d0secs(change))
+
+
+def test_is_open_cache(broker):
+    """ 状态没有改变时只比较一次时间, 到达边界时才重新计算
+    """
+    broker.clock.now = float(d0secs("2025-12-19 23:00"))
+    calendar = d0calendar([(0, "00:01", 4, "23:59")])
+    assert calendar.d0is_open()
+    for _ in range(58):
+        broker.clock.now += 60
+        assert calendar.d0is_open()
+    assert calendar.count_compute == 1
+    broker.clock.now += 60
+    assert not calendar.d0is_open()
+    assert calendar.count_compute == 2
+    assert calendar.d0secs_open() == d0secs("2025-12-22 00:01") - broker.clock.now
+
+
+def test_offset_sync_recompute(broker):
+    """ 自动推算偏移时: 还没有新鲜的报价时按UTC计算, 推算成功之后立即按服务器时间重新计算边界
+    """
+    broker.clock.now = float(d0secs("2025-12-19 22:30"))  # UTC, 服务器时间(UTC+2)已是周六00:30
+    into = SimpleNamespace(tick=None)
+    into.d0tick_info = lambda: into.tick
+    calendar = fff.C0Calendar(fff.C1Help("EURUSD"), into, "EURUSD", [(0, "00:01", 4, "23:59")], [])
+    assert calendar.d0is_open()
+    into.tick = SimpleNamespace(time=broker.clock.now + 7200)
+    assert not calendar.d0is_open()
+    assert calendar.secs_offset == 7200 and calendar.time_change == d0secs("2025-12-22 00:01")
@@ -0,0 +1,39 @@
+""" 行情中心: 策略进程每轮读取共享内存时, 两轮之间写入的报价全部计入最近的报价, 不重复也不遗漏
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.fixture
+def block():
+    block = fff.C0FeedBlock("FEEDTEST", create=True, bar_frame=1, bar_keep=10, count_tick=8)
+    yield block
+    block.d0close(unlink=True)
+
+
+def d0write(block, list_msc):
+    for msc in list_msc:
+        tick = SimpleNamespace(time=msc // 1000, bid=1.0, ask=1.0 + msc * 1e-6, last=0.0, volume=0, time_msc=msc,
+                               flags=0, volume_real=0.0)
+        fff.C0Feed.d0write(block, tick, None)
+    block.header[4] = int(time.time() * 1000)
+
+
+def test_tick_between_rounds(block):
+    c1help = fff.C1Help("FEEDTEST")
+    into = fff.C0Into(c1help=c1help, symbol="FEEDTEST", bar_frame=1, bar_keep=10, bar_fresh=0)
+    into.feed = fff.C0FeedReader(c1help=c1help, block=fff.C0FeedBlock("FEEDTEST"), secs_stale=60)
+    d0write(block, [1000, 2000, 3000])
+    assert into.d0tick_info().time_msc == 3000
+    d0write(block, range(4000, 15000, 1000))  # 超过环形缓存容量: 只能读到最近的8条
+    into.dict_snapshot.clear()
+    assert into.d0tick_info().time_msc == 14000
+    into.dict_snapshot.clear()
+    assert into.d0tick_info().time_msc == 14000  # 没有新的报价
+    assert [i.time_msc for i in into.list_tick] == [1000, 2000, 3000] + list(range(7000, 15000, 1000))
+    assert into.feed_total == 14
+    into.feed.block.d0close()
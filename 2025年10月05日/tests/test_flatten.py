@@ -0,0 +1,62 @@
+""" 清空订单: 成交模式取自标的规格, 暂时性的返回码退避重试, 按结果分类为成功/已不存在/失败
+"""
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.fixture
+def core(broker):
+    broker.d0synthetic(["EURUSD"], day_count=60)
+    broker.d0clock_reset(day_warmup=43)  # 2024-02-13(周二)
+    broker.broker.dict_symbol["EURUSD"].filling_mode = broker.SYMBOL_FILLING_IOC  # 不允许FOK
+    core = fff.C0Core("EURUSD")
+    core.d0config_all()
+    return core
+
+
+def d0open(broker, core):
+    result = core.c0away.d0send_order(broker.ORDER_TYPE_BUY, 0.01, core.c0into.d0price_ask(), 0, 0, 100)
+    assert result != "fail"
+    return result[0]
+
+
+def test_filling_from_spec(broker, core):
+    assert core.c0into.d0type_filling() == broker.ORDER_FILLING_IOC
+    ticket = d0open(broker, core)  # 券商不允许FOK: 成交说明请求使用了IOC
+    assert core.c0away.d0flatten() == {ticket: ("hold", "done", broker.TRADE_RETCODE_DONE, 1)}
+    request = {"action": broker.TRADE_ACTION_DEAL, "symbol": "EURUSD", "type": broker.ORDER_TYPE_BUY, "volume": 0.01,
+               "type_filling": broker.ORDER_FILLING_FOK}
+    assert broker.order_send(request).retcode == broker.TRADE_RETCODE_INVALID_FILL
+
+
+def test_retry_then_done(broker, core):
+    ticket = d0open(broker, core)
+    broker.broker.list_retcode = [broker.TRADE_RETCODE_REQUOTE, broker.TRADE_RETCODE_PRICE_OFF]
+    count_sleep = broker.clock.count_sleep
+    outcome = core.c0away.d0flatten()
+    assert outcome == {ticket: ("hold", "done", broker.TRADE_RETCODE_DONE, 3)}
+    assert broker.clock.count_sleep == count_sleep + 2  # 两次退避
+    assert not broker.positions_get(symbol="EURUSD")
+
+
+def test_outcome_gone_and_fail(broker, core):
+    core.c0away.flatten_pass = 1  # 注入的返回码不会真的关闭持单: 只看第一轮的结果
+    ticket = d0open(broker, core)
+    broker.broker.list_retcode = [broker.TRADE_RETCODE_POSITION_CLOSED]
+    assert core.c0away.d0flatten() == {ticket: ("hold", "gone", broker.TRADE_RETCODE_POSITION_CLOSED, 1)}
+    broker.broker.list_retcode = [broker.TRADE_RETCODE_REJECT]  # 不可重试: 只尝试一次
+    assert core.c0away.d0flatten() == {ticket: ("hold", "fail", broker.TRADE_RETCODE_REJECT, 1)}
+    assert len(broker.positions_get(symbol="EURUSD")) == 1
+
+
+def test_snapshot_unknown(broker, core, monkeypatch):
+    """ 获取持单失败(断连)时不视为已经清空: 每轮重新获取, 用完轮数之后强提醒
+    """
+    d0open(broker, core)
+    list_remind = []
+    monkeypatch.setattr(broker, "positions_get", lambda *args, **kwargs: None)
+    monkeypatch.setattr(core.c0away, "remind_strong", lambda content, **kwargs: list_remind.append(content))
+    assert core.c0away.d0flatten() == {}
+    assert len(list_remind) == 1 and "状态仍然未知" in list_remind[0]
+    assert broker.broker.dict_call.get("order_send", 0) == 1  # 只有开仓, 没有盲目发送平仓
@@ -0,0 +1,50 @@
+""" 指标引擎: 逐根递推(d0update)与全量计算(d0batch)以及回测的向量化计算一致
+"""
+import numpy
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.fixture
+def bar(broker):
+    """ 合成的M1K线(含正在形成的K线)
+    """
+    broker.d0synthetic(["EURUSD"], day_count=5, seed=7)
+    return broker.broker.dict_symbol["EURUSD"].bar[:3000]
+
+
+def test_ma_incremental(bar):
+    list_count = [1, 2, 3, 21, 38, 150]
+    ma = fff.C0Ma(list_count)
+    dict_batch = {count: fff.C0Test.d0ma_open(bar["close"], bar["open"], count) for count in list_count}
+    for end in range(200, len(bar), 7):  # 每次前进若干根, 覆盖一次推入多根和环形缓存的多次重新求和
+        window = bar[end - 200:end + 1]
+        dict_ma = ma.d0update(window)
+        assert dict_ma == pytest.approx(fff.C0Ma(list_count).d0batch(window), rel=0, abs=1e-12)
+        forming = window.copy()  # 正在形成的K线只有开盘价时, 与回测中该K线开盘时的ma相同
+        forming["close"][-1] = forming["open"][-1]
+        dict_open = fff.C0Ma(list_count).d0batch(forming)
+        assert dict_open == pytest.approx({count: dict_batch[count][end] for count in list_count}, abs=1e-12)
+
+
+def test_atr_incremental(bar):
+    atr = fff.C0Atr(300)
+    test = fff.C0Test("EURUSD", list_param=[2, 3, 21, 38, 5, 10, 1.0])
+    batch = test.d0atr_open(bar)
+    for end in range(400, len(bar), 11):
+        window = bar[end - 400:end + 1]
+        assert atr.d0update(window) == pytest.approx(fff.C0Atr(300).d0batch(window), rel=0, abs=1e-12)
+        forming = window.copy()
+        forming["high"][-1] = forming["low"][-1] = forming["close"][-1] = forming["open"][-1]
+        assert fff.C0Atr(300).d0batch(forming) == pytest.approx(batch[end], abs=1e-12)
+
+
+def test_update_gap_rebuilds(bar):
+    """ 缓存断档(新数组的第一根晚于已纳入的最后一根)时自动改为全量计算
+    """
+    ma = fff.C0Ma([21])
+    ma.d0update(bar[:300])
+    window = bar[1000:1300]
+    assert ma.d0update(window) == pytest.approx(fff.C0Ma([21]).d0batch(window), abs=1e-12)
+    assert not numpy.isnan(fff.C0Atr(300).d0update(bar[:2]))
@@ -0,0 +1,32 @@
+""" 日志监听器: 单条日志出错不影响监听线程, 监听线程停止之后的日志同步写入
+"""
+import logging
+
+import fff01x_v16t100_opms_beta as fff
+
+
+def d0record(msg, *args, level=logging.INFO):
+    record = logging.LogRecord("fff", level, __file__, 0, msg, args, None)
+    record.symbol = "EURUSD"
+    return record
+
+
+def test_write_error_keeps_listening(tmp_path, monkeypatch, capfd):
+    monkeypatch.chdir(tmp_path)
+    log = fff.C0Log(path="log", secs_flush=1)
+    log.d0enqueue(d0record("格式错误 %d", "abc"))
+    log.d0enqueue(d0record("正常", level=logging.ERROR))
+    log.d0stop()
+    assert "日志写入失败" in capfd.readouterr().err
+    assert (tmp_path / "log\\EURUSD.txt").read_text().splitlines()[-1].endswith("正常")
+
+
+def test_write_sync_after_stop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log = fff.C0Log(path="log", secs_flush=1)
+    log.d0enqueue(d0record("停止之前"))
+    log.d0stop()
+    assert not log.thread.is_alive()
+    log.d0enqueue(d0record("停止之后"))
+    assert [i[-4:] for i in (tmp_path / "log\\EURUSD.txt").read_text().splitlines()] == ["停止之前", "停止之后"]
+    assert log.queue.empty()
@@ -0,0 +1,108 @@
+""" 邮件分发器: 对接本地的模拟smtp服务, 检查合并批次/同类去重/每小时限流/发送线程不会因异常退出
+"""
+import email
+import socketserver
+import threading
+import time
+
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+class C0SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        """ 最小的smtp会话: 所有命令都回复250, DATA之后收下整封邮件
+        """
+        self.wfile.write(b"220 stub\r\n")
+        for line in self.rfile:
+            command = line[:4].upper()
+            if command == b"DATA":
+                self.wfile.write(b"354 go\r\n")
+                list_line = []
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                    list_line.append(data)
+                self.server.list_mail.append(email.message_from_bytes(b"".join(list_line)))
+                self.wfile.write(b"250 ok\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                break
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+@pytest.fixture
+def smtp():
+    """ 本地的模拟smtp服务(随机端口), list_mail为收到的邮件
+    """
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), C0SmtpHandler)
+    server.daemon_threads = True
+    server.list_mail = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mail(smtp, monkeypatch):
+    monkeypatch.setattr(fff, "time", time)  # 发送线程使用真实时间
+    return fff.C0Mail(c1help=fff.C1Help("EURUSD"),
+                      addr_from="fff@localhost",
+                      addr_to="fff@localhost",
+                      smtp_host="127.0.0.1",
+                      smtp_port=smtp.server_address[1],
+                      smtp_password="",
+                      smtp_ssl=False,
+                      secs_batch=0.3,
+                      secs_dedupe=60,
+                      count_hour=2,
+                      secs_retry=0.01)
+
+
+def d0body(message):
+    return message.get_payload(decode=True).decode("utf-8").split("<br>")
+
+
+def d0wait(smtp, count, secs=5):
+    deadline = time.monotonic() + secs
+    while len(smtp.list_mail) < count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.5)  # 再等一个批次, 确认没有多发
+    return len(smtp.list_mail)
+
+
+def test_batch_dedupe_limit(smtp, mail):
+    for content in ["订单1发送失败", "订单2发送失败", "账户异常"]:  # 同一批次: 同类合并, 不同类拼为一封
+        mail.d0put(content)
+    assert d0wait(smtp, 1) == 1
+    assert d0body(smtp.list_mail[0]) == ["订单2发送失败 (合并2次)", "账户异常"]
+    mail.d0put("订单3发送失败")  # 去重时长之内的同类提醒: 跳过
+    assert d0wait(smtp, 2, secs=1) == 1
+    mail.d0put("新的提醒")
+    assert d0wait(smtp, 2) == 2
+    assert d0body(smtp.list_mail[1]) == ["新的提醒"]
+    mail.d0put("第三封")  # 每小时2封: 推迟
+    assert d0wait(smtp, 3, secs=1) == 2
+    mail.d0flush(5)  # 退出之前忽略限流
+    assert len(smtp.list_mail) == 3
+    assert d0body(smtp.list_mail[2]) == ["第三封"]
+    assert mail.count_send == 3 and mail.dict_skip == {"订单#发送失败": 1}
+
+
+def test_listen_survives_error(smtp, mail, monkeypatch):
+    d0batch = mail.d0batch
+
+    def d0batch_once(list_content):
+        monkeypatch.setattr(mail, "d0batch", d0batch)
+        raise RuntimeError("模拟异常")
+
+    monkeypatch.setattr(mail, "d0batch", d0batch_once)
+    mail.d0put("第一批")
+    assert d0wait(smtp, 1, secs=1) == 0  # 本批次被放弃
+    mail.d0put("第二批")
+    assert d0wait(smtp, 1) == 1
+    assert mail.thread.is_alive() and mail.queue.unfinished_tasks == 0
+    assert d0body(smtp.list_mail[0]) == ["第二批"]
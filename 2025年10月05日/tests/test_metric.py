@@ -0,0 +1,45 @@
+""" 埋点统计: 多个进程的埋点文件汇总之后, 次数和耗时都不丢失精度
+"""
+import atexit
+
+import fff01x_v16t100_opms_beta as fff
+
+
+def test_collect_precision(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "metric").mkdir()
+    for pid in range(2):  # 模拟两个进程的埋点文件
+        metric = fff.C0Metric("metric", secs_export=3600, symbol="EURUSD")
+        atexit.unregister(metric.d0export)
+        metric.dict_series[("mt5", "order_send", "EURUSD", "")] = [12345678, 1, 0.1 + pid * 1e-9, [0] * 13 + [12345678]]
+        # Linux上"\\"不是路径分隔符: 汇总时列出埋点文件夹中的文件名, 读取的是当前文件夹中同名的文件
+        (tmp_path / "metric" / f"fff_{pid}.prom").touch()
+        (tmp_path / f"metric\\fff_{pid}.prom").write_text(metric.d0text(), encoding="utf-8")
+    dict_line = dict(line.rsplit(" ", 1) for line in fff.C0Metric.d0collect("metric").splitlines()
+                     if not line.startswith("#"))
+    labels = 'symbol="EURUSD",api="order_send"'
+    assert dict_line[f"fff_mt5_seconds_count{{{labels}}}"] == "24691356"
+    assert dict_line[f'fff_mt5_seconds_bucket{{{labels},le="+Inf"}}'] == "24691356"
+    assert float(dict_line[f"fff_mt5_seconds_sum{{{labels}}}"]) == 0.1 + (0.1 + 1e-9)
+    assert dict_line[f"fff_mt5_errors_total{{{labels}}}"] == "2"
+
+
+def test_stage_magic_label():
+    """ 同一标的的多个策略实例: 阶段按魔术号分开统计, 其中的MT5调用也归属该魔术号
+    """
+    metric = fff.C0Metric("metric", secs_export=3600, symbol="EURUSD")
+    atexit.unregister(metric.d0export)
+    api = fff.C0MetricApi(module=fff.MetaTrader5, metric=metric)
+
+    class C0Stub:
+        def d0ma_cross(self):
+            return api.last_error()
+
+    list_ploy = [C0Stub(), C0Stub()]
+    for magic, ploy in zip([101, 102], list_ploy):
+        metric.d0wrap(ploy, ["d0ma_cross"], "EURUSD", magic)
+        ploy.d0ma_cross()
+    text = metric.d0text()
+    for magic in [101, 102]:
+        assert f'fff_stage_seconds_count{{symbol="EURUSD",magic="{magic}",stage="d0ma_cross"}} 1' in text
+        assert f'fff_mt5_seconds_count{{symbol="EURUSD",magic="{magic}",api="last_error"}} 1' in text
@@ -0,0 +1,33 @@
+""" 参数优化: 缺少参数时明确报错, 断点只沿用相同标的/回测设置/K线的结果
+"""
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.fixture
+def bar(broker):
+    broker.d0synthetic(["EURUSD"], day_count=5, seed=7)
+    return broker.broker.dict_symbol["EURUSD"].bar[:3000]
+
+
+def test_param_missing(bar, monkeypatch):
+    monkeypatch.setitem(fff.C1Ploy.dict_test_param, "EURUSD", [])
+    optimize = fff.C0Optimize("EURUSD", bar, "checkpoint.txt")
+    with pytest.raises(ValueError, match="count_where_fast"):
+        optimize.d0param_grid({key: [1, 2] for key in fff.C0Optimize.list_key if key != "count_where_fast"})
+    assert len(optimize.d0param_random({key: [1, 2] for key in fff.C0Optimize.list_key}, 10)) == 2  # 只有止损可以取两个值
+
+
+def test_checkpoint_by_settings(bar):
+    list_param = [[2, 3, 21, 38, 110, 186, 3.22], [2, 3, 21, 38, 110, 186, 2.0]]
+    optimize = fff.C0Optimize("EURUSD", bar, "checkpoint.txt", count_process=1, balance_begin=100)
+    assert len(optimize.d0optimize(list_param)) == 2
+    assert len(optimize.d0checkpoint_load()) == 2
+    assert len(fff.C0Optimize("EURUSD", bar, "checkpoint.txt", balance_begin=100).d0checkpoint_load()) == 2
+    other = fff.C0Optimize("EURUSD", bar, "checkpoint.txt", count_process=1, balance_begin=1000)
+    assert other.d0checkpoint_load() == []  # 回测设置不同: 重新回测
+    assert fff.C0Optimize("EURUSD", bar[1:], "checkpoint.txt").d0checkpoint_load() == []  # K线不同
+    rank = other.d0optimize(list_param)
+    assert len(rank) == 2 and "key" not in rank and (rank["final"] > 500).all()
+    assert len(optimize.d0checkpoint_load()) == 2
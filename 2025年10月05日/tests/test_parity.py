@@ -0,0 +1,58 @@
+""" 回测与实盘循环的一致性: 同一段模拟数据上, C0Test的成交记录与事件驱动循环在模拟券商上的成交一致
+"""
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+def d0live(sim, seed, day_count):
+    """ 在模拟券商上运行事件驱动循环: M1周期, 每20秒轮询一次(正好是模拟报价路径的顶点)
+    @return: (第一次决策的时间, 结束时间, 券商的成交列表)
+    """
+    sim.d0synthetic(["EURUSD"], day_count=day_count + 3, seed=seed, volatility=0.0004)
+    sim.d0clock_reset(day_warmup=1)
+    core = fff.C0Core("EURUSD")
+    core.bar_frame = sim.TIMEFRAME_M1
+    core.circle_event = True
+    core.secs_tick = 20
+    core.calendar_window = [(0, "00:00", 7, "00:00")]
+    core.balance_shrink = 1.0  # 不因回撤退出
+    core.d0config_all()
+    core.c0ployset.d0circle_begin()
+    time_first = int(sim.clock.now) // 60 * 60 + 60
+    sim.clock.now = time_first - core.secs_tick
+    for _ in range(day_count * 86400 // core.secs_tick):
+        sim.clock.sleep(core.secs_tick)
+        core.c0ployset.d0event_step()
+    return time_first, int(sim.clock.now), sorted(sim.broker.list_deal, key=lambda i: i["time"])
+
+
+# 种子0/3: 期间没有恰好相等的两条ma(相等时前缀和与逐项求和的舍入误差会让两边取不同的方向)
+@pytest.mark.parametrize("seed", [0, 3])
+def test_backtest_live_parity(broker, seed):
+    time_first, time_end, list_deal = d0live(broker, seed, day_count=2)
+    data = broker.broker.dict_symbol["EURUSD"]
+    bar = data.bar[data.d0index(time_first) - 300:data.d0index(time_end) + 1]
+    assert bar["time"][300] == time_first
+    spec = fff.C0Core.mt5_session.d0spec("EURUSD")
+    test = fff.C0Test("EURUSD", tick_size=spec.point, tick_value=spec.trade_tick_value, volume_min=spec.volume_min,
+                      volume_step=spec.volume_step, volume_max=spec.volume_max)
+    trade, _, _ = test.d0backtest(bar)
+    assert len(list_deal) > 5
+    assert len(trade) == len(list_deal)
+    for deal, row in zip(list_deal, trade.itertuples()):
+        assert deal["time"] == row.time_open.value // 10 ** 9
+        assert ("buy" if deal["type"] == 0 else "sell") == row.type
+        assert deal["volume"] == row.volume
+        assert deal["price_open"] == pytest.approx(row.price_open, abs=1e-6)
+        assert deal["price_close"] == pytest.approx(row.price_close, abs=1e-6)
+        assert {"sl": "sl", "close": "clear"}[deal["reason"]] == row.reason
+        assert 0 <= deal["time_close"] - row.time_close.value // 10 ** 9 < 60  # 回测只精确到K线, 实盘在K线之内
+
+
+@pytest.mark.parametrize("vol, volume", [(0.07, 0.0), (0.08, 0.1), (0.33, 0.35), (5.0, 1.0)])
+def test_backtest_volume_round(vol, volume):
+    """ 回测的手数与实盘一样按步长/最小/最大手数取整
+    """
+    test = fff.C0Test("EURUSD", volume_min=0.1, volume_step=0.05, volume_max=1.0)
+    assert test.d0volume_round(vol) == volume
@@ -0,0 +1,72 @@
+""" 单进程多标的调度器: 每轮批量获取账户/持单/挂单, 需要等待的标的只暂停而不在调度线程中休眠
+"""
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.fixture
+def scheduler(broker):
+    broker.d0synthetic(["EURUSD", "GBPUSD", "USDJPY"], day_count=60)
+    broker.d0clock_reset(day_warmup=43)  # 2024-02-13(周二)
+    scheduler = fff.C0Scheduler("USDZAR", ["EURUSD", "GBPUSD", "USDJPY"])
+    scheduler.d0schedule_config()
+    fff.C0Core.mt5_session.wait = False
+    return scheduler
+
+
+def d0round(broker, scheduler, count):
+    for _ in range(count):
+        broker.clock.sleep(scheduler.list_core[0].secs_short)
+        scheduler.d0schedule_round()
+
+
+def test_batch_per_round(broker, scheduler, monkeypatch):
+    list_call = []
+    for name in ("positions_get", "orders_get", "account_info"):
+        func = getattr(broker, name)
+        monkeypatch.setattr(broker, name, lambda *args, _name=name, _func=func, **kwargs:
+                            list_call.append((_name, kwargs.get("symbol"))) or _func(*args, **kwargs))
+    d0round(broker, scheduler, 100)
+    count_trade = broker.broker.dict_call.get("order_send", 0)
+    assert scheduler.count_round == 100 and scheduler.batch.count_hit > 0
+    assert all(symbol is None for _, symbol in list_call)  # 只有不带标的的批量调用
+    for name in ("positions_get", "orders_get", "account_info"):
+        assert sum(i == name for i, _ in list_call) <= scheduler.count_round + count_trade
+
+
+def test_pause_skips_symbol(broker, scheduler, monkeypatch):
+    core = scheduler.list_core[0]
+    list_step = []
+    core.c0away.fail_max = 2
+
+    def d0step():  # 本轮连续两次新建订单失败: 共用进程时抛出C0Pause而不休眠
+        list_step.append(broker.clock.now)
+        core.c0away.d0send_statistics("fail")
+        core.c0away.d0send_statistics("fail")
+
+    monkeypatch.setattr(core.c0ployset, "d0circle_step", d0step)
+    count_sleep = broker.clock.count_sleep
+    d0round(broker, scheduler, 400)
+    assert broker.clock.count_sleep == count_sleep + 400  # 只有每轮开始时的一次休眠
+    secs_super = core.c2help.d0time_secs("super").total_seconds()
+    assert len(list_step) == 400 * core.secs_short // secs_super + 1
+    assert all(secs_super <= b - a < secs_super + core.secs_short for a, b in zip(list_step, list_step[1:]))
+    assert scheduler.count_round == 400 and len(scheduler.list_core) == 3
+
+
+def test_reconnect_without_sleep(broker, scheduler, monkeypatch):
+    session = fff.C0Core.mt5_session
+    initialize = broker.initialize
+    monkeypatch.setattr(broker, "initialize", lambda *args, **kwargs: False)
+    broker.broker.connected = False
+    count_sleep = broker.clock.count_sleep
+    d0round(broker, scheduler, 1)
+    assert broker.clock.count_sleep == count_sleep + 1
+    assert not session.done_connect and broker.broker.dict_call.get("initialize", 0) == 1  # 每个退避期只尝试一次
+    assert set(scheduler.dict_pause) == {"EURUSD", "GBPUSD", "USDJPY"}
+    assert scheduler.dict_pause["EURUSD"] == session.time_retry
+    monkeypatch.setattr(broker, "initialize", initialize)
+    broker.clock.now = session.time_retry
+    scheduler.d0schedule_round()
+    assert session.done_connect and session.count_connect == 2
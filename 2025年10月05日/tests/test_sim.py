@@ -0,0 +1,43 @@
+""" 模拟MT5: 止损止盈按上次检查之后的M1K线路径触发, 包括上次检查所在分钟的后半段
+"""
+
+
+def d0bar_down(data, index):
+    """ 从index开始第一根先向下走的阳线(路径O-L-H-C): 最低价明显低于开盘价
+    """
+    while not (data.list_ohlc[index][3] >= data.list_ohlc[index][0] > data.list_ohlc[index][2] + 5 * data.point):
+        index += 1
+    return index
+
+
+def test_stop_minute_tail(broker):
+    broker.d0synthetic(["EURUSD"], day_count=45, seed=1)
+    broker.d0clock_reset(day_warmup=43)
+    broker.initialize()
+    data = broker.broker.dict_symbol["EURUSD"]
+    index = d0bar_down(data, data.d0index(broker.clock.now))
+    broker.clock.now = float(data.list_time[index] + 5)
+    price, _, _ = data.d0path(index, broker.clock.now)
+    sl = round((price + data.list_ohlc[index][2]) / 2, data.digits)  # 第5秒之后, 第20秒之前会触及
+    result = broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": "EURUSD", "volume": 0.01,
+                                "type": broker.ORDER_TYPE_BUY, "sl": sl})
+    assert result.retcode == broker.TRADE_RETCODE_DONE
+    broker.clock.sleep(60)  # 到了下一分钟: 开仓那一分钟的后半段同样需要检查
+    assert not broker.broker.dict_hold
+    assert broker.broker.list_deal[-1]["reason"] == "sl" and broker.broker.list_deal[-1]["price_close"] == sl
+
+
+def test_stop_moved_after_low(broker):
+    broker.d0synthetic(["EURUSD"], day_count=45, seed=1)
+    broker.d0clock_reset(day_warmup=43)
+    broker.initialize()
+    data = broker.broker.dict_symbol["EURUSD"]
+    index = d0bar_down(data, data.d0index(broker.clock.now))
+    broker.clock.now = float(data.list_time[index] + 30)  # 最低价(第20秒)已经过去
+    result = broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": "EURUSD", "volume": 0.01,
+                                "type": broker.ORDER_TYPE_BUY})
+    price, _, low = data.d0path(index, broker.clock.now)
+    sl = round((price + low) / 2, data.digits)  # 本分钟早些时候触及过, 但是移动之后没有再触及
+    broker.order_send({"action": broker.TRADE_ACTION_SLTP, "position": result.order, "sl": sl, "tp": 0.0})
+    broker.clock.sleep(5)
+    assert result.order in broker.broker.dict_hold
@@ -0,0 +1,89 @@
+""" 本地历史库: 追加/读取的往返一致, 崩溃之后(列文件与索引不一致)重新打开时自动修复
+"""
+import os
+
+import numpy
+import pytest
+
+import fff01x_v16t100_opms_beta as fff
+
+
+@pytest.fixture
+def bar(broker):
+    """ 合成的M1K线
+    """
+    broker.d0synthetic(["EURUSD"], day_count=3, seed=5)
+    return broker.broker.dict_symbol["EURUSD"].bar[:1000].copy()
+
+
+def d0store():
+    return fff.C0Store(fff.C1Help("EURUSD"), "store", "EURUSD", count_flush=4)
+
+
+def test_bar_round_trip(bar):
+    store = d0store()
+    for end in list(range(100, len(bar), 150)) + [len(bar)]:  # 重叠的窗口: 只追加新收盘的K线
+        store.d0bar_save(1, bar[max(end - 300, 0):end])
+    saved = bar[:len(bar) - 1]
+    index = d0store().d0index(1)
+    assert index["count"] == len(saved) and index["time_last"] == saved["time"][-1]
+    data = d0store().d0bars(1)
+    assert data.dtype == bar.dtype
+    numpy.testing.assert_array_equal(data, saved)
+    time_from, time_to = int(saved["time"][200]), int(saved["time"][300])
+    numpy.testing.assert_array_equal(d0store().d0bars(1, time_from=time_from, time_to=time_to), saved[200:301])
+    numpy.testing.assert_array_equal(d0store().d0bars(1, count=10, time_to=time_to), saved[291:301])
+    assert isinstance(d0store().d0columns(1)["close"], numpy.memmap)
+
+
+def test_tick_round_trip(broker):
+    store = d0store()
+    list_tick = [fff.C0Tick(fff.MetaTrader5.Tick(time=i, bid=1.1 + i * 1e-5, ask=1.1002 + i * 1e-5, last=0.0, volume=0,
+                                                 time_msc=i * 1000, flags=6, volume_real=0.0)) for i in range(10)]
+    for tick in list_tick:
+        store.d0tick_put(tick)
+    assert d0store().d0index("tick")["count"] == 8  # 每4个写入一次
+    store.d0flush()
+    data = d0store().d0bars("tick")
+    assert data["time_msc"].tolist() == [i.time_msc for i in list_tick]
+    assert data["ask"].tolist() == [i.ask for i in list_tick]
+
+
+def test_recover_partial_append(bar):
+    """ 崩溃于追加的中途: 部分列文件比索引长/短, 重新打开时截到各列都完整的行数, 之后可以继续追加
+    """
+    store = d0store()
+    store.d0bar_save(1, bar[:501])
+    base = store.d0base(1)
+    with open(f"{base}.close", "ab") as f:  # 索引之外的半行
+        f.write(b"\x00" * 3)
+    with open(f"{base}.high", "r+b") as f:  # 最后10行没有写完
+        f.truncate(490 * 8)
+    store = d0store()
+    assert store.d0index(1)["count"] == 490
+    assert os.path.getsize(f"{base}.close") == 490 * 8
+    assert store.d0index(1)["time_last"] == bar["time"][489]
+    store.d0bar_save(1, bar[400:701])
+    numpy.testing.assert_array_equal(d0store().d0bars(1), bar[:700])
+
+
+def test_recover_to_empty(bar):
+    """ 崩溃于第一次追加的中途: 修复为0行之后(time_last为None)照常保存
+    """
+    store = d0store()
+    store.d0bar_save(1, bar[:101])
+    with open(f"{store.d0base(1)}.open", "r+b") as f:
+        f.truncate(4)
+    store = d0store()
+    assert store.d0index(1)["count"] == 0 and store.d0index(1)["time_last"] is None
+    assert store.d0columns(1) == {}
+    store.d0bar_save(1, bar[:201])
+    numpy.testing.assert_array_equal(d0store().d0bars(1), bar[:200])
+
+
+def test_recover_invalid_index(bar):
+    store = d0store()
+    store.d0bar_save(1, bar[:101])
+    with open(f"{store.d0base(1)}.json", "w") as f:
+        f.write("{")
+    assert d0store().d0index(1) is None
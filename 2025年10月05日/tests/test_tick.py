@@ -0,0 +1,21 @@
+""" 报价快照: 同一轮的买价/卖价/点差来自同一个报价, 断连时返回None, 策略的各个阶段不会因此抛出异常
+"""
+import fff01x_v16t100_opms_beta as fff
+
+
+def test_tick_missing(broker, monkeypatch):
+    broker.d0synthetic(["EURUSD"], day_count=60)
+    broker.d0clock_reset(day_warmup=43)  # 2024-02-13(周二)
+    core = fff.C0Core("EURUSD")
+    core.d0config_all()
+    tick = core.c0into.d0tick_info()
+    assert core.c0into.d0price_ask() == tick.ask and core.c0into.d0price_bid() == tick.bid
+    monkeypatch.setattr(broker, "symbol_info_tick", lambda symbol: None)
+    assert core.c0into.d0tick_info() is tick  # 本轮的快照
+    core.c0into.d0snapshot_refresh()
+    assert core.c0into.d0tick_info() is None and core.c0into.d0price_ask() is None
+    ploy = core.c1ploy
+    assert ploy.d0common_limit() is False
+    ploy.open_type = "buy"
+    ploy.d0protect_cost()
+    assert not ploy.done_protect